@@ -9,6 +9,8 @@ import os.path as osp
 
 from six import with_metaclass
 
+from hpcbench.toolbox import pairing
+
 __all__ = ['Benchmark', 'ExecutionContext', 'MetricsExtractor']
 
 
@@ -34,6 +36,31 @@ class Cluster(with_metaclass(ABCMeta, object)):
         in the strictly upper triangular matrix of nodes.
         """
 
+    def pairs(self, strategy, **options):
+        """Iterator of node pairs of the current tag
+        selected by a strategy of ``hpcbench.toolbox.pairing``
+
+        :param strategy: ``node``, ``tag``, or a key
+        of ``hpcbench.toolbox.pairing.STRATEGIES``
+        :param options: parameters of the strategy
+        """
+        if strategy == 'node':
+            return self.node_pairs
+        if strategy == 'tag':
+            return self.tag_node_pairs
+        return pairing.node_pairs(self.nodes, strategy, **options)
+
+    def pair_rounds(self, strategy, **options):
+        """Iterator of rounds of disjoint node pairs of the current tag,
+        see ``pairs`` member method. With the ``node`` strategy, all pairs
+        share the current node so every round has only one pair.
+
+        :rtype: generator of list of pairs
+        """
+        if strategy == 'tag':
+            return pairing.tournament(sorted(self.nodes))
+        return pairing.disjoint_rounds(self.pairs(strategy, **options))
+
 
 class ExecutionContext(
     namedtuple(
@@ -57,6 +84,11 @@ class ExecutionContext(
 # namedtuples are compact and have a nice str representation
 Metric = namedtuple("Metric", "unit type")
 
+# Array metrics are tables made of equal-length columns.
+# ``columns`` is a dict of column name -> ``Metric``, values are
+# given as a dict of column name -> list of values.
+ArrayMetric = namedtuple("ArrayMetric", "columns")
+
 
 class Metrics(object):  # pragma pylint: disable=too-few-public-methods
     """List of common metrics
@@ -110,6 +142,13 @@ class MetricsExtractor(with_metaclass(ABCMeta, object)):
                 parallel_efficiency=dict(type=float, unit='percent')
             )
 
+        Series of measurements can be declared with ``ArrayMetric``:
+
+        >>> def metrics(self):
+            return dict(
+                raw=ArrayMetric(dict(bytes=Metrics.Byte, latency=Metrics.Microsecond))
+            )
+
         """
         raise NotImplementedError  # pragma: no cover
 
@@ -268,6 +307,10 @@ class Benchmark(with_metaclass(ABCMeta, object)):
           to consider it successful.
           Metrics won't be extracted if command fails.
           Default value is: {0}
+        * *round* (optional):
+          consecutive commands of a category sharing the same `round`
+          value and running on disjoint `srun_nodes` lists may be
+          executed concurrently by the `srun` execution layer.
 
         Execution context: for every command, a dedicated output directory
         is created and the current working directory changed to this directory
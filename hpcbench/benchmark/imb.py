@@ -7,7 +7,8 @@ import re
 
 from cached_property import cached_property
 
-from hpcbench.api import Benchmark, Metrics, MetricsExtractor
+from hpcbench.api import ArrayMetric, Benchmark, Metrics, MetricsExtractor
+from hpcbench.toolbox import pairing
 from hpcbench.toolbox.process import find_executable
 
 
@@ -32,13 +33,13 @@ class IMBExtractor(MetricsExtractor):
         )
         if self.with_all_data:
             common.update(
-                raw=[
+                raw=ArrayMetric(
                     dict(
                         bytes=Metrics.Byte,
                         bandwidth=Metrics.MegaBytesPerSecond,
                         latency=Metrics.Microsecond,
                     )
-                ]
+                )
             )
         return common
 
@@ -113,15 +114,11 @@ class IMBPingPongExtractor(IMBExtractor):
         min_lat, min_lat_b = min(zip(self.s_latency, self.s_bytes), key=itemgetter(0))
         maxb_bw, maxb_bw_b = self.s_bandwidth[-1], self.s_bytes[-1]
         max_bw, max_bw_b = max(zip(self.s_bandwidth, self.s_bytes), key=itemgetter(0))
-        raw = []
-        for i in range(len(self.s_bytes)):
-            raw.append(
-                dict(
-                    bytes=self.s_bytes[i],
-                    latency=self.s_latency[i],
-                    bandwidth=self.s_bandwidth[i],
-                )
-            )
+        raw = dict(
+            bytes=list(self.s_bytes),
+            latency=list(self.s_latency),
+            bandwidth=list(self.s_bandwidth),
+        )
         return dict(
             minb_lat=minb_lat,
             minb_lat_bytes=minb_lat_b,
@@ -209,7 +206,7 @@ class IMB(Benchmark):
         ALL_GATHER: ["-npmin", "{process_count}"],
         ALL_TO_ALL: ["-npmin", "{process_count}"],
     }
-    NODE_PAIRING = {'node', 'tag'}
+    NODE_PAIRING = {'node'} | set(pairing.STRATEGIES)
     DEFAULT_NODE_PAIRING = 'node'
 
     def __init__(self):
@@ -252,27 +249,30 @@ class IMB(Benchmark):
     def node_pairing(self):
         """if "node" then test current node and next one
         if "tag", then create tests for every pair of the current tag.
+        Other strategies of ``hpcbench.toolbox.pairing`` select fewer pairs
+        of the current tag, for instance ``ring`` or ``{random: {k: 2}}``.
+
+        :return: tuple (strategy, parameters)
         """
-        value = self.attributes['node_pairing']
-        if value not in IMB.NODE_PAIRING:
-            msg = 'Unexpected {0} value: got "{1}" but valid values are {2}'
-            msg = msg.format('node_pairing', value, IMB.NODE_PAIRING)
-            raise ValueError(msg)
-        return value
+        return pairing.parse(self.attributes['node_pairing'], IMB.NODE_PAIRING)
 
     def _node_pairs(self, context):
-        if self.node_pairing == 'node':
-            return context.cluster.node_pairs
-        elif self.node_pairing == 'tag':
-            return context.cluster.tag_node_pairs
-        assert False
+        """Iterator of tuple (round, pair). Pairs of the same round
+        are disjoint so they can be tested concurrently.
+        round is None with the ``node`` strategy.
+        """
+        strategy, options = self.node_pairing
+        rounds = context.cluster.pair_rounds(strategy, **options)
+        for round_, pairs in enumerate(rounds):
+            for pair in pairs:
+                yield None if strategy == 'node' else round_, pair
 
     def execution_matrix(self, context):
         for category in self.categories:
             arguments = self.arguments.get(category) or []
             if category == IMB.PING_PONG:
-                for pair in self._node_pairs(context):
-                    yield dict(
+                for round_, pair in self._node_pairs(context):
+                    execution = dict(
                         category=category,
                         command=[
                             find_executable(self.executable, required=False),
@@ -282,6 +282,9 @@ class IMB(Benchmark):
                         srun_nodes=pair,
                         metas=dict(from_node=pair[0], to_node=pair[1]),
                     )
+                    if round_ is not None:
+                        execution.update(round=round_)
+                    yield execution
             else:
                 yield dict(
                     category=category,
@@ -8,7 +8,8 @@ import logging
 
 from cached_property import cached_property
 
-from hpcbench.api import Benchmark, Metric, Metrics, MetricsExtractor
+from hpcbench.api import ArrayMetric, Benchmark, Metric, Metrics, MetricsExtractor
+from hpcbench.toolbox import pairing
 from hpcbench.toolbox.process import find_executable
 
 
@@ -63,6 +64,10 @@ class OSUExtractor(MetricsExtractor):
         """:return: extracted metrics as a dictionary
         """
 
+    def raw_columns(self, *names):
+        """:return: raw data as columns of an array metric"""
+        return dict(zip(names, map(list, zip(*self.s_raw_data))))
+
 
 class OSUBWExtractor(OSUExtractor):
     """Metrics extractor for osu_bw benchmark"""
@@ -75,7 +80,9 @@ class OSUBWExtractor(OSUExtractor):
             max_bw=Metrics.MegaBytesPerSecond,
             maxb_bw_bytes=Metrics.Byte,
             maxb_bw=Metrics.MegaBytesPerSecond,
-            raw=[dict(bytes=Metrics.Byte, bandwidth=Metrics.MegaBytesPerSecond)],
+            raw=ArrayMetric(
+                dict(bytes=Metrics.Byte, bandwidth=Metrics.MegaBytesPerSecond)
+            ),
         )
         super(OSUBWExtractor, self).__init__()
 
@@ -100,7 +107,7 @@ class OSUBWExtractor(OSUExtractor):
             maxb_bw_bytes=maxb_bw_b,
             max_bw=max_bw,
             max_bw_bytes=max_bw_b,
-            raw=[{'bytes': b, 'bandwidth': bw} for b, bw in self.s_raw_data],
+            raw=self.raw_columns('bytes', 'bandwidth'),
         )
 
 
@@ -114,7 +121,7 @@ class OSUMBWExtractor(OSUBWExtractor):
         msg_rate_metric = Metric('Msg/s', float)
         msg_metrics = dict(max_mr=msg_rate_metric, maxb_mr=msg_rate_metric)
         self._metrics.update(msg_metrics)
-        self._metrics['raw'][0]['msg_rate'] = msg_rate_metric
+        self._metrics['raw'].columns['msg_rate'] = msg_rate_metric
 
     @cached_property
     def stdout_ignore_prior(self):
@@ -137,10 +144,7 @@ class OSUMBWExtractor(OSUBWExtractor):
             max_bw=max_bw,
             max_mr=max_mr,
             max_bw_bytes=max_bw_b,
-            raw=[
-                {'bytes': b, 'bandwidth': bw, 'msg_rate': mr}
-                for b, bw, mr in self.s_raw_data
-            ],
+            raw=self.raw_columns('bytes', 'bandwidth', 'msg_rate'),
         )
 
 
@@ -159,7 +163,7 @@ class OSULatExtractor(OSUExtractor):
             min_lat=Metrics.Microsecond,
             minb_lat_bytes=Metrics.Byte,
             minb_lat=Metrics.Microsecond,
-            raw=[dict(bytes=Metrics.Byte, latency=Metrics.Microsecond)],
+            raw=ArrayMetric(dict(bytes=Metrics.Byte, latency=Metrics.Microsecond)),
         )
 
     @cached_property
@@ -181,7 +185,7 @@ class OSULatExtractor(OSUExtractor):
             minb_lat_bytes=minb_lat_b,
             min_lat=min_lat,
             min_lat_bytes=min_lat_b,
-            raw=[{'bytes': b, 'latency': l} for b, l in self.s_raw_data],
+            raw=self.raw_columns('bytes', 'latency'),
         )
 
 
@@ -200,7 +204,7 @@ class OSUCollectiveLatExtractor(OSUExtractor):
             min_lat=Metrics.Microsecond,
             minb_lat_bytes=Metrics.Byte,
             minb_lat=Metrics.Microsecond,
-            raw=[dict(bytes=Metrics.Byte, latency=Metrics.Microsecond)],
+            raw=ArrayMetric(dict(bytes=Metrics.Byte, latency=Metrics.Microsecond)),
         )
 
     @cached_property
@@ -222,7 +226,7 @@ class OSUCollectiveLatExtractor(OSUExtractor):
             minb_lat_bytes=minb_lat_b,
             min_lat=min_lat,
             min_lat_bytes=min_lat_b,
-            raw=[{'bytes': b, 'latency': l} for b, l in self.s_raw_data],
+            raw=self.raw_columns('bytes', 'latency'),
         )
 
 
@@ -242,7 +246,7 @@ class OSU(Benchmark):
     OSU_ALLTOALLV = 'osu_alltoallv'
     OSU_REDUCE = 'osu_reduce'
     OSU_ALLREDUCE = 'osu_allreduce'
-    NODE_PAIRING = {'node', 'tag'}
+    NODE_PAIRING = {'node'} | set(pairing.STRATEGIES)
     DEFAULT_NODE_PAIRING = 'node'
     DEFAULT_CATEGORIES = [OSU_BW, OSU_LAT, OSU_ALLGATHERV, OSU_ALLTOALLV]
     DEFAULT_OPTIONS = {
@@ -315,20 +319,23 @@ class OSU(Benchmark):
     def node_pairing(self):
         """if "node" then test current node and next one
         if "tag", then create tests for every pair of the current tag.
+        Other strategies of ``hpcbench.toolbox.pairing`` select fewer pairs
+        of the current tag, for instance ``ring`` or ``{random: {k: 2}}``.
+
+        :return: tuple (strategy, parameters)
         """
-        value = self.attributes['node_pairing']
-        if value not in OSU.NODE_PAIRING:
-            msg = 'Unexpected {0} value: got "{1}" but valid values are {2}'
-            msg = msg.format('node_pairing', value, OSU.NODE_PAIRING)
-            raise ValueError(msg)
-        return value
+        return pairing.parse(self.attributes['node_pairing'], OSU.NODE_PAIRING)
 
     def node_pairs(self, context):
-        if self.node_pairing == 'node':
-            return context.cluster.node_pairs
-        elif self.node_pairing == 'tag':
-            return context.cluster.tag_node_pairs
-        assert False
+        """Iterator of tuple (round, pair). Pairs of the same round
+        are disjoint so they can be tested concurrently.
+        round is None with the ``node`` strategy.
+        """
+        strategy, options = self.node_pairing
+        rounds = context.cluster.pair_rounds(strategy, **options)
+        for round_, pairs in enumerate(rounds):
+            for pair in pairs:
+                yield None if strategy == 'node' else round_, pair
 
     @property
     def srun_nodes(self):
@@ -348,13 +355,16 @@ class OSU(Benchmark):
                     executable = find_executable(
                         self.executable(category), required=False
                     )
-                    for pair in self.node_pairs(context):
-                        yield dict(
+                    for round_, pair in self.node_pairs(context):
+                        execution = dict(
                             category=category,
                             command=[executable] + arguments,
                             srun_nodes=pair,
                             metas=dict(from_node=pair[0], to_node=pair[1]),
                         )
+                        if round_ is not None:
+                            execution.update(round=round_)
+                        yield execution
             else:
                 yield dict(
                     category=category,
@@ -1,31 +1,46 @@
 """HPCBench campaign helper functions
 """
 import collections
-from contextlib import contextmanager
+from contextlib import closing, contextmanager
+import datetime
+import errno
 import filecmp
 import functools
+import itertools
 import json
 import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import operator
 import os
 import os.path as osp
 import re
 import shutil
 import socket
+import sqlite3
 import uuid
 
 from cached_property import cached_property
 from ClusterShell.NodeSet import NodeSet
+import numpy as np
 import six
 import yaml
 
 import hpcbench
-from hpcbench.api import Benchmark
+from hpcbench.api import ArrayMetric, Benchmark
 from hpcbench.report import render
-from .toolbox.collections_ext import Configuration, dict_map_kv, freeze, nameddict
+from .toolbox.collections_ext import (
+    Configuration,
+    defrost,
+    dict_map_kv,
+    dict_merge,
+    freeze,
+    LRUCache,
+    nameddict,
+)
 from .toolbox.env import expandvars
 from .toolbox.functools_ext import listify
-from .toolbox.slurm import SlurmCluster
+from .toolbox.slurm import SlurmCache, SlurmCluster
 
 
 def pip_installer_url(version=None):
@@ -53,6 +68,9 @@ SBATCH_JINJA_TEMPLATE = 'sbatch.jinja'
 YAML_CAMPAIGN_FILE = 'campaign.yaml'
 YAML_EXPANDED_CAMPAIGN_FILE = 'campaign.expanded.yaml'
 YAML_REPORT_FILE = 'hpcbench.yaml'
+SQLITE_INDEX_FILE = 'hpcbench.db'
+JSON_PROGRESS_FILE = 'hpcbench.progress.jsonl'
+JSON_SLURM_CACHE_FILE = 'hpcbench.slurm.json'
 DEFAULT_CAMPAIGN = dict(
     output_dir="hpcbench-%Y%m%d-%H%M%S",
     network=dict(
@@ -63,7 +81,12 @@ DEFAULT_CAMPAIGN = dict(
         installer_template='ssh-installer.sh.jinja',
         installer_prelude_file=None,
         max_concurrent_runs=4,
+        fanout=64,
+        ssh_multiplexing=True,
+        results_compression='gzip',
         pip_installer_url=pip_installer_url(),
+        pip_plugins=[],
+        slurm_cache_ttl=3600,
         slurm_blacklist_states=[
             'down',
             'down*',
@@ -81,6 +104,7 @@ DEFAULT_CAMPAIGN = dict(
         config=dict(),
         executor_template='executor.sh.jinja',
         sbatch_template=SBATCH_JINJA_TEMPLATE,
+        sharding=dict(shards=1, array=True, throttle=None),
     ),
     tag=dict(),
     benchmarks={'*': {}},
@@ -171,12 +195,35 @@ def from_file(campaign_file, **kwargs):
     realpath = osp.realpath(campaign_file)
     if osp.isdir(realpath):
         campaign_file = osp.join(campaign_file, YAML_CAMPAIGN_FILE)
+        kwargs.setdefault('slurm_cache', slurm_cache(realpath))
     campaign = Configuration.from_file(campaign_file)
     return default_campaign(campaign, **kwargs)
 
 
+def slurm_cache(path, lookup=False):
+    """Get cache of the SLURM cluster information of a campaign
+
+    :param path: campaign directory
+    :param lookup: look for an existing cache in the ancestors
+    of the given directory. The cache is kept in memory if none is found.
+    :rtype: SlurmCache
+    """
+    path = osp.realpath(path)
+    if lookup:
+        while not osp.isfile(osp.join(path, JSON_SLURM_CACHE_FILE)):
+            parent = osp.dirname(path)
+            if parent == path:
+                return SlurmCache()
+            path = parent
+    return SlurmCache(osp.join(path, JSON_SLURM_CACHE_FILE))
+
+
 def default_campaign(
-    campaign=None, expandcampvars=True, exclude_nodes=None, frozen=True
+    campaign=None,
+    expandcampvars=True,
+    exclude_nodes=None,
+    frozen=True,
+    slurm_cache=None,
 ):
     """Fill an existing campaign with default
     values for optional keys
@@ -189,6 +236,8 @@ def default_campaign(
     :type expandcampvars: bool
     :param frozen: whether the returned data-structure is immutable or not
     :type frozen: bool
+    :param slurm_cache: cache of the SLURM cluster information
+    :type slurm_cache: SlurmCache
     :return: object provided in parameter
     :rtype: dictionary
     """
@@ -225,7 +274,7 @@ def default_campaign(
     if expandcampvars:
         if campaign.network.get('tags') is None:
             campaign.network['tags'] = {}
-        NetworkConfig(campaign).expand()
+        NetworkConfig(campaign, slurm_cache=slurm_cache).expand()
     return freeze(campaign) if frozen else campaign
 
 
@@ -233,9 +282,12 @@ class NetworkConfig(object):
     """Wrapper around network configuration
     """
 
-    def __init__(self, campaign, exclude_nodes=None):
+    def __init__(self, campaign, exclude_nodes=None, slurm_cache=None):
         self.campaign = campaign
         self._exclude_nodes = NodeSet(exclude_nodes)
+        self.slurm_cache = slurm_cache or SlurmCache()
+        if self.slurm_cache.ttl is None:
+            self.slurm_cache.ttl = campaign.network.get('slurm_cache_ttl')
 
     @property
     def exclude_nodes(self):
@@ -273,7 +325,7 @@ class NetworkConfig(object):
             if 'reservation' in self.campaign.process.get('sbatch') or {}:
                 rsv_name = self.campaign.process.sbatch.reservation
                 try:
-                    rsv = SlurmCluster.reservation(rsv_name)
+                    rsv = SlurmCluster.reservation(rsv_name, self.slurm_cache)
                 except KeyError:
                     return None
                 finally:
@@ -287,7 +339,7 @@ class NetworkConfig(object):
             return str(node) not in self._reserved_nodes
 
     def _introspect_slurm_cluster(self):
-        cluster = SlurmCluster()
+        cluster = SlurmCluster(cache=self.slurm_cache)
         node_names = set()
         tags = dict()
         for node in cluster.nodes:
@@ -418,6 +470,44 @@ def get_benchmark_types(campaign):
                 yield benchmark.type
 
 
+ARRAY_SIDECAR_KEY = 'sidecar'
+
+
+def write_array_sidecar(prefix, columns):
+    """Write columns of an array metric in a NumPy file
+
+    :param prefix: filename without extension
+    :param columns: dict of column name -> list of values
+    :return: value to put in reports instead of the columns
+    """
+    path = prefix + '.npz'
+    np.savez_compressed(path, **columns)
+    return {ARRAY_SIDECAR_KEY: path}
+
+
+def _load_array_sidecars(path, runs):
+    """Replace references to array metrics sidecar files
+    by the columns they contain"""
+
+    def _load(run_path, measurement):
+        for name, value in measurement.items():
+            if isinstance(value, dict):
+                if set(value) == {ARRAY_SIDECAR_KEY}:
+                    sidecar = osp.join(run_path, value[ARRAY_SIDECAR_KEY])
+                    with np.load(sidecar) as data:
+                        measurement[name] = dict(
+                            (column, data[column].tolist()) for column in data.files
+                        )
+                else:
+                    _load(run_path, value)
+
+    for run in runs:
+        run_path = osp.join(path, run.get('id', ''))
+        for metric in run.get('metrics') or []:
+            _load(run_path, metric.get('measurement', {}))
+    return runs
+
+
 def get_metrics(campaign, report, top=True):
     """Extract metrics from existing campaign
 
@@ -428,40 +518,106 @@ def get_metrics(campaign, report, top=True):
     """
     if top and campaign.process.type == 'slurm':
         for path, _ in report.collect('jobid', with_path=True):
-            for child in ReportNode(path).children.values():
+            for child in report.node(path).children.values():
                 for metrics in get_metrics(campaign, child, top=False):
                     yield metrics
     else:
+        for path in report.metrics_paths():
+            with open(osp.join(path, JSON_METRICS_FILE)) as istr:
+                metrics = json.load(istr)
+            yield report.path_context(path), _load_array_sidecars(path, metrics)
 
-        def metrics_node_extract(report):
-            metrics_file = osp.join(report.path, JSON_METRICS_FILE)
-            if osp.exists(metrics_file):
-                with open(metrics_file) as istr:
-                    return json.load(istr)
 
-        def metrics_iterator(report):
-            return filter(
-                lambda eax: eax[1] is not None,
-                report.map(metrics_node_extract, with_path=True),
-            )
+class ArrayMetrics(object):
+    """Names of the measurements declared as ``ArrayMetric``
+    by the metrics extractors of the benchmarks of a campaign,
+    so that exporters do not have to guess which values are tables.
+    """
+
+    def __init__(self, campaign):
+        """
+        :param campaign: campaign loaded with `hpcbench.campaign.from_file`
+        """
+        self.campaign = campaign
+        self._names = dict()
+
+    def names(self, context, run):
+        """Get names of the array measurements of a benchmark category,
+        nested names being joined by dots.
 
-        for path, metrics in metrics_iterator(report):
-            yield report.path_context(path), metrics
+        :param context: context of the runs, as provided by ``get_metrics``
+        :param run: one of the runs of the category
+        :rtype: set of str
+        """
+        key = tuple(context.get(attr) for attr in ('tag', 'benchmark', 'category'))
+        names = self._names.get(key)
+        if names is None:
+            names = set()
+            try:
+                for extractor in self._extractors(context, run):
+                    names.update(self._array_names(extractor.metrics))
+            except Exception as exc:
+                LOGGER.warning(
+                    'Could not get metrics of benchmark %s: %s',
+                    context.get('benchmark'),
+                    exc,
+                )
+            self._names[key] = names
+        return names
+
+    def _extractors(self, context, run):
+        config = dict()
+        benchmarks = self.campaign.benchmarks
+        if context.get('tag') in benchmarks:
+            config = benchmarks[context['tag']].get(context.get('benchmark')) or {}
+        benchmark = Benchmark.get_subclass(config.get('type') or run['benchmark'])()
+        if 'attributes' in config:
+            dict_merge(benchmark.attributes, defrost(config['attributes']) or {})
+        extractors = benchmark.metrics_extractors
+        if isinstance(extractors, collections.Mapping):
+            extractors = extractors.get(context.get('category')) or []
+        if not isinstance(extractors, list):
+            extractors = [extractors]
+        return extractors
+
+    @classmethod
+    def _array_names(cls, schema, prefix=''):
+        for name, metric in schema.items():
+            if isinstance(metric, ArrayMetric):
+                yield prefix + name
+            elif isinstance(metric, dict):
+                for nested in cls._array_names(metric, prefix + name + '.'):
+                    yield nested
 
 
 class CampaignMerge(object):
-    """Merge 2 campaign directories
+    """Merge campaign directories in one pass
+
+    Every data file is read once and the merged result written once.
+    Files and directories provided by only one campaign are
+    hard-linked in the output instead of being copied. The merge and
+    the campaign drivers replace the report and metrics files instead
+    of modifying them in place, so that the linked campaigns are left
+    unchanged.
+    Sub-directories of the output campaign are merged in parallel.
     """
 
-    def __init__(self, lhs, rhs):
-        """Merge 2 campaign directories
+    def __init__(self, lhs, *rhs, **kwargs):
+        """Merge campaign directories
 
         :param lhs: path to campaign that will receive data
-        of the second campaign
-        :param rhs: campaign to merge data from
+        of the other campaigns
+        :param rhs: campaigns to merge data from
+        :param jobs: number of sub-directories merged concurrently
+        :param link: hard-link files instead of copying them,
+        default is True
         """
         self.lhs = lhs
-        self.rhs = rhs
+        self.rhs = list(rhs)
+        self.jobs = kwargs.pop('jobs', None) or multiprocessing.cpu_count()
+        self.link = kwargs.pop('link', True)
+        if kwargs:
+            raise TypeError('Unexpected arguments: ' + ', '.join(kwargs))
         self.serializers = dict(
             json=CampaignMerge.SERIALIZER_CLASS(
                 reader=CampaignMerge._reader_json, writer=CampaignMerge._writer_json
@@ -472,10 +628,16 @@ class CampaignMerge(object):
         )
 
     def merge(self):
-        """Perform merge operation between 2 campaign directories
+        """Perform merge operation of the campaign directories
         """
         self.ensure_has_same_campaigns()
-        self._merge()
+        tasks = self._merge_files('')
+        pool = ThreadPool(self.jobs)
+        try:
+            pool.map(operator.methodcaller('__call__'), tasks)
+        finally:
+            pool.close()
+            pool.join()
 
     @staticmethod
     def _reader_json(path):
@@ -489,108 +651,533 @@ class CampaignMerge(object):
 
     @staticmethod
     def _writer_json(data, path):
-        with open(path, 'w') as ostr:
+        with open(path + '.tmp', 'w') as ostr:
             json.dump(data, ostr, indent=2)
+        os.rename(path + '.tmp', path)
 
     @staticmethod
     def _writer_yaml(data, path):
-        with open(path, 'w') as ostr:
+        with open(path + '.tmp', 'w') as ostr:
             yaml.dump(data, ostr, default_flow_style=False)
+        os.rename(path + '.tmp', path)
 
     DATA_FILE_EXTENSIONS = {'yaml', 'json'}
     IGNORED_FILES = 'campaign.yaml'
+    IGNORED_ROOT_FILES = {SQLITE_INDEX_FILE, JSON_PROGRESS_FILE, JSON_SLURM_CACHE_FILE}
     SERIALIZER_CLASS = collections.namedtuple('serializer', ['reader', 'writer'])
 
-    def _merge_data_file(self, path, extension):
-        def _merge(lhs, rhs):
-            if isinstance(rhs, list):
-                lhs += rhs
-                return
-            for key in rhs.keys():
-                if key in lhs:
-                    if isinstance(lhs[key], dict) and isinstance(
-                        rhs[key], collections.Mapping
-                    ):
-                        _merge(lhs[key], rhs[key])
-                    elif isinstance(lhs[key], list) and isinstance(rhs[key], list):
-                        lhs[key] += rhs[key]
-                    elif key == 'elapsed':
-                        lhs[key] += rhs[key]
-                elif key not in lhs:
-                    lhs[key] = rhs[key]
-
-        lhs_file = osp.join(self.lhs, path)
-        rhs_file = osp.join(self.rhs, path)
-        assert osp.isfile(rhs_file)
-        assert osp.isfile(lhs_file)
-        lhs_data = self.serializers[extension].reader(lhs_file)
-        rhs_data = self.serializers[extension].reader(rhs_file)
-        _merge(lhs_data, rhs_data)
-        self.serializers[extension].writer(lhs_data, lhs_file)
+    @classmethod
+    def _merge_data(cls, lhs, rhs):
+        if isinstance(rhs, list):
+            lhs += rhs
+            return
+        for key in rhs.keys():
+            if key in lhs:
+                if isinstance(lhs[key], dict) and isinstance(
+                    rhs[key], collections.Mapping
+                ):
+                    cls._merge_data(lhs[key], rhs[key])
+                elif isinstance(lhs[key], list) and isinstance(rhs[key], list):
+                    lhs[key] += rhs[key]
+                elif key == 'elapsed':
+                    lhs[key] += rhs[key]
+            elif key not in lhs:
+                lhs[key] = rhs[key]
+
+    def _merge_data_file(self, path, extension, campaigns):
+        """Merge a data file provided by several campaigns,
+        in the order of the campaigns"""
+        serializer = self.serializers[extension]
+        data = serializer.reader(osp.join(campaigns[0], path))
+        for campaign in campaigns[1:]:
+            self._merge_data(data, serializer.reader(osp.join(campaign, path)))
+        # the writer replaces the file instead of overwriting it,
+        # it may be hard-linked to the file of another campaign
+        serializer.writer(data, osp.join(self.lhs, path))
 
     def ensure_has_same_campaigns(self):
-        """Ensure that the 2 campaigns to merge have been generated
+        """Ensure that the campaigns to merge have been generated
         from the same campaign.yaml
         """
         lhs_yaml = osp.join(self.lhs, 'campaign.yaml')
-        rhs_yaml = osp.join(self.rhs, 'campaign.yaml')
         assert osp.isfile(lhs_yaml)
-        assert osp.isfile(rhs_yaml)
-        assert filecmp.cmp(lhs_yaml, rhs_yaml)
-
-    def _merge(self):
-        for filename in os.listdir(self.rhs):
-            file_path = osp.join(self.rhs, filename)
-            if osp.isdir(file_path):
-                dest_path = osp.join(self.lhs, filename)
-                if not osp.isdir(dest_path):
-                    shutil.copytree(file_path, dest_path)
-                else:
-                    with self._push(filename):
-                        self._merge()
-            else:
-                if CampaignMerge.IGNORED_FILES in file_path:
-                    continue
-                extension = osp.splitext(filename)[1][1:]
-                if extension in CampaignMerge.DATA_FILE_EXTENSIONS:
-                    self._merge_data_file(filename, extension)
+        for rhs in self.rhs:
+            rhs_yaml = osp.join(rhs, 'campaign.yaml')
+            assert osp.isfile(rhs_yaml)
+            assert filecmp.cmp(lhs_yaml, rhs_yaml)
 
-    @contextmanager
-    def _push(self, subdir):
-        lhs = self.lhs
-        rhs = self.rhs
-        try:
-            self.lhs = osp.join(self.lhs, subdir)
-            self.rhs = osp.join(self.rhs, subdir)
-            yield
-        finally:
-            self.lhs = lhs
-            self.rhs = rhs
+    def _merge_dir(self, path):
+        for task in self._merge_files(path):
+            task()
+
+    def _merge_files(self, path):
+        """Merge the files of a directory present in several campaigns
+
+        :param path: directory relative to the campaigns
+        :return: list of callables completing the merge
+        of the sub-directories
+        """
+        campaigns = [self.lhs] + self.rhs
+        campaigns = [camp for camp in campaigns if osp.isdir(osp.join(camp, path))]
+        entries = collections.OrderedDict()
+        for campaign in campaigns:
+            for name in sorted(os.listdir(osp.join(campaign, path))):
+                entries.setdefault(name, []).append(campaign)
+        tasks = []
+        for name, owners in entries.items():
+            if name == CampaignMerge.IGNORED_FILES:
+                continue
+            if not path and name in CampaignMerge.IGNORED_ROOT_FILES:
+                continue
+            file_path = osp.join(path, name)
+            if any(owner == self.lhs for owner in owners):
+                if len(owners) == 1:
+                    continue
+                if osp.islink(osp.join(self.lhs, file_path)):
+                    continue
+                if osp.isdir(osp.join(self.lhs, file_path)):
+                    tasks.append(functools.partial(self._merge_dir, file_path))
+                    continue
+            elif len(owners) == 1 or osp.islink(osp.join(owners[0], file_path)):
+                tasks.append(
+                    functools.partial(
+                        self._link_tree,
+                        osp.join(owners[0], file_path),
+                        self.lhs,
+                        file_path,
+                    )
+                )
+                continue
+            elif osp.isdir(osp.join(owners[0], file_path)):
+                os.mkdir(osp.join(self.lhs, file_path))
+                tasks.append(functools.partial(self._merge_dir, file_path))
+                continue
+            extension = osp.splitext(name)[1][1:]
+            if extension in CampaignMerge.DATA_FILE_EXTENSIONS:
+                self._merge_data_file(file_path, extension, owners)
+            elif owners[0] != self.lhs:
+                self._link_tree(osp.join(owners[0], file_path), self.lhs, file_path)
+        return tasks
+
+    def _link_tree(self, src, root, path):
+        """Replicate a file or a directory in the output campaign"""
+        dest = osp.join(root, path)
+        if osp.islink(src):
+            os.symlink(os.readlink(src), dest)
+        elif osp.isdir(src):
+            os.mkdir(dest)
+            for name in os.listdir(src):
+                self._link_tree(osp.join(src, name), root, osp.join(path, name))
+        else:
+            if self.link:
+                try:
+                    os.link(src, dest)
+                    return
+                except OSError as exc:
+                    if exc.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                        raise
+            shutil.copy2(src, dest)
 
 
-def merge_campaigns(output_campaign, *campaigns):
+def merge_campaigns(output_campaign, *campaigns, **kwargs):
     """Merge campaign directories
 
     :param output_campaign: existing campaign directory
     where data from others campaigns will be merged into
     :param campaigns: existing campaigns to merge from
+    :param jobs: number of sub-directories merged concurrently
+    :param link: hard-link files instead of copying them,
+    default is True
+
+    The index of the output campaign, if any, is rebuilt.
+    """
+    CampaignMerge(output_campaign, *campaigns, **kwargs).merge()
+    # index of the output campaign is now outdated
+    if osp.exists(osp.join(output_campaign, SQLITE_INDEX_FILE)):
+        CampaignIndex.rebuild(output_campaign)
+
+
+class CampaignIndex(object):
+    """SQLite index of the reports of a campaign, stored
+    at the root of the campaign directory.
+
+    It mirrors the tree described by the ``children`` keys
+    of the reports, along with a selection of scalar values,
+    or lists of them, and the location of metrics files, so that ``ReportNode``
+    queries do not have to load every ``hpcbench.yaml`` file.
+    Context attributes (node, tag, ...) are derived from the
+    stored report paths.
+
+    The ``ben-sh`` processes spawned by the SLURM jobs of a campaign
+    write in the index of the parent campaign concurrently. SQLite
+    relies on file locks, that are not reliable on every network
+    file-system (NFS in particular), so the index may miss reports
+    in this case. Use ``ben-index`` to rebuild it from the reports
+    once the jobs are completed.
+    """
+
+    KEYS = {
+        'benchmark',
+        'category',
+        'command_succeeded',
+        'date',
+        'elapsed',
+        'executor',
+        'exit_status',
+        'jobid',
+        'sbatch',
+    }
+    SCALAR_TYPES = (bool, float, type(None)) + six.integer_types + six.string_types
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS report (
+            path TEXT PRIMARY KEY,
+            metrics INTEGER NOT NULL DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS child (
+            parent TEXT NOT NULL,
+            path TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (parent, path)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS field (
+            path TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (path, key)
+        )''',
+        'CREATE INDEX IF NOT EXISTS field_key ON field (key)',
+    ]
+    # ``rank`` sorts the reports like a depth-first walk of the
+    # tree, children following the order of the ``children`` lists
+    TREE_QUERY = '''
+        WITH RECURSIVE tree(path, rank) AS (
+            SELECT path, '' FROM report WHERE path = ?
+            UNION ALL
+            SELECT child.path,
+                   tree.rank || substr('0000000000' || child.position, -10)
+            FROM child
+            JOIN tree ON child.parent = tree.path
+            JOIN report ON report.path = child.path
+        )
+    '''
+
+    def __init__(self, root):
+        """
+        :param root: directory containing the index file
+        """
+        self.root = osp.realpath(root)
+        self.file = osp.join(self.root, SQLITE_INDEX_FILE)
+
+    @classmethod
+    def create(cls, root):
+        """Create an empty index in the given directory
+        if it does not exist yet.
+        """
+        index = cls(root)
+        with index._connect() as conn:
+            for statement in cls.SCHEMA:
+                conn.execute(statement)
+        return index
+
+    @classmethod
+    def find(cls, path):
+        """Look for an index in the given directory and its ancestors
+
+        :return: ``CampaignIndex`` instance or None
+        """
+        path = osp.realpath(path)
+        while True:
+            if osp.isfile(osp.join(path, SQLITE_INDEX_FILE)):
+                return cls(path)
+            parent = osp.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+    @classmethod
+    def rebuild(cls, root):
+        """Build the index of an existing campaign from scratch,
+        by walking through its reports.
+        """
+        index_file = osp.join(root, SQLITE_INDEX_FILE)
+        if osp.exists(index_file):
+            os.remove(index_file)
+        index = cls.create(root)
+        with index._connect() as conn:
+            nodes = [ReportNode(root, index=False)]
+            while nodes:
+                node = nodes.pop()
+                index._add_report(conn, node.path, node.data)
+                nodes.extend(node.children.values())
+        return index
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.file, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def relpath(self, path):
+        """Get path of a report directory relative to the index root"""
+        path = osp.relpath(osp.realpath(path), self.root)
+        return '' if path == os.curdir else path
+
+    def add_report(self, path, data, children=None):
+        """Record a report, replacing the previous one if any
+
+        :param path: report directory
+        :param data: report content
+        :param children: optional iterable of children names,
+        ``children`` key of the report is used otherwise.
+        """
+        with self._connect() as conn:
+            self._add_report(conn, path, data, children)
+
+    @classmethod
+    def _indexable(cls, value):
+        """Only scalar values, or lists of scalar values
+        like the job ids of sharded SLURM submissions, are recorded"""
+        if isinstance(value, list):
+            return all(isinstance(item, cls.SCALAR_TYPES) for item in value)
+        return isinstance(value, cls.SCALAR_TYPES)
+
+    def _add_report(self, conn, path, data, children=None):
+        rpath = self.relpath(path)
+        if children is None:
+            children = data.get('children') or []
+        metrics = osp.exists(osp.join(path, JSON_METRICS_FILE))
+        conn.execute('DELETE FROM field WHERE path = ?', (rpath,))
+        conn.execute('DELETE FROM child WHERE parent = ?', (rpath,))
+        conn.execute(
+            'INSERT OR REPLACE INTO report (path, metrics) VALUES (?, ?)',
+            (rpath, metrics),
+        )
+        conn.executemany(
+            'INSERT INTO field (path, key, value) VALUES (?, ?, ?)',
+            [
+                (rpath, key, json.dumps(value))
+                for key, value in data.items()
+                if key in self.KEYS and self._indexable(value)
+            ],
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO child (parent, path, position) VALUES (?, ?, ?)',
+            (
+                (rpath, osp.join(rpath, str(child)), position)
+                for position, child in enumerate(children)
+            ),
+        )
+
+    def add_child(self, path, child):
+        """Reference a new child of the report in the given directory"""
+        rpath = self.relpath(path)
+        with self._connect() as conn:
+            conn.execute(
+                '''INSERT OR IGNORE INTO child (parent, path, position)
+                SELECT ?, ?, COUNT(*) FROM child WHERE parent = ?''',
+                (rpath, osp.join(rpath, str(child)), rpath),
+            )
+
+    def has_report(self, path):
+        """Check whether a report is indexed"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'SELECT 1 FROM report WHERE path = ?', (self.relpath(path),)
+            )
+            return cursor.fetchone() is not None
+
+    def collect(self, path, keys, recursive=True):
+        """Get values of the given keys in the reports
+
+        :param path: directory of the top report
+        :param keys: list of keys, that must be part of ``KEYS``
+        :param recursive: look for keys in the children reports
+
+        :return: generator of tuple (relative path, values) for every
+        report providing all the keys, values being a dict.
+        """
+        rpath = self.relpath(path)
+        placeholders = ', '.join('?' * len(keys))
+        if recursive:
+            query = (
+                self.TREE_QUERY
+                + '''
+                SELECT field.path, field.key, field.value FROM tree
+                JOIN field ON field.path = tree.path
+                WHERE field.key IN ({})
+                ORDER BY tree.rank, field.key
+            '''
+            )
+        else:
+            query = '''
+                SELECT path, key, value FROM field
+                WHERE path = ? AND key IN ({})
+            '''
+        query = query.format(placeholders)
+        with self._connect() as conn:
+            rows = conn.execute(query, [rpath] + list(keys))
+            for report, fields in itertools.groupby(rows, operator.itemgetter(0)):
+                values = dict((key, json.loads(value)) for _, key, value in fields)
+                if len(values) == len(keys):
+                    yield report, values
+
+    def metrics_paths(self, path):
+        """Get directories of the metrics files in the reports tree
+
+        :param path: directory of the top report
+        :return: generator of paths relative to the index root
+        """
+        query = (
+            self.TREE_QUERY
+            + '''
+            SELECT report.path FROM tree
+            JOIN report ON report.path = tree.path
+            WHERE report.metrics
+            ORDER BY tree.rank
+        '''
+        )
+        with self._connect() as conn:
+            for row in conn.execute(query, (self.relpath(path),)):
+                yield row[0]
+
+
+def _read_file(path):
+    try:
+        with open(path) as istr:
+            return istr.read()
+    except IOError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+
+
+class ProgressJournal(object):
+    """JSON-lines file at the root of a campaign directory,
+    where the drivers append an event every time a command
+    starts or finishes, so that the progress of a campaign
+    can be followed without walking through its reports.
+
+    Every event provides at least the ``event`` name, its ``date``,
+    and the ``path`` of the emitting driver, relative to the
+    campaign directory.
     """
-    for campaign in campaigns:
-        CampaignMerge(output_campaign, campaign).merge()
 
+    def __init__(self, root):
+        """
+        :param root: directory containing the journal file
+        """
+        self.root = osp.realpath(root)
+        self.file = osp.join(self.root, JSON_PROGRESS_FILE)
+
+    @classmethod
+    def create(cls, root):
+        """Create an empty journal in the given directory
+        if it does not exist yet.
+        """
+        journal = cls(root)
+        open(journal.file, 'a').close()
+        return journal
 
-class ReportNode(collections.Mapping):
+    @classmethod
+    def find(cls, path):
+        """Look for a journal in the given directory and its ancestors
+
+        :return: ``ProgressJournal`` instance or None
+        """
+        path = osp.realpath(path)
+        while True:
+            if osp.isfile(osp.join(path, JSON_PROGRESS_FILE)):
+                return cls(path)
+            parent = osp.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+    def emit(self, event, path, **data):
+        """Append an event to the journal
+
+        :param event: event name
+        :param path: directory of the driver emitting the event
+        :param data: additional JSON serializable fields
+        """
+        data.update(
+            event=event,
+            date=datetime.datetime.now().isoformat(),
+            path=osp.relpath(osp.realpath(path), self.root),
+        )
+        line = json.dumps(data, sort_keys=True) + '\n'
+        # a single write of a file opened in append mode, so that
+        # concurrent processes do not interleave their events
+        fd = os.open(self.file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def read(self, offset=0):
+        """Read the events appended after the given offset.
+        Malformed lines are skipped, appending to a file is not atomic
+        when processes of several nodes write to it over NFS.
+
+        :return: tuple (list of events, offset of the next event)
+        """
+        with open(self.file, 'rb') as istr:
+            istr.seek(offset)
+            content = istr.read()
+        # ignore the last line if it is still being written
+        end = content.rfind(b'\n') + 1
+        events = []
+        for line in content[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                LOGGER.warning('Skipping malformed event in %s: %r', self.file, line)
+        return events, offset + end
+
+
+class ReportNode(object):
     """Navigate across hpcbench.yaml files of a campaign
+
+    Read-only mapping of the report content. It is registered as a
+    ``collections.Mapping`` instead of inheriting from it, because
+    the Python 2 ABCs do not declare ``__slots__``.
     """
 
     CONTEXT_ATTRS = ['node', 'tag', 'benchmark', 'category', 'attempt']
+    PREFETCH_PROCESS_MIN_REPORTS = 256
 
-    def __init__(self, path):
+    CACHE_SIZE = 1024
+
+    __slots__ = ('_path', '_index', '_cache')
+
+    def __init__(self, path, index=None, cache=None):
         """
         :param path: path to an existing campaign directory
         :type path: str
+        :param index: ``CampaignIndex`` to use to answer queries,
+        False to disable it, None to look for one in the campaign.
+        :param cache: ``LRUCache`` of loaded reports shared
+        by the nodes of the tree. A new one is created if None.
         """
         self._path = path
+        self._index = index
+        self._cache = cache if cache is not None else LRUCache(self.CACHE_SIZE)
+
+    @property
+    def index(self):
+        """get campaign index covering this node, if any
+        :rtype: ``CampaignIndex``
+        """
+        if self._index is None:
+            index = CampaignIndex.find(self._path)
+            if index is None or not index.has_report(self._path):
+                index = False
+            self._index = index
+        return self._index or None
 
     @property
     def path(self):
@@ -618,24 +1205,121 @@ class ReportNode(collections.Mapping):
         """
         return osp.join(self._path, YAML_REPORT_FILE)
 
-    @cached_property
+    def prefetch(self, concurrency=16, processes=0):
+        """Load reports of the entire tree in parallel,
+        level by level. Reports are read by a pool of threads.
+        Then they are parsed by a pool of processes if the level
+        is large enough, in the current process otherwise.
+        Loaded reports are kept in the cache of the tree, which is
+        not enlarged: the traversal stops when the next reports
+        do not fit in the cache, the others being loaded on demand.
+
+        :param concurrency: number of threads reading files
+        :param processes: number of processes parsing YAML,
+        0 to parse them in the current process.
+        :return: self
+        """
+        proc_pool = None
+        if processes > 0:
+            proc_pool = multiprocessing.Pool(processes)
+        try:
+            with closing(ThreadPool(concurrency)) as thread_pool:
+                level = [(self._path, self._entry[0])]
+                while level:
+                    level = self._prefetch_children(
+                        level, thread_pool, proc_pool, processes
+                    )
+        finally:
+            if proc_pool is not None:
+                proc_pool.terminate()
+        return self
+
+    def _prefetch_children(self, level, thread_pool, proc_pool, processes):
+        """Load children of the given reports, as long as
+        they fit in the cache along with their parents
+        :param level: list of tuple (path, data)
+        :return: list of tuple (path, data) of the children
+        """
+        capacity = self._cache.maxsize - len(self._cache)
+        capacity += sum(1 for path, _ in level if path in self._cache)
+        parents, candidates = [], []
+        for path, data in level:
+            names = data.get('children', [])
+            if len(parents) + len(candidates) + 1 + len(names) > capacity:
+                break
+            parents.append((path, data))
+            candidates.extend((path, data, child) for child in names)
+        reports = [
+            osp.join(path, child, YAML_REPORT_FILE) for path, _, child in candidates
+        ]
+        children = collections.OrderedDict((path, []) for path, _ in parents)
+        paths, texts = [], []
+        for (path, _, child), text in zip(
+            candidates, thread_pool.map(_read_file, reports)
+        ):
+            if text is not None:
+                children[path].append(child)
+                paths.append(osp.join(path, child))
+                texts.append(text)
+        for path, data in parents:
+            self._cache[path] = data, children[path]
+        if proc_pool is not None and len(texts) >= self.PREFETCH_PROCESS_MIN_REPORTS:
+            chunksize = max(1, len(texts) // (4 * processes))
+            datas = proc_pool.map(yaml.safe_load, texts, chunksize)
+        else:
+            datas = [yaml.safe_load(text) for text in texts]
+        return list(zip(paths, datas))
+
+    @property
+    def _entry(self):
+        """get tuple (data, children names) of the report from the cache,
+        load it if missing.
+        """
+        entry = self._cache.get(self._path)
+        if entry is None:
+            with open(self.report) as istr:
+                data = yaml.safe_load(istr)
+            children = [
+                child
+                for child in data.get('children', [])
+                if osp.exists(osp.join(self._path, child, YAML_REPORT_FILE))
+            ]
+            entry = data, children
+            self._cache[self._path] = entry
+        return entry
+
+    @property
     def data(self):
         """get content of hpcbench.yaml
         :rtype: dict
         """
-        with open(self.report) as istr:
-            return yaml.safe_load(istr)
+        return self._entry[0]
 
-    @cached_property
-    @listify(wrapper=dict)
+    @property
+    @listify(wrapper=collections.OrderedDict)
     def children(self):
         """get children node referenced as `children` in the
-        report.
+        report. Nodes are built on every call, only their names
+        are kept in the cache.
         :rtype: dict with name (str) -> node (ReportNode)
         """
-        for child in self.data.get('children', []):
-            if osp.exists(osp.join(self.path, child, YAML_REPORT_FILE)):
-                yield child, self.__class__(osp.join(self.path, child))
+        for child in self._entry[1]:
+            yield child, self.node(osp.join(self._path, child))
+
+    def node(self, path):
+        """get node of another report of the tree, sharing
+        the index and the cache of this node
+        :rtype: ReportNode
+        """
+        return self.__class__(path, index=self.index or False, cache=self._cache)
+
+    def _from_index_path(self, path):
+        path = osp.relpath(
+            path or os.curdir, self.index.relpath(self._path) or os.curdir
+        )
+        if path == os.curdir:
+            return self._path
+        return osp.join(self._path, path)
 
     def map(self, func, **kwargs):
         """Generator function returning result of
@@ -675,6 +1359,19 @@ class ReportNode(collections.Mapping):
         """
         if not keys:
             raise Exception('Missing key')
+        if self.index is not None and set(keys) <= CampaignIndex.KEYS:
+            reports = self.index.collect(
+                self._path, keys, recursive=kwargs.get('recursive', True)
+            )
+            for path, values in reports:
+                values = tuple([values[key] for key in keys])
+                if len(values) == 1:
+                    values = values[0]
+                if kwargs.get('with_path', False):
+                    yield self._from_index_path(path), values
+                else:
+                    yield values
+            return
         has_values = functools.reduce(
             operator.__and__, [key in self.data for key in keys], True
         )
@@ -691,6 +1388,24 @@ class ReportNode(collections.Mapping):
                 for value in child.collect(*keys, **kwargs):
                     yield value
 
+    def metrics_paths(self):
+        """Generator function providing the directories
+        containing a metrics file in the tree structure.
+
+        :rtype: generator of string
+        """
+        if self.index is not None:
+            for path in self.index.metrics_paths(self._path):
+                yield self._from_index_path(path)
+        else:
+
+            def has_metrics(report):
+                return osp.exists(osp.join(report.path, JSON_METRICS_FILE))
+
+            for path, metrics in self.map(has_metrics, with_path=True):
+                if metrics:
+                    yield path
+
     def collect_one(self, *args, **kwargs):
         """Same as `collect` but expects to have only one result.
 
@@ -715,3 +1430,21 @@ class ReportNode(collections.Mapping):
 
     def __iter__(self):
         return iter(self.data)
+
+    def __contains__(self, item):
+        return item in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def keys(self):
+        return self.data.keys()
+
+    def items(self):
+        return self.data.items()
+
+    def values(self):
+        return self.data.values()
+
+
+collections.Mapping.register(ReportNode)
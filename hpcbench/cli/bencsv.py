@@ -1,8 +1,9 @@
 """ben-csv - Export campaign CSV
 
 Usage:
-  ben-csv [-v | -vv] [-l LOGFILE] [-o CSVFILE] [-f FIELDS] CAMPAIGN-DIR
-  ben-csv [-v | -vv] -p  CAMPAIGN-DIR
+  ben-csv [-v | -vv] [-l LOGFILE] [-o CSVFILE] [-f FIELDS] [--long]
+          [--prefetch=PROCESSES] CAMPAIGN-DIR
+  ben-csv [-v | -vv] [--long] [--prefetch=PROCESSES] -p  CAMPAIGN-DIR
   ben-csv (-h | --help)
   ben-csv --version
 
@@ -11,6 +12,12 @@ Options:
   -f --fields=FIELDS   comma-separated list of fields that should be output
                        in CSV
   -p --peek            peek into campaign and print out all CSV column names
+  --long               write one row per element of list-valued metrics
+                       instead of one column per element
+  --prefetch=PROCESSES  Load the reports of the campaign in parallel
+                       before the export, parsing them with PROCESSES
+                       processes. At most 1024 reports are kept in
+                       memory, the others are loaded during the export.
   -l --log=LOGFILE     Specify an option logfile to write to
   -h, --help           Show this screen
   --version            Show version
@@ -24,7 +31,11 @@ from . import cli_common
 def main(argv=None):
     """ben-csv entry point"""
     arguments = cli_common(__doc__, argv=argv)
-    csv_export = CSVExporter(arguments['CAMPAIGN-DIR'], arguments['--output'])
+    csv_export = CSVExporter(
+        arguments['CAMPAIGN-DIR'], arguments['--output'], tidy=arguments['--long']
+    )
+    if arguments['--prefetch']:
+        csv_export.report.prefetch(processes=int(arguments['--prefetch']))
     if arguments['--peek']:
         csv_export.peek()
     else:
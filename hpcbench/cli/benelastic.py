@@ -1,12 +1,25 @@
 """ben-elastic - Export campaign in Elasticsearch
 
 Usage:
-  ben-elastic [-v | -vv] [-l LOGFILE] [--es=<host>] CAMPAIGN-DIR
+  ben-elastic [-v | -vv] [-l LOGFILE] [--es=<host>] [-j JOBS] [--incremental]
+              [--prefetch=PROCESSES] CAMPAIGN-DIR
+  ben-elastic [-v | -vv] [-l LOGFILE] [--incremental] -o DIR
+              [--file-size=BYTES] [--prefetch=PROCESSES] CAMPAIGN-DIR
   ben-elastic (-h | --help)
   ben-elastic --version
 
 Options:
   --es=<host>       Elasticsearch host [default: localhost]
+  -j --jobs=JOBS    Number of concurrent bulk requests [default: 4]
+  --incremental     Only push runs added since the last export
+  -o --output=DIR   Write bulk requests in compressed NDJSON files in DIR
+                    instead of pushing them. Use ben-ingest to load them.
+  --file-size=BYTES  Uncompressed size of the NDJSON files
+                     [default: 104857600]
+  --prefetch=PROCESSES  Load the reports of the campaign in parallel
+                    before the export, parsing them with PROCESSES processes.
+                    At most 1024 reports are kept in memory,
+                    the others are loaded during the export.
   -l --log=LOGFILE  Specify an option logfile to write to
   -h, --help        Show this screen
   --version         Show version
@@ -20,7 +33,17 @@ from . import cli_common
 def main(argv=None):
     """ben-elastic entry point"""
     arguments = cli_common(__doc__, argv=argv)
-    es_export = ESExporter(arguments['CAMPAIGN-DIR'], arguments['--es'])
-    es_export.export()
+    es_export = ESExporter(
+        arguments['CAMPAIGN-DIR'],
+        arguments['--es'],
+        workers=int(arguments['--jobs']),
+        incremental=arguments['--incremental'],
+    )
+    if arguments['--prefetch']:
+        es_export.report.prefetch(processes=int(arguments['--prefetch']))
+    if arguments['--output']:
+        es_export.dump(arguments['--output'], int(arguments['--file-size']))
+    else:
+        es_export.export()
     if argv is not None:
         return es_export
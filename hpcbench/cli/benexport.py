@@ -0,0 +1,71 @@
+"""ben-export - Export campaign to several formats at once
+
+The campaign is read once, whatever the number of outputs.
+
+Usage:
+  ben-export [-v | -vv] [-l LOGFILE] [--csv=CSVFILE] [--long] [--npz=FILE]
+             [--es=<host>] [-j JOBS] [--incremental] [--es-dump=DIR]
+             [--prefetch=PROCESSES] CAMPAIGN-DIR
+  ben-export (-h | --help)
+  ben-export --version
+
+Options:
+  --csv=CSVFILE     Write metrics in a CSV file
+  --long            write one row per element of list-valued metrics
+                    instead of one column per element in the CSV file
+  --npz=FILE        Write metrics as NumPy arrays, in a .npz file
+                    or a directory of .npy files
+  --es=<host>       Push metrics to Elasticsearch
+  -j --jobs=JOBS    Number of concurrent Elasticsearch bulk requests
+                    [default: 4]
+  --incremental     Only push runs added since the last Elasticsearch export
+  --es-dump=DIR     Write Elasticsearch bulk requests in DIR,
+                    see ben-ingest
+  --prefetch=PROCESSES  Load the reports of the campaign in parallel
+                    before the export, parsing them with PROCESSES processes.
+                    At most 1024 reports are kept in memory,
+                    the others are loaded during the export.
+  -l --log=LOGFILE  Specify an option logfile to write to
+  -h, --help        Show this screen
+  --version         Show version
+  -v -vv            Increase program verbosity
+"""
+
+import functools
+import sys
+
+from hpcbench.export import CSVExporter, ESExporter, ExportPipeline, NPZExporter
+from . import cli_common
+
+
+def main(argv=None):
+    """ben-export entry point"""
+    arguments = cli_common(__doc__, argv=argv)
+    campaign_path = arguments['CAMPAIGN-DIR']
+    pipeline = ExportPipeline(campaign_path)
+    if arguments['--csv']:
+        exporter = CSVExporter(
+            campaign_path, arguments['--csv'], tidy=arguments['--long']
+        )
+        pipeline.register(exporter.export)
+    if arguments['--npz']:
+        pipeline.register(NPZExporter(campaign_path, arguments['--npz']).export)
+    for option in ['--es', '--es-dump']:
+        if arguments[option]:
+            exporter = ESExporter(
+                campaign_path,
+                arguments['--es'],
+                workers=int(arguments['--jobs']),
+                incremental=arguments['--incremental'],
+            )
+            if option == '--es':
+                pipeline.register(exporter.export)
+            else:
+                pipeline.register(functools.partial(exporter.dump, arguments[option]))
+    if not pipeline.sinks:
+        sys.exit('ben-export: at least one output must be specified')
+    if arguments['--prefetch']:
+        pipeline.report.prefetch(processes=int(arguments['--prefetch']))
+    pipeline.run()
+    if argv is not None:
+        return pipeline
@@ -0,0 +1,24 @@
+"""ben-index - Rebuild the metadata index of an existing campaign
+
+Usage:
+  ben-index [-v | -vv] [-l LOGFILE] CAMPAIGN-DIR
+  ben-index (-h | --help)
+  ben-index --version
+
+Options:
+  -h --help         Show this screen
+  --version         Show version
+  -l --log=LOGFILE  Specify an option logfile to write to
+  -v -vv            Increase program verbosity
+"""
+
+from hpcbench.campaign import CampaignIndex
+from . import cli_common
+
+
+def main(argv=None):
+    """ben-index entry point"""
+    arguments = cli_common(__doc__, argv=argv)
+    index = CampaignIndex.rebuild(arguments['CAMPAIGN-DIR'])
+    if argv is not None:
+        return index
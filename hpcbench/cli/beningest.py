@@ -0,0 +1,30 @@
+"""ben-ingest - Load in Elasticsearch the bulk requests written by
+ben-elastic --output
+
+Usage:
+  ben-ingest [-v | -vv] [-l LOGFILE] [--es=<host>] [-j JOBS] DIR
+  ben-ingest (-h | --help)
+  ben-ingest --version
+
+Options:
+  --es=<host>       Elasticsearch host [default: localhost]
+  -j --jobs=JOBS    Number of concurrent bulk requests [default: 4]
+  -l --log=LOGFILE  Specify an option logfile to write to
+  -h, --help        Show this screen
+  --version         Show version
+  -v -vv            Increase program verbosity
+"""
+
+from hpcbench.export import ESBulkLoader
+from . import cli_common
+
+
+def main(argv=None):
+    """ben-ingest entry point"""
+    arguments = cli_common(__doc__, argv=argv)
+    loader = ESBulkLoader(
+        arguments['DIR'], arguments['--es'], workers=int(arguments['--jobs'])
+    )
+    loader.load()
+    if argv is not None:
+        return loader
@@ -1,12 +1,17 @@
 """ben-merge
 
 Usage:
-  ben-merge [-v | -vv ] [-l LOGFILE]
+  ben-merge [-v | -vv ] [-l LOGFILE] [-j JOBS] [--copy]
             CAMPAIGN-DIR CAMPAIGN-DIR [CAMPAIGN-DIR ...]
   ben-merge (-h | --help)
   ben-merge --version
 
+The first campaign directory receives the data of the others.
+Files provided by only one campaign are hard-linked unless --copy is given.
+
 Options:
+  -j --jobs=JOBS    Number of directories merged concurrently
+  --copy            Copy files instead of hard-linking them
   -h --help         Show this screen
   -l --log=LOGFILE  Specify an option logfile to write to
   --version         Show version
@@ -20,4 +25,9 @@ from . import cli_common
 def main(argv=None):
     """ben-merge entry point"""
     arguments = cli_common(__doc__, argv=argv)
-    merge_campaigns(*arguments['CAMPAIGN-DIR'])
+    jobs = arguments['--jobs']
+    merge_campaigns(
+        *arguments['CAMPAIGN-DIR'],
+        jobs=int(jobs) if jobs else None,
+        link=not arguments['--copy']
+    )
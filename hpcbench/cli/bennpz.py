@@ -0,0 +1,40 @@
+"""ben-npz - Export campaign metrics as NumPy arrays
+
+Usage:
+  ben-npz [-v | -vv] [-l LOGFILE] [-o OUTPUT] [--prefetch=PROCESSES]
+          CAMPAIGN-DIR
+  ben-npz (-h | --help)
+  ben-npz --version
+
+Options:
+  -o --output=OUTPUT  .npz file, or directory where .npy files are written.
+                      Default is CAMPAIGN-DIR name with .npz extension
+  --prefetch=PROCESSES  Load the reports of the campaign in parallel
+                      before the export, parsing them with PROCESSES
+                      processes. At most 1024 reports are kept in
+                      memory, the others are loaded during the export.
+  -l --log=LOGFILE    Specify an option logfile to write to
+  -h, --help          Show this screen
+  --version           Show version
+  -v -vv              Increase program verbosity
+"""
+
+import os.path as osp
+
+from hpcbench.export import NPZExporter
+from . import cli_common
+
+
+def main(argv=None):
+    """ben-npz entry point"""
+    arguments = cli_common(__doc__, argv=argv)
+    campaign_dir = arguments['CAMPAIGN-DIR']
+    output = arguments['--output']
+    if output is None:
+        output = osp.basename(osp.normpath(campaign_dir)) + '.npz'
+    npz_export = NPZExporter(campaign_dir, output)
+    if arguments['--prefetch']:
+        npz_export.report.prefetch(processes=int(arguments['--prefetch']))
+    npz_export.export()
+    if argv is not None:
+        return npz_export
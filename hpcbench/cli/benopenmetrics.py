@@ -0,0 +1,35 @@
+"""ben-openmetrics - Export campaign in OpenMetrics text format
+
+The file can be written in the directory of the textfile collector
+of the Prometheus node exporter.
+
+Usage:
+  ben-openmetrics [-v | -vv] [-l LOGFILE] [-o FILE] [--watch=SECONDS]
+                  CAMPAIGN-DIR
+  ben-openmetrics (-h | --help)
+  ben-openmetrics --version
+
+Options:
+  -o --output=FILE   Output file [default: hpcbench.prom]
+  --watch=SECONDS    Refresh the file periodically until
+                     the campaign is complete
+  -l --log=LOGFILE   Specify an option logfile to write to
+  -h, --help         Show this screen
+  --version          Show version
+  -v -vv             Increase program verbosity
+"""
+
+from hpcbench.export import OpenMetricsExporter
+from . import cli_common
+
+
+def main(argv=None):
+    """ben-openmetrics entry point"""
+    arguments = cli_common(__doc__, argv=argv)
+    exporter = OpenMetricsExporter(arguments['CAMPAIGN-DIR'], arguments['--output'])
+    if arguments['--watch']:
+        exporter.watch(float(arguments['--watch']))
+    else:
+        exporter.export()
+    if argv is not None:
+        return exporter
@@ -2,7 +2,7 @@
 
 Usage:
   ben-sh [-v | -vv] [-r TAG] [-e NODES] [-n HOST] [-o OUTDIR] [-l LOGFILE]
-         [--campaign-path-fd FD]
+         [--campaign-path-fd FD] [--refresh-slurm-cache] [--shard=SHARD]
          [-g] CAMPAIGN_FILE
   ben-sh (-h | --help)
   ben-sh --version
@@ -16,9 +16,14 @@ Options:
   -r --srun=TAG             Go into srun mode and run on one tag, which is used
                             when ben-sh is called as a dependent process inside
                             a SLURM job.
+  --shard=SHARD             Only execute one part of the commands, given as
+                            i/N where i is the part index, starting at 0,
+                            and N the number of parts.
   -h --help                 Show this screen
   -g                        Generate a default YAML campaign file
   --campaign-path-fd=FD     Write campaign path to file descriptor
+  --refresh-slurm-cache     Query SLURM again instead of reusing the cluster
+                            information cached in the campaign directory
   --version                 Show version
   -v -vv                    Increase program verbosity
 """
@@ -32,6 +37,22 @@ from hpcbench.driver import CampaignDriver
 from . import cli_common
 
 
+def parse_shard(value):
+    """Parse ``--shard`` option
+
+    :return: tuple (index, count) or None
+    """
+    if value is None:
+        return None
+    try:
+        index, count = [int(item) for item in value.split('/')]
+    except ValueError:
+        raise Exception('Invalid shard, expected i/N: ' + value)
+    if not 0 <= index < count:
+        raise Exception('Invalid shard, expected 0 <= i < N: ' + value)
+    return index, count
+
+
 def main(argv=None):
     """ben-sh entry point"""
     arguments = cli_common(__doc__, argv=argv)
@@ -52,6 +73,8 @@ def main(argv=None):
             output_dir=output_dir,
             srun=srun_tag,
             exclude_nodes=exclude_nodes,
+            refresh_slurm_cache=arguments['--refresh-slurm-cache'],
+            shard=parse_shard(arguments.get('--shard')),
         )
         driver()
         if argv is not None:
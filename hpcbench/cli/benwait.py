@@ -2,46 +2,74 @@
 
 Usage:
   ben-wait [-v | -vv] [--interval=<seconds>] [-l LOGFILE]
-           [--silent] [--format=<format>]
+           [--silent] [--format=<format>] [--prefetch=PROCESSES]
            CAMPAIGN-DIR
   ben-wait (-h | --help)
   ben-wait --version
 
 Options:
   -l --log=LOGFILE                    Specify an option logfile to write to.
-  -n <seconds>, --interval <seconds>  Specify wait interval [default: 10].
+  -n <seconds>, --interval <seconds>  Specify maximum wait interval
+                                      between two polls [default: 10].
   -s --silent                         Do you write campaign status to console
   -f --format=FORMAT                  Campaign status output format.
                                       possible values: json, yaml, log[default]
+  --prefetch=PROCESSES                Load the reports of the campaign
+                                      in parallel once the jobs are
+                                      completed, parsing them with
+                                      PROCESSES processes. At most 1024
+                                      reports are kept in memory.
   -h --help                           Show this screen.
   --version                           Show version.
   -v -vv                              Increase program verbosity.
 
 Exit status:
-  exits 1 if at least one of the benchmark executions fails, 0 otherwise.
+  exits 1 if at least one of the benchmark executions fails,
+  or if the campaign driver stopped before completing, 0 otherwise.
+
+Campaigns providing a progress journal are followed while running,
+the status of every benchmark being written as soon as it completes.
+The final status of campaigns submitted to SLURM is read from the reports.
+Waiting stops if the ben-sh process running the campaign on this host
+is not running anymore.
 """
 from __future__ import print_function
 import errno
 import json
 import logging
+import os
+import os.path as osp
+import socket
 import sys
 import time
 
 from cached_property import cached_property
 import yaml
 
-from hpcbench.campaign import ReportNode
+from hpcbench.campaign import JSON_PROGRESS_FILE, ProgressJournal, ReportNode
 from hpcbench.toolbox.functools_ext import listify
 from hpcbench.toolbox.slurm import Job
+from hpcbench.toolbox.watch import FileWatcher
 from . import cli_common
 
 
+POLL_INITIAL_INTERVAL = 1
+
+
 class ReportStatus:
     """Build a dictionary reporting benchmarks execution status"""
 
-    def __init__(self, report, jobs):
+    def __init__(self, report, jobs, benchmarks=None, complete=True):
+        """
+        :param benchmarks: status of the benchmarks if already known,
+        otherwise they are collected from the reports
+        :param complete: False if the campaign driver stopped
+        before completing
+        """
         self.__report = report
         self.__jobs = jobs
+        self.__benchmarks = benchmarks
+        self.__complete = complete
 
     @property
     def slurm_sbatches(self):
@@ -70,31 +98,46 @@ class ReportStatus:
     def succeeded(self):
         ok = all(benchmark['succeeded'] for benchmark in self._benchmarks_status())
         ok &= all(job.get('exit_code', True) for job in self.jobs)
-        return ok
+        return ok and self.__complete
 
-    def log(self, fmt):
+    def log(self, fmt, benchmarks=True):
+        """Write status to standard output
+
+        :param benchmarks: False not to write the status of the
+        benchmarks in ``log`` format, if already written
+        """
         if fmt == 'yaml':
             yaml.dump(self.status, sys.stdout, default_flow_style=False)
         elif fmt == 'json':
             json.dump(self.status, sys.stdout, indent=2)
             print()
         elif fmt == 'log':
-            attrs = self.report.CONTEXT_ATTRS + ['succeeded']
-            for benchmark in self.status['benchmark']:
-                fields = [field + '=' + str(benchmark[field]) for field in attrs]
-                print('benchmark', *fields)
+            if benchmarks:
+                for benchmark in self.status['benchmark']:
+                    self.log_benchmark(benchmark)
             for job in self.jobs:
                 print('sbatch', *[k + '=' + str(v) for k, v in job.items()])
         else:
             raise Exception('Unknown format: ' + fmt)
 
+    @classmethod
+    def log_benchmark(cls, benchmark):
+        """Write status of a benchmark in ``log`` format"""
+        attrs = ReportNode.CONTEXT_ATTRS + ['succeeded']
+        fields = [field + '=' + str(benchmark[field]) for field in attrs]
+        print('benchmark', *fields)
+
     @listify
     def _benchmarks_status(self):
+        if self.__benchmarks is not None:
+            for benchmark in self.__benchmarks:
+                yield benchmark
+            return
         roots = []
         if self.slurm_sbatches:
             for sbatch in self.report.children.values():
                 for tag in sbatch.children.values():
-                    assert len(tag.children) <= 1
+                    # one campaign per shard of the tag
                     for root in tag.children.values():
                         roots.append(root)
         else:
@@ -106,40 +149,204 @@ class ReportStatus:
                 yield ctx
 
 
-@listify
-def wait_for_completion(report, interval=10):
+class ProgressMonitor(object):
+    """Follow the progress journal of a campaign, to report
+    the status of the benchmarks as soon as they complete"""
+
+    ROOT = '.'
+
+    def __init__(self, report, listener=None):
+        """
+        :param report: memory representation of a campaign report
+        :param listener: optional callable given the status
+        of every benchmark when it completes
+        """
+        self.report = report
+        self.listener = listener
+        self.journal = ProgressJournal(report.path)
+        self.watcher = FileWatcher(self.journal.file)
+        self.offset = 0
+        self.campaigns = {self.ROOT}
+        self.benchmarks = []
+        self.finished = False
+        self.driver = None
+
+    @classmethod
+    def available(cls, path):
+        """Check whether the campaign in the given directory
+        provides a progress journal"""
+        return osp.isfile(osp.join(path, JSON_PROGRESS_FILE))
+
+    def update(self):
+        """Process the events appended since the previous call"""
+        events, self.offset = self.journal.read(self.offset)
+        for event in events:
+            name, path = event['event'], event['path']
+            if name == 'campaign_started':
+                self.campaigns.add(path)
+                if path == self.ROOT:
+                    self.driver = event.get('host'), event.get('pid')
+            elif name == 'campaign_finished':
+                self.finished |= path == self.ROOT
+            elif name == 'execution_finished':
+                benchmark = self._context(path)
+                benchmark.update(succeeded=event['succeeded'])
+                self.benchmarks.append(benchmark)
+                if self.listener is not None:
+                    self.listener(benchmark)
+
+    def wait(self, timeout):
+        """Process events during the given duration, in seconds"""
+        deadline = time.time() + timeout
+        self.update()
+        remaining = timeout
+        while remaining > 0:
+            self.watcher.wait(remaining)
+            self.update()
+            remaining = deadline - time.time()
+
+    def wait_campaign(self, interval=10):
+        """Process events until the campaign driver completes.
+
+        :param interval: maximum duration between two reads
+        of the journal, for modifications not notified by inotify
+        :return: False if the campaign driver stopped before completing
+        """
+        self.update()
+        while not self.finished:
+            if not self.driver_alive():
+                # read the events written before the driver stopped
+                self.update()
+                if not self.finished:
+                    logging.error(
+                        'campaign driver (pid %s) stopped before completing',
+                        self.driver[1],
+                    )
+                return self.finished
+            self.watcher.wait(interval)
+            self.update()
+        return True
+
+    def driver_alive(self):
+        """Check whether the process of the campaign driver is running.
+        Drivers running on another host, or not started yet,
+        are considered alive"""
+        host, pid = self.driver or (None, None)
+        if pid is None or host != socket.gethostname():
+            return True
+        try:
+            os.kill(pid, 0)
+        except OSError as exc:
+            return exc.errno != errno.ESRCH
+        return True
+
+    def close(self):
+        self.watcher.close()
+
+    def _context(self, path):
+        """Build dictionary of fields extracted from
+        the path of an execution, relative to the campaign
+        of the SLURM job that ran it, if any"""
+        root = self.ROOT
+        for campaign in self.campaigns:
+            if len(campaign) > len(root) and path.startswith(campaign + os.sep):
+                root = campaign
+        relative_path = path if root == self.ROOT else osp.relpath(path, root)
+        context = dict(zip(ReportNode.CONTEXT_ATTRS, relative_path.split(os.sep)))
+        context.update(path=osp.join(self.report.path, path))
+        return context
+
+
+def wait_for_completion(report, interval=10, monitor=None):
     """Wait for asynchronous jobs stil running in the given campaign.
 
+    All the outstanding jobs are polled with a single ``sacct`` command,
+    the delay between two polls doubling up to ``interval``.
+
     :param report: memory representation of a campaign report
     :type campaign: ReportNode
-    :param interval: wait interval
+    :param interval: maximum wait interval
     :type interval: int or float
-    :return: list of asynchronous job identifiers
+    :param monitor: progress events are processed while waiting
+    :type monitor: ProgressMonitor
+    :return: list of asynchronous job descriptions
     """
+    jobids = []
     for jobid in report.collect('jobid'):
+        # sharded tags submitted as separate jobs provide a list
+        jobids.extend(jobid if isinstance(jobid, list) else [jobid])
+    jobids = [str(jobid) for jobid in jobids]
+    jobs = dict()
+    pending = jobids
+    delay = min(POLL_INITIAL_INTERVAL, interval)
+    while pending:
         try:
-            if not Job.finished(jobid):
-                logging.info('waiting for SLURM job %s', jobid)
-                time.sleep(interval)
-                while not Job.finished(jobid):
-                    time.sleep(interval)
-            yield Job.fromid(jobid)._asdict()
+            jobs.update(Job.finished_jobs(pending))
         except OSError as e:
             if e.errno == errno.ENOENT:
-                yield dict(id=str(jobid))
+                return [dict(id=jobid) for jobid in jobids]
+            raise e
+        pending = [jobid for jobid in pending if jobid not in jobs]
+        if pending:
+            logging.info('waiting for SLURM jobs %s', ','.join(pending))
+            if monitor is None:
+                time.sleep(delay)
             else:
-                raise e
+                monitor.wait(delay)
+            delay = min(2 * delay, interval)
+    return [jobs[jobid]._asdict() for jobid in jobids]
 
 
 def main(argv=None):
     """ben-wait entry point"""
     arguments = cli_common(__doc__, argv=argv)
-    report = ReportNode(arguments['CAMPAIGN-DIR'])
-    jobs = wait_for_completion(report, float(arguments['--interval']))
-    status = ReportStatus(report, jobs)
-    if not arguments['--silent']:
-        fmt = arguments['--format'] or 'log'
-        status.log(fmt)
+    path = arguments['CAMPAIGN-DIR']
+    interval = float(arguments['--interval'])
+    fmt = None if arguments['--silent'] else arguments['--format'] or 'log'
+    if ProgressMonitor.available(path):
+        # report status of benchmarks as soon as they complete
+        listener = ReportStatus.log_benchmark if fmt == 'log' else None
+        monitor = ProgressMonitor(ReportNode(path), listener=listener)
+        try:
+            complete = monitor.wait_campaign(interval)
+            report = ReportNode(path)
+            jobs = []
+            # reports of an interrupted campaign may be missing
+            if complete:
+                jobs = wait_for_completion(report, interval, monitor)
+                monitor.update()
+        finally:
+            monitor.close()
+        if jobs:
+            # events of the SLURM jobs may not be visible yet
+            # on a network file-system, unlike their reports
+            status = ReportStatus(report, jobs)
+            logged = set(benchmark['path'] for benchmark in monitor.benchmarks)
+            missed = [
+                benchmark
+                for benchmark in status.status['benchmark']
+                if benchmark['path'] not in logged
+            ]
+        else:
+            status = ReportStatus(
+                report, jobs, benchmarks=monitor.benchmarks, complete=complete
+            )
+            missed = []
+        if fmt == 'log':
+            for benchmark in missed:
+                ReportStatus.log_benchmark(benchmark)
+        if fmt is not None:
+            status.log(fmt, benchmarks=False)
+    else:
+        report = ReportNode(path)
+        jobs = wait_for_completion(report, interval)
+        if arguments['--prefetch']:
+            # reports written by the jobs are not in the cache yet
+            report = ReportNode(path)
+            report.prefetch(processes=int(arguments['--prefetch']))
+        status = ReportStatus(report, jobs)
+        if fmt is not None:
+            status.log(fmt)
     if argv is None:
         sys.exit(0 if status.succeeded else 1)
     return status.status
@@ -1,6 +1,8 @@
 import datetime
 import errno
 import logging
+import os
+import shutil
 import types
 from abc import ABCMeta, abstractmethod, abstractproperty
 from collections import namedtuple
@@ -12,10 +14,10 @@ import yaml
 from cached_property import cached_property
 
 from hpcbench.api import Cluster
-from hpcbench.campaign import YAML_REPORT_FILE
+from hpcbench.campaign import CampaignIndex, ProgressJournal, YAML_REPORT_FILE
 from hpcbench.toolbox.collections_ext import nameddict, FrozenList, FrozenDict
 from hpcbench.toolbox.contextlib_ext import pushd, Timer
-from hpcbench.toolbox.functools_ext import listify
+from hpcbench.toolbox import pairing
 
 
 LOGGER = logging.getLogger('hpcbench')
@@ -31,14 +33,31 @@ Top.__new__.__defaults__ = (None,) * len(Top._fields)
 
 def write_yaml_report(func):
     """Decorator used in campaign node post-processing
+
+    When the decorated function returns a generator, children
+    names are journaled to disk as they are yielded instead
+    of being kept in memory.
+    The report is also recorded in the campaign index, if any.
     """
 
     @wraps(func)
     def _wrapper(*args, **kwargs):
         now = datetime.datetime.now()
+        no_exec = "no_exec" in kwargs
+        journal = None
         with Timer() as timer:
             data = func(*args, **kwargs)
-            if isinstance(data, (SEQUENCES, types.GeneratorType)):
+            if isinstance(data, types.GeneratorType):
+                report = dict()
+                if no_exec:
+                    for _ in data:
+                        pass
+                else:
+                    journal = ChildrenJournal(YAML_REPORT_FILE + '.children')
+                    with journal:
+                        for child in data:
+                            journal.append(child)
+            elif isinstance(data, SEQUENCES):
                 report = dict(children=list(map(str, data)))
             elif isinstance(data, MAPPINGS):
                 report = data
@@ -46,14 +65,85 @@ def write_yaml_report(func):
                 raise Exception('Unexpected data type: %s', type(data))
         report['elapsed'] = timer.elapsed
         report['date'] = now.isoformat()
-        if "no_exec" not in kwargs and report is not None:
-            with open(YAML_REPORT_FILE, 'w') as ostr:
+        if not no_exec:
+            index = campaign_index(args[0]) if args else None
+            if index is not None:
+                index.add_report(os.getcwd(), report, journal)
+            with open(YAML_REPORT_FILE + '.tmp', 'w') as ostr:
                 yaml.dump(report, ostr, default_flow_style=False)
+                if journal is not None:
+                    journal.dump(ostr)
+            os.rename(YAML_REPORT_FILE + '.tmp', YAML_REPORT_FILE)
         return report
 
     return _wrapper
 
 
+def campaign_index(driver):
+    """Get index of the campaign the given driver belongs to, if any"""
+    index = getattr(getattr(driver, 'root', None), 'index', None)
+    if isinstance(index, CampaignIndex):
+        return index
+
+
+def emit_progress(driver, event, **data):
+    """Record an event in the progress journal of the campaign
+    the given driver belongs to, if any. The event path is
+    the current working directory.
+    """
+    journal = getattr(getattr(driver, 'root', None), 'progress', None)
+    if isinstance(journal, ProgressJournal):
+        journal.emit(event, os.getcwd(), **data)
+
+
+def yaml_list_item(value):
+    """:return: YAML block sequence entry of the given value
+    """
+    return yaml.safe_dump([value], default_flow_style=False)
+
+
+class ChildrenJournal(object):
+    """Append-only file of children names, used to build reports
+    of nodes having a lot of children without keeping their names
+    in memory.
+    """
+
+    def __init__(self, path):
+        self.path = osp.abspath(path)
+        self.count = 0
+        self._ostr = None
+
+    def __enter__(self):
+        self._ostr = open(self.path, 'w')
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._ostr.close()
+
+    def __iter__(self):
+        with open(self.path) as istr:
+            for line in istr:
+                yield yaml.safe_load(line)[0]
+
+    def append(self, child):
+        """Record a new child, flushed immediately to disk"""
+        self._ostr.write(yaml_list_item(str(child)))
+        self._ostr.flush()
+        self.count += 1
+
+    def dump(self, ostr):
+        """Write the ``children`` YAML key to the given stream
+        and remove the journal file
+        """
+        if self.count:
+            ostr.write('children:\n')
+            with open(self.path) as istr:
+                shutil.copyfileobj(istr, ostr)
+        else:
+            ostr.write('children: []\n')
+        os.remove(self.path)
+
+
 class Enumerator(six.with_metaclass(ABCMeta, object)):
     """Common class for every campaign node"""
 
@@ -103,21 +193,40 @@ class Enumerator(six.with_metaclass(ABCMeta, object)):
             yield self.child_builder(child)
 
     @classmethod
-    def _add_child_to_report(cls, child):
-        try:
-            with open(YAML_REPORT_FILE) as istr:
-                data = yaml.safe_load(istr)
-        except IOError as e:
-            if e.errno != errno.ENOENT:
-                raise
-            data = {}
-        data.setdefault('children', []).append(str(child))
-        with open(YAML_REPORT_FILE, 'w') as ostr:
-            yaml.dump(data, ostr, default_flow_style=False)
+    def _add_child_to_report(cls, child, first=True, index=None):
+        """Record a child in the report file
+
+        :param first: if True, the ``children`` list is moved at the
+        end of a new report file so that next children only have
+        to be appended to it.
+        :param index: optional campaign index to update
+        """
+        if index is not None:
+            index.add_child(os.getcwd(), child)
+        if first:
+            try:
+                with open(YAML_REPORT_FILE) as istr:
+                    data = yaml.safe_load(istr) or {}
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                data = {}
+            children = data.pop('children', None) or []
+            # the report is replaced instead of being modified in place,
+            # it may be hard-linked to the report of another campaign
+            with open(YAML_REPORT_FILE + '.tmp', 'w') as ostr:
+                if data:
+                    yaml.dump(data, ostr, default_flow_style=False)
+                ostr.write('children:\n')
+                for previous in children:
+                    ostr.write(yaml_list_item(str(previous)))
+            os.rename(YAML_REPORT_FILE + '.tmp', YAML_REPORT_FILE)
+        with open(YAML_REPORT_FILE, 'a') as ostr:
+            ostr.write(yaml_list_item(str(child)))
 
     def _call_without_report(self, **kwargs):
-        for child in self._children:
-            self._add_child_to_report(child)
+        for i, child in enumerate(self._children):
+            self._add_child_to_report(child, first=i == 0, index=campaign_index(self))
             child_obj = self.child_builder(child)
             with pushd(
                 str(child),
@@ -195,8 +304,5 @@ class ClusterWrapper(Cluster):
         return self._network.node_pairs(self._tag, self._node)
 
     @property
-    @listify
     def tag_node_pairs(self):
-        for node in self._network.nodes(self._tag)[:-1]:
-            for pair in self._network.node_pairs(self._tag, node):
-                yield pair
+        return pairing.all_pairs(self._network.nodes(self._tag))
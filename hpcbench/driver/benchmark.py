@@ -1,12 +1,16 @@
+import collections
 import contextlib
 import copy
 import glob
 import json
 import logging
+import multiprocessing
 import os
 import re
 import shlex
+import tempfile
 import uuid
+import zlib
 from collections import namedtuple, Mapping
 from os import path as osp
 
@@ -20,17 +24,29 @@ else:
 import six
 import yaml
 from cached_property import cached_property
-
-from hpcbench.api import ExecutionContext, NoMetricException, Metric
-from hpcbench.campaign import YAML_REPORT_FILE, JSON_METRICS_FILE
-from .base import Enumerator, ClusterWrapper, write_yaml_report, Leaf
+from six.moves import cPickle as pickle
+
+from hpcbench.api import ArrayMetric, ExecutionContext, NoMetricException, Metric
+from hpcbench.campaign import (
+    JSON_METRICS_FILE,
+    write_array_sidecar,
+    YAML_REPORT_FILE,
+)
+from .base import (
+    campaign_index,
+    ClusterWrapper,
+    emit_progress,
+    Enumerator,
+    Leaf,
+    SEQUENCES,
+    write_yaml_report,
+)
 from .executor import Command
 from hpcbench.toolbox.buildinfo import extract_build_info
 from hpcbench.toolbox.collections_ext import nameddict
 from hpcbench.toolbox.contextlib_ext import pushd
 from hpcbench.toolbox.edsl import kwargsql
 from hpcbench.toolbox.environment_modules import Module
-from hpcbench.toolbox.functools_ext import listify
 from hpcbench.toolbox.process import find_executable
 from hpcbench.toolbox.spack import SpackCmd
 
@@ -58,10 +74,7 @@ class BenchmarkDriver(Enumerator):
 
     @cached_property
     def children(self):
-        categories = set()
-        for execution in self.execution_matrix:
-            categories.add(execution['category'])
-        return categories
+        return set(self.execution_index)
 
     def child_builder(self, child):
         return BenchmarkCategoryDriver(self, child)
@@ -79,9 +92,65 @@ class BenchmarkDriver(Enumerator):
             benchmark=self.name,
         )
 
+    @cached_property
+    def execution_index(self):
+        """Benchmark execution matrix partitioned by category.
+
+        The matrix is evaluated only once per benchmark and its rows
+        are spooled to disk as they are generated, so that memory
+        does not depend on the size of the matrix.
+
+        :rtype: ``ExecutionSpool``
+        """
+        return ExecutionSpool(self.benchmark.execution_matrix(self.exec_context))
+
     @property
     def execution_matrix(self):
-        return self.benchmark.execution_matrix(self.exec_context)
+        for category in self.execution_index:
+            for execution in self.execution_index.executions(category):
+                yield execution
+
+
+class ExecutionSpool(object):
+    """Rows of a benchmark execution matrix, stored in one
+    temporary file per category and read back lazily.
+    """
+
+    def __init__(self, executions):
+        self._spools = collections.OrderedDict()
+        for execution in executions:
+            spool = self._spools.get(execution['category'])
+            if spool is None:
+                spool = tempfile.TemporaryFile()
+                self._spools[execution['category']] = spool
+            pickle.dump(execution, spool, pickle.HIGHEST_PROTOCOL)
+        for spool in self._spools.values():
+            spool.flush()
+
+    def __iter__(self):
+        return iter(self._spools)
+
+    def __contains__(self, category):
+        return category in self._spools
+
+    def executions(self, category):
+        """Generator of the rows of a category, in the order
+        provided by the benchmark. Every call reads the rows again
+        from disk, so callers get their own copies.
+        """
+        spool = self._spools.get(category)
+        if spool is None:
+            return
+        offset = 0
+        while True:
+            # several generators may read the same file
+            spool.seek(offset)
+            try:
+                execution = pickle.load(spool)
+            except EOFError:
+                return
+            offset = spool.tell()
+            yield execution
 
 
 class BenchmarkCategoryDriver(Enumerator):
@@ -111,18 +180,56 @@ class BenchmarkCategoryDriver(Enumerator):
     @property
     def _commands(self):
         exec_cls = self.root.execution_cls
-        for em in self.parent.execution_matrix:
-            for cmd in exec_cls.commands(self.campaign, self.config, em):
+        commands = (
+            cmd
+            for em in self.parent.execution_index.executions(self.category)
+            for cmd in exec_cls.commands(self.campaign, self.config, em)
+        )
+        shard = self.root.shard
+        if shard is not None:
+            commands = self._shard_commands(commands, *shard)
+        return commands
+
+    def _shard_commands(self, commands, index, count):
+        """Select the commands of one shard.
+
+        Commands are distributed among the shards in round-robin,
+        consecutive commands of the same round staying together.
+        The first shard of every category is derived from the category
+        path, so that categories with few commands are spread too.
+        """
+        path = '/'.join([self.exec_context.tag, self.parent.name, self.category])
+        unit = zlib.crc32(path.encode('utf-8')) - 1
+        previous_round = None
+        for cmd in commands:
+            round_ = cmd.execution.get('round')
+            if round_ is None or round_ != previous_round:
+                unit += 1
+            previous_round = round_
+            if unit % count == index:
                 yield cmd
 
     @cached_property
-    @listify
     def children(self):
+        """Get all commands of the benchmark category along with
+        their run directory
+
+        :rtype: list of tuple (``Command``, str)
+        """
+        return list(self._iter_children(child_ids=set()))
+
+    @cached_property
+    def has_children(self):
+        return any(True for _ in self._iter_children())
+
+    def _iter_children(self, child_ids=None):
+        """Lazily build the commands of the benchmark category
+
+        :param child_ids: set of run directory names already
+        attributed but not yet created on disk.
+        """
         for cmd in self._commands:
             valid = True
-            category = cmd.execution.get('category')
-            if category != self.category:
-                continue
             # Override `environment` if specified in YAML
             if 'environment' in self.config:
                 yaml_env = self.config.get('environment')
@@ -152,8 +259,6 @@ class BenchmarkCategoryDriver(Enumerator):
                                 )
                                 self.logger.error(msg)
                                 valid = False
-                    if not env:
-                        self.config.pop('environment')
             # Override `modules` if specified in YAML
             if 'modules' in self.config:
                 yaml_modules = self.config['modules'] or []
@@ -173,17 +278,24 @@ class BenchmarkCategoryDriver(Enumerator):
                 cmd.execution['metas'] = metas
             if valid:
                 name = cmd.execution.get('name') or ''
-                yield cmd, osp.join(name, self.child_id())
+                yield cmd, osp.join(name, self.child_id(name, child_ids))
+
+    def child_id(self, prefix='', child_ids=None):
+        """Generate a run directory name that does not exist yet
 
-    def child_id(self):
+        :param prefix: directory where the run directory is created
+        :param child_ids: optional set of names already attributed,
+        updated by this method.
+        """
         while True:
             child_id = str(uuid.uuid4()).split('-', 2)[0]
-            if not hasattr(self, '__child_ids'):
-                self.__child_ids = set()
-            if child_id not in self.__child_ids:
-                self.__child_ids.add(child_id)
-                break
-        return child_id
+            if osp.exists(osp.join(prefix, child_id)):
+                continue
+            if child_ids is not None:
+                if child_id in child_ids:
+                    continue
+                child_ids.add(child_id)
+            return child_id
 
     def child_builder(self, child):
         del child  # unused
@@ -272,43 +384,120 @@ class BenchmarkCategoryDriver(Enumerator):
         finally:
             os.environ = env
 
+    @property
+    def concurrent_rounds(self):
+        """Maximum number of commands of the same round executed
+        concurrently, 0 to execute commands one after the other,
+        None if unlimited.
+        """
+        if self.root.execution_cls.name != 'srun':
+            return 0
+        value = self.config.get('concurrent_rounds', True)
+        if value is True:
+            return None
+        return int(value)
+
+    def _batches(self, children):
+        """Group consecutive commands of the same round running
+        on disjoint nodes, that can be executed concurrently.
+
+        :param children: iterable of tuple (``Command``, str)
+        :return: generator of list of tuple (``Command``, str)
+        """
+        limit = self.concurrent_rounds
+        batch, batch_round, batch_nodes = [], None, set()
+        for command, run_dir in children:
+            round_ = command.execution.get('round')
+            nodes = command.execution.get('srun_nodes')
+            if not isinstance(nodes, SEQUENCES):
+                nodes = None
+            if batch and (
+                limit == 0
+                or round_ is None
+                or round_ != batch_round
+                or nodes is None
+                or batch_nodes.intersection(nodes)
+                or len(batch) == limit
+            ):
+                yield batch
+                batch, batch_nodes = [], set()
+            batch.append((command, run_dir))
+            batch_round = round_
+            batch_nodes.update(nodes or [])
+        if batch:
+            yield batch
+
     def _execute(self, **kwargs):
-        runs = dict()
-        for command, run_dir in self.children:
-            if _HAS_MAGIC and 'shell' not in command.execution:
-                exc = command.execution
-                with self._spack_env(exc), self._module_env(exc):
-                    self._add_build_info(exc)
+        with MetricsWriter() as metrics:
+            for batch in self._batches(self._iter_children()):
+                for command, _ in batch:
+                    self._prepare_execution(command)
+                if len(batch) == 1:
+                    command, run_dir = batch[0]
+                    self._run_attempts(command, run_dir, **kwargs)
+                    run_dirs = [run_dir]
+                else:
+                    run_dirs = self._run_concurrently(batch, **kwargs)
+                for run_dir in run_dirs:
+                    metrics.append(run_dir)
+                    yield run_dir
+                if len(run_dirs) != len(batch):
+                    raise Exception(
+                        '{} concurrent executions failed'.format(
+                            len(batch) - len(run_dirs)
+                        )
+                    )
+
+    def _prepare_execution(self, command):
+        if _HAS_MAGIC and 'shell' not in command.execution:
+            exc = command.execution
+            with self._spack_env(exc), self._module_env(exc):
+                self._add_build_info(exc)
+        else:
+            self.logger.info(
+                "No build information recorded " "(libmagic available: %s)", _HAS_MAGIC,
+            )
+
+    def _run_attempts(self, command, run_dir, **kwargs):
+        with pushd(run_dir, mkdir=True):
+            attempt = self.attempt_cls(self, command)
+            for attempt in attempt(**kwargs):
+                pass
+
+    def _run_concurrently(self, batch, **kwargs):
+        """Execute commands in dedicated processes, since every
+        execution changes the current working directory
+
+        :return: run directories of the successful executions
+        """
+        self.logger.info('Executing %d commands concurrently', len(batch))
+        processes = []
+        for command, run_dir in batch:
+            process = multiprocessing.Process(
+                target=self._run_attempts, args=(command, run_dir), kwargs=kwargs
+            )
+            process.start()
+            processes.append((process, run_dir))
+        run_dirs = []
+        for process, run_dir in processes:
+            process.join()
+            if process.exitcode == 0:
+                run_dirs.append(run_dir)
             else:
-                self.logger.info(
-                    "No build information recorded " "(libmagic available: %s)",
-                    _HAS_MAGIC,
+                self.logger.error(
+                    'Execution in %s failed with exit code %s',
+                    run_dir,
+                    process.exitcode,
                 )
-            runs.setdefault(command.execution['category'], []).append(run_dir)
-            with pushd(run_dir, mkdir=True):
-                attempt = self.attempt_cls(self, command)
-                for attempt in attempt(**kwargs):
-                    pass
-                yield run_dir
-        self.gather_metrics(runs)
+        return run_dirs
 
     def gather_metrics(self, runs):
         """Write a JSON file with the result of every runs
         """
         for run_dirs in runs.values():
-            with open(JSON_METRICS_FILE, 'w') as ostr:
-                ostr.write('[\n')
-                for i in range(len(run_dirs)):
-                    with open(osp.join(run_dirs[i], YAML_REPORT_FILE)) as istr:
-                        data = yaml.safe_load(istr)
-                        data.pop('category', None)
-                        data.pop('command', None)
-                        data['id'] = run_dirs[i]
-                        json.dump(data, ostr, indent=2)
-                    if i != len(run_dirs) - 1:
-                        ostr.write(',')
-                    ostr.write('\n')
-                ostr.write(']\n')
+            with MetricsWriter() as metrics:
+                for run_dir in run_dirs:
+                    metrics.append(run_dir)
 
     @cached_property
     def metrics(self):
@@ -318,6 +507,45 @@ class BenchmarkCategoryDriver(Enumerator):
             return json.load(istr)
 
 
+class MetricsWriter(object):
+    """Write the JSON metrics file of a benchmark category
+    incrementally, one run after the other.
+    The file is only created when the first run is appended,
+    replacing the previous one instead of truncating it, since
+    it may be hard-linked to the file of another campaign.
+    """
+
+    def __init__(self, path=JSON_METRICS_FILE):
+        self.path = path
+        self._ostr = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self._ostr is not None:
+            self._ostr.write('\n]\n')
+            self._ostr.close()
+            self._ostr = None
+
+    def append(self, run_dir):
+        """Add report of the given run directory to the metrics file
+        """
+        if self._ostr is None:
+            self._ostr = open(self.path + '.tmp', 'w')
+            os.rename(self.path + '.tmp', self.path)
+            self._ostr.write('[\n')
+        else:
+            self._ostr.write(',\n')
+        with open(osp.join(run_dir, YAML_REPORT_FILE)) as istr:
+            data = yaml.safe_load(istr)
+        data.pop('category', None)
+        data.pop('command', None)
+        data['id'] = run_dir
+        json.dump(data, self._ostr, indent=2)
+        self._ostr.flush()
+
+
 class MetricsDriver(Leaf):
     """Abstract representation of metrics already
     built by a previous run
@@ -355,6 +583,10 @@ class MetricsDriver(Leaf):
                         pass
                     else:
                         MetricsDriver._check_metrics(extractor.metrics, run_metrics)
+                        if self.array_sidecar:
+                            self._write_array_sidecars(
+                                extractor.metrics, run_metrics, len(all_metrics)
+                            )
                         metrics.update(run_metrics)
             if metrics:
                 rc = dict(context=log.context, measurement=metrics)
@@ -364,6 +596,19 @@ class MetricsDriver(Leaf):
             raise NoMetricException()
         return report
 
+    @property
+    def array_sidecar(self):
+        """Whether array metrics are stored in binary files
+        instead of the reports"""
+        return self.parent.config.get('array_sidecar', False)
+
+    @classmethod
+    def _write_array_sidecars(cls, schema, metrics, log_index):
+        for name, metric in schema.items():
+            if isinstance(metric, ArrayMetric) and name in metrics:
+                prefix = 'metrics-{}-{}'.format(log_index, name)
+                metrics[name] = write_array_sidecar(prefix, metrics[name])
+
     class LocalLog(namedtuple('LocalLog', ['path', 'log_prefix'])):
         @property
         def context(self):
@@ -409,7 +654,9 @@ class MetricsDriver(Leaf):
 
     @classmethod
     def _check_metric(cls, schema, metric, name, value):
-        if isinstance(metric, Metric):
+        if isinstance(metric, ArrayMetric):
+            cls._check_array_metric(metric, name, value)
+        elif isinstance(metric, Metric):
             if not isinstance(value, metric.type):
                 message = "Unexpected type for metrics {}:\n".format(name)
                 message += "expected {}, but got {}".format(metric.type, type(value))
@@ -429,9 +676,29 @@ class MetricsDriver(Leaf):
             cls._check_metrics(metric, value)
         else:
             message = "benchmark metric {} is neither ".format(metric)
-            message += "a Metric, dict or list"
+            message += "a Metric, ArrayMetric, dict or list"
             raise Exception(message)
 
+    @classmethod
+    def _check_array_metric(cls, metric, name, value):
+        if not isinstance(value, dict) or set(value) != set(metric.columns):
+            message = "Unexpected columns for array metric {}:\n".format(name)
+            message += "expected {}, but got {}".format(
+                sorted(metric.columns),
+                sorted(value) if isinstance(value, dict) else value,
+            )
+            raise Exception(message)
+        if len(set(len(column) for column in value.values())) > 1:
+            message = "Columns of array metric {} ".format(name)
+            message += "do not have the same length"
+            raise Exception(message)
+        for column, values in value.items():
+            type_ = metric.columns[column].type
+            if not all(isinstance(item, type_) for item in values):
+                message = "Unexpected type for column {} ".format(column)
+                message += "of array metric {}: expected {}".format(name, type_)
+                raise Exception(message)
+
 
 class FixedAttempts(Enumerator):
     def __init__(self, parent, command):
@@ -463,7 +730,11 @@ class FixedAttempts(Enumerator):
     @property
     def children(self):
         attempt = 1
-        self.paths = []
+        # only keep what is required to select and compare attempts
+        if self.sort_config is None:
+            self.paths = collections.deque(maxlen=2)
+        else:
+            self.paths = []
         while self._should_run(attempt):
             path = 'attempt-' + str(attempt)
             self.paths.append(path)
@@ -477,6 +748,16 @@ class FixedAttempts(Enumerator):
                     if osp.isfile(file_):
                         os.remove(file_)
                 os.symlink(source, file_)
+        with open(YAML_REPORT_FILE) as istr:
+            report = yaml.safe_load(istr)
+        index = campaign_index(self)
+        if index is not None:
+            index.add_report(os.getcwd(), report)
+        emit_progress(
+            self,
+            'execution_finished',
+            succeeded=report.get('command_succeeded', False),
+        )
 
     def child_builder(self, child):
         def _wrap(**kwargs):
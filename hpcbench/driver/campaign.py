@@ -10,20 +10,39 @@ from ClusterShell.NodeSet import NodeSet
 from cached_property import cached_property
 
 from hpcbench.api import Benchmark
-from hpcbench.campaign import YAML_CAMPAIGN_FILE, YAML_EXPANDED_CAMPAIGN_FILE, from_file
+from hpcbench.campaign import (
+    CampaignIndex,
+    JSON_PROGRESS_FILE,
+    JSON_SLURM_CACHE_FILE,
+    ProgressJournal,
+    slurm_cache,
+    SQLITE_INDEX_FILE,
+    YAML_CAMPAIGN_FILE,
+    YAML_EXPANDED_CAMPAIGN_FILE,
+    from_file,
+)
 from .benchmark import BenchmarkDriver
-from .base import Enumerator, Top, LOGGER, LOCALHOST, ConstraintTag
+from .base import emit_progress, Enumerator, Top, LOGGER, LOCALHOST, ConstraintTag
 from .executor import ExecutionDriver, SrunExecutionDriver
 from .slurm import SlurmDriver
 from hpcbench.toolbox.collections_ext import dict_merge
 from hpcbench.toolbox.contextlib_ext import pushd
 from hpcbench.toolbox.functools_ext import listify
+from hpcbench.toolbox.slurm import SlurmCache
 
 
 class Network(object):
+    """Tags membership of the nodes of a campaign
+
+    Members of every tag, and positions of the nodes
+    in the members lists, are computed once on demand.
+    """
+
     def __init__(self, campaign, logger=None):
         self.campaign = campaign
         self.logger = logger or LOGGER
+        self._node_tags = dict()
+        self._slurm_job_nodes = dict()
 
     def has_tag(self, tag):
         return tag in self.campaign.network.tags
@@ -31,48 +50,124 @@ class Network(object):
     def node_pairs(self, tag, node):
         nodes = self.nodes(tag)
         try:
-            pos = nodes.index(node)
+            pos = self.node_index(tag, node)
         except ValueError:
             self.logger.error(
                 'Could not find node %s in nodes %s', node, ', '.join(nodes)
             )
-        return [[node, nodes[i]] for i in range(pos + 1, len(nodes))]
+            raise
+        return [[node, other] for other in nodes[pos + 1 :]]
+
+    def node_index(self, tag, node):
+        """get position of a node in the sorted list of the tag nodes
+        :raise ValueError: if the node does not belong to the tag
+        """
+        positions = self._positions(tag)
+        if node not in positions:
+            raise ValueError('{} is not in tag {}'.format(node, tag))
+        return positions[node]
 
     def nodes(self, tag):
         """get nodes that belong to a tag
         :param tag: tag name
         :rtype: list of string
         """
-        if tag == '*':
-            return sorted(list(set(self.campaign.network.nodes)))
-        definitions = self.campaign.network.tags.get(tag)
-        if definitions is None:
+        nodes = self._tag_nodes.get(tag)
+        if nodes is None:
             return []
-        nodes = set()
-        for definition in definitions:
-            if len(definition.items()) == 0:
-                continue
-            mode, value = list(definition.items())[0]
-            if mode == 'match':
-                nodes = nodes.union(
-                    set(
-                        [
-                            node
-                            for node in self.campaign.network.nodes
-                            if value.match(node)
-                        ]
-                    )
-                )
-            elif mode == 'constraint':
-                slurm_nodes = os.environ.get('SLURM_JOB_NODELIST')
-                if slurm_nodes:
-                    nodes = NodeSet(slurm_nodes)
+        if isinstance(nodes, ConstraintTag):
+            slurm_nodes = os.environ.get('SLURM_JOB_NODELIST')
+            if slurm_nodes:
+                return self._job_nodes(slurm_nodes)[0]
+        return nodes
+
+    def node_tags(self, node):
+        """get tags a node belongs to, including ``*``
+        and the tags of ``localhost``.
+        :rtype: frozenset of string
+        """
+        tags = self._node_tags.get(node)
+        if tags is None:
+            listed, patterns, constraints = self._tags_definitions
+            tags = {'*'} | constraints
+            for name in (node, LOCALHOST):
+                tags.update(listed.get(name, ()))
+                tags.update(tag for tag, regex in patterns if regex.match(name))
+            tags = frozenset(tags)
+            self._node_tags[node] = tags
+        return tags
+
+    @cached_property
+    def _tag_nodes(self):
+        """Map every tag to the sorted list of its nodes,
+        or to a ``ConstraintTag``"""
+        all_nodes = sorted(set(self.campaign.network.nodes))
+        tag_nodes = {'*': all_nodes}
+        for tag, definitions in self.campaign.network.tags.items():
+            nodes = set()
+            for definition in definitions:
+                if len(definition.items()) == 0:
+                    continue
+                mode, value = list(definition.items())[0]
+                if mode == 'match':
+                    nodes.update(node for node in all_nodes if value.match(node))
+                elif mode == 'constraint':
+                    nodes = ConstraintTag(tag, value)
+                    break
                 else:
-                    return ConstraintTag(tag, value)
-            else:
-                assert mode == 'nodes'
-                nodes = nodes.union(set(value))
-        return sorted(list(nodes))
+                    assert mode == 'nodes'
+                    nodes.update(value)
+            if not isinstance(nodes, ConstraintTag):
+                nodes = sorted(nodes)
+            tag_nodes[tag] = nodes
+        return tag_nodes
+
+    @cached_property
+    def _tag_positions(self):
+        positions = dict()
+        for tag, nodes in self._tag_nodes.items():
+            if not isinstance(nodes, ConstraintTag):
+                positions[tag] = dict((node, pos) for pos, node in enumerate(nodes))
+        return positions
+
+    def _positions(self, tag):
+        nodes = self._tag_nodes.get(tag)
+        if isinstance(nodes, ConstraintTag):
+            slurm_nodes = os.environ.get('SLURM_JOB_NODELIST')
+            if slurm_nodes:
+                return self._job_nodes(slurm_nodes)[1]
+        return self._tag_positions.get(tag, {})
+
+    def _job_nodes(self, slurm_nodes):
+        """Get nodes of the SLURM allocation, and their positions"""
+        job_nodes = self._slurm_job_nodes.get(slurm_nodes)
+        if job_nodes is None:
+            nodes = sorted(NodeSet(slurm_nodes))
+            positions = dict((node, pos) for pos, node in enumerate(nodes))
+            job_nodes = self._slurm_job_nodes[slurm_nodes] = (nodes, positions)
+        return job_nodes
+
+    @cached_property
+    def _tags_definitions(self):
+        """Get definitions of the tags used to compute the tags of a node
+
+        :return: tuple (dict node -> set of tags listing it explicitly,
+        list of tuple (tag, regex), set of constraint tags)
+        """
+        listed = dict()
+        patterns = []
+        constraints = set()
+        for tag, definitions in self.campaign.network.tags.items():
+            for definition in definitions:
+                for mode, value in definition.items():
+                    if mode == 'match':
+                        patterns.append((tag, value))
+                    elif mode == 'nodes':
+                        for node in value:
+                            listed.setdefault(node, set()).add(tag)
+                    elif mode == 'constraint':
+                        constraints.add(tag)
+        return listed, patterns, constraints
 
 
 class CampaignDriver(Enumerator):
@@ -87,20 +182,40 @@ class CampaignDriver(Enumerator):
         logger=None,
         expandcampvars=True,
         exclude_nodes=None,
+        refresh_slurm_cache=False,
+        shard=None,
     ):
+        """
+        :param shard: optional tuple (index, count) to only execute
+        the commands of one of the ``count`` parts of the campaign
+        """
         node = node or socket.gethostname()
         self.exclude_nodes = exclude_nodes
+        self.shard = shard
+        self.slurm_cache = None
         if isinstance(campaign, six.string_types):
             campaign_path = osp.normpath(osp.abspath(campaign))
             if osp.isdir(campaign_path):
                 self.existing_campaign = True
                 self.campaign_path = campaign_path
+                self.slurm_cache = slurm_cache(campaign_path)
                 campaign = osp.join(campaign, YAML_CAMPAIGN_FILE)
             else:
                 # YAML file
                 self.existing_campaign = False
+                if srun:
+                    # ben-sh processes spawned by SLURM jobs reuse
+                    # the cluster information of the parent campaign
+                    self.slurm_cache = slurm_cache(os.getcwd(), lookup=True)
+                else:
+                    self.slurm_cache = SlurmCache()
+            if refresh_slurm_cache:
+                self.slurm_cache.invalidate()
             campaign = from_file(
-                campaign, expandcampvars=expandcampvars, exclude_nodes=exclude_nodes
+                campaign,
+                expandcampvars=expandcampvars,
+                exclude_nodes=exclude_nodes,
+                slurm_cache=self.slurm_cache,
             )
             self.campaign_file = campaign_path
         else:
@@ -110,6 +225,8 @@ class CampaignDriver(Enumerator):
             Top(campaign=campaign, node=node, logger=logger or LOGGER, root=self)
         )
         self.network = Network(self.campaign)
+        self.index = None
+        self.progress = None
         self.filter_tag = srun
         if srun:  # overwrite process type and force srun when requested
             self.campaign.process.type = 'srun'
@@ -140,7 +257,51 @@ class CampaignDriver(Enumerator):
                         yaml.dump(self.campaign, ostr, default_flow_style=False)
                 with open(YAML_EXPANDED_CAMPAIGN_FILE, 'w') as ostr:
                     yaml.dump(self.campaign, ostr, default_flow_style=False)
-            super(CampaignDriver, self).__call__(**kwargs)
+                if not self.filter_tag and self.slurm_cache is not None:
+                    self.slurm_cache.save(osp.abspath(JSON_SLURM_CACHE_FILE))
+            self.index = self._campaign_index()
+            self.progress = self._progress_journal()
+            emit_progress(
+                self,
+                'campaign_started',
+                node=self.node,
+                host=socket.gethostname(),
+                pid=os.getpid(),
+            )
+            try:
+                super(CampaignDriver, self).__call__(**kwargs)
+            finally:
+                emit_progress(self, 'campaign_finished', node=self.node)
+
+    def _campaign_index(self):
+        """Get index where reports are recorded.
+        ben-sh processes spawned by SLURM jobs contribute
+        to the index of the parent campaign.
+        """
+        if self.filter_tag:
+            index = CampaignIndex.find(os.getcwd())
+            if index is not None:
+                return index
+        elif self.existing_campaign:
+            if osp.exists(SQLITE_INDEX_FILE):
+                return CampaignIndex(os.getcwd())
+            return None
+        return CampaignIndex.create(os.getcwd())
+
+    def _progress_journal(self):
+        """Get journal where progress events are recorded.
+        ben-sh processes spawned by SLURM jobs contribute
+        to the journal of the parent campaign.
+        """
+        if self.filter_tag:
+            journal = ProgressJournal.find(os.getcwd())
+            if journal is not None:
+                return journal
+        elif self.existing_campaign:
+            if osp.exists(JSON_PROGRESS_FILE):
+                return ProgressJournal(os.getcwd())
+            return None
+        return ProgressJournal.create(os.getcwd())
 
     @cached_property
     def execution_cls(self):
@@ -163,28 +324,12 @@ class HostDriver(Enumerator):
     @cached_property
     def children(self):
         """Retrieve tags associated to the current node"""
-        tags = {'*'}
+        tags = self.root.network.node_tags(self.name)
         if self.tag:
-            network_tags = {self.tag: self.campaign.network.tags[self.tag]}
-        else:
-            network_tags = self.campaign.network.tags
-        for tag, configs in network_tags.items():
-            for config in configs:
-                for mode, kconfig in config.items():
-                    if mode == 'match':
-                        if kconfig.match(self.name) or kconfig.match(LOCALHOST):
-                            tags.add(tag)
-                            break
-                    elif mode == 'nodes':
-                        if self.name in kconfig or LOCALHOST in kconfig:
-                            tags.add(tag)
-                            break
-                    elif mode == 'constraint':
-                        tags.add(tag)
-                        break
-                if tag in tags:
-                    break
-        return tags
+            if self.tag not in self.campaign.network.tags:
+                raise KeyError(self.tag)
+            tags = tags & {'*', self.tag}
+        return set(tags)
 
     def child_builder(self, child):
         return BenchmarkTagDriver(self, child)
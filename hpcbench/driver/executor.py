@@ -11,7 +11,14 @@ import tempfile
 
 from cached_property import cached_property
 
-from .base import Enumerator, Leaf, SEQUENCES, ConstraintTag, write_yaml_report
+from .base import (
+    ConstraintTag,
+    emit_progress,
+    Enumerator,
+    Leaf,
+    SEQUENCES,
+    write_yaml_report,
+)
 
 import six
 
@@ -158,6 +165,7 @@ class ExecutionDriver(Leaf):
     @write_yaml_report
     @Enumerator.call_decorator
     def __call__(self, **kwargs):
+        emit_progress(self, 'run_started')
         with open('stdout', 'w') as stdout, open('stderr', 'w') as stderr:
             cwd = self.execution.get('cwd')
             if cwd is not None:
@@ -180,6 +188,12 @@ class ExecutionDriver(Leaf):
         report.update(self.execution)
 
         report.update(command=self.command)
+        emit_progress(
+            self,
+            'run_finished',
+            exit_status=exit_status,
+            succeeded=report['command_succeeded'],
+        )
         return report
 
 
@@ -282,13 +296,13 @@ class SrunExecutionDriver(ExecutionDriver):
         assert count >= 0
         if tag != '*' and not self.root.network.has_tag(tag):
             raise ValueError('Unknown tag: {}'.format(tag))
-        nodes = sorted(list(self.root.network.nodes(tag)))
+        nodes = self.root.network.nodes(tag)
         if count > 0:
-            return self._filter_srun_nodes(nodes, count)
-        return nodes
+            return self._filter_srun_nodes(tag, nodes, count)
+        return list(nodes)
 
-    def _filter_srun_nodes(self, nodes, count):
+    def _filter_srun_nodes(self, tag, nodes, count):
         assert count <= len(nodes)
-        pos = nodes.index(self.node)
-        nodes = nodes * 2
-        return nodes[pos : pos + count]
+        pos = self.root.network.node_index(tag, self.node)
+        end = pos + count
+        return nodes[pos:end] + nodes[: max(end - len(nodes), 0)]
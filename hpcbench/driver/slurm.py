@@ -68,11 +68,22 @@ class SbatchDriver(Enumerator):
         if self.root.exclude_nodes:
             exclude_nodes = '--exclude-nodes=' + self.root.exclude_nodes + ' '
 
+        shard = ''
+        output_dir = '{tag}-%Y%m%d-%H%M%S'
+        if self.shards > 1:
+            # shard index is given by SLURM to the tasks of a job array,
+            # or as first argument of the sbatch script otherwise
+            shard = '--shard=${{SLURM_ARRAY_TASK_ID:-$1}}/{shards} '
+            output_dir += '-${{SLURM_ARRAY_TASK_ID:-$1}}'
+
         cmd = (
             '{bensh} --srun={tag} '
             + verb
+            + shard
             + '-n $SLURMD_NODENAME '
-            + '--output-dir={tag}-%Y%m%d-%H%M%S '
+            + '--output-dir='
+            + output_dir
+            + ' '
             + exclude_nodes
             + self.parent.parent.campaign_file
         )
@@ -82,9 +93,27 @@ class SbatchDriver(Enumerator):
         self.sbatch_outdir = osp.splitext(self.sbatch_filename)[0]
         self.hpcbench_cmd = now.strftime(cmd)
         self.hpcbench_cmd = self.hpcbench_cmd.format(
-            tag=tag, bensh=self.bensh_executable
+            tag=tag, bensh=self.bensh_executable, shards=self.shards
         )
 
+    @cached_property
+    def sharding(self):
+        """Sharding configuration of the SLURM jobs"""
+        return self.campaign.process.get('sharding') or {}
+
+    @cached_property
+    def shards(self):
+        """Number of SLURM jobs among which the execution
+        plan of the tag is split"""
+        return int(self.sharding.get('shards') or 1)
+
+    @property
+    def sbatch_outdirs(self):
+        """Campaign directories created by the SLURM jobs"""
+        if self.shards > 1:
+            return [self.sbatch_outdir + '-' + str(i) for i in range(self.shards)]
+        return [self.sbatch_outdir]
+
     @cached_property
     def bensh_executable(self):
         candidates = []
@@ -132,6 +161,11 @@ class SbatchDriver(Enumerator):
                     '--nodelist=' + ','.join(self._filter_nodes(nodes, count)),
                     '--nodes=' + str(count),
                 ]
+        if self.shards > 1 and self.sharding.get('array', True):
+            array = '--array=0-' + str(self.shards - 1)
+            if self.sharding.get('throttle'):
+                array += '%' + str(self.sharding['throttle'])
+            sbatch_options.append(array)
         return sbatch_options
 
     def _filter_nodes(self, nodes, count):
@@ -183,11 +217,14 @@ class SbatchDriver(Enumerator):
         self._install_spack_specs()
         with open(self.sbatch_filename, 'w') as sbatch:
             self._create_sbatch(sbatch)
-        sbatch_jobid = self._execute_sbatch()
+        if self.shards > 1 and not self.sharding.get('array', True):
+            sbatch_jobid = self._execute_shards()
+        else:
+            sbatch_jobid = self._execute_sbatch()
         return dict(
             sbatch=self.sbatch_filename,
             jobid=sbatch_jobid,
-            children=[self.sbatch_outdir],
+            children=self.sbatch_outdirs,
         )
 
     def _create_sbatch(self, ostr):
@@ -222,13 +259,34 @@ class SbatchDriver(Enumerator):
             for spec in spack.get('specs') or []:
                 yield spec
 
-    def _execute_sbatch(self):
+    def _execute_shards(self):
+        """Submit one SLURM job per shard. With a throttle ``k``,
+        shard ``i`` starts after the end of shard ``i - k``.
+        :returns the list of slurm job ids
+        """
+        throttle = self.sharding.get('throttle')
+        jobids = []
+        for shard in range(self.shards):
+            options = []
+            if throttle and shard >= throttle and jobids[shard - throttle] != -1:
+                options.append('--dependency=afterany:%d' % jobids[shard - throttle])
+            jobids.append(self._execute_sbatch(options, [str(shard)]))
+        return jobids
+
+    def _execute_sbatch(self, options=None, arguments=None):
         """Schedule the sbatch file using the sbatch command
+        :param options: additional sbatch options
+        :param arguments: arguments of the sbatch script
         :returns the slurm job id
         """
         commands = self.campaign.process.get('commands', {})
         sbatch = find_executable(commands.get('sbatch', 'sbatch'))
-        sbatch_command = [sbatch, '--parsable', self.sbatch_filename]
+        sbatch_command = (
+            [sbatch, '--parsable']
+            + (options or [])
+            + [self.sbatch_filename]
+            + (arguments or [])
+        )
         try:
             self.logger.debug(
                 'Executing command: %s',
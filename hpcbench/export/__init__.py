@@ -2,4 +2,7 @@
 """
 
 from .csvexport import CSVExporter  # noqa
-from .es import ESExporter  # noqa
+from .es import ESBulkLoader, ESExporter  # noqa
+from .npz import NPZExporter  # noqa
+from .openmetrics import OpenMetricsExporter  # noqa
+from .pipeline import ExportPipeline  # noqa
@@ -2,34 +2,52 @@
 """
 
 import csv
+import json
+import tempfile
 
 from cached_property import cached_property
 
-from hpcbench.campaign import from_file, get_metrics, ReportNode
-from hpcbench.toolbox.collections_ext import flatten_dict
+from hpcbench.campaign import ArrayMetrics, from_file, get_metrics, ReportNode
+from hpcbench.toolbox.collections_ext import (
+    explode_dict,
+    flatten_dict,
+    key_prefixes,
+)
 from hpcbench.toolbox.contextlib_ext import write_wherever
-from hpcbench.toolbox.functools_ext import listify
 
 
 class CSVExporter(object):
     """Export a campaign to CSV
+
+    Rows are written while metrics are read from the campaign,
+    runs are never kept in memory.
     """
 
-    def __init__(self, path, ofile=None):
+    def __init__(self, path, ofile=None, tidy=False):
         """
         :param path: path to existing campaign
         :param ofile: a filename or None if stdout should be used
+        :param tidy: write one row per element of list-valued
+        fields instead of one column per element.
         """
         self.report = ReportNode(path)
         self.campaign = from_file(path, expandcampvars=False)
         self.ofile = ofile
+        self.tidy = tidy
+        self.arrays = ArrayMetrics(self.campaign)
 
-    def export(self, fields=None):
+    def export(self, fields=None, metrics=None):
         """Export campaign data to csv
         :param fields: list of columns to export. If None, all columns are.
+        :param metrics: iterable of metrics records as provided
+        by ``get_metrics``, the campaign is read if None. If all columns
+        are exported, rows are then spooled in a temporary file
+        until the columns are known.
         """
         if fields:
-            self._push_data_filtered(fields)
+            self._push_data_filtered(fields, metrics)
+        elif metrics is not None:
+            self._push_data_spooled(metrics)
         else:
             self._push_data()
 
@@ -45,34 +63,100 @@ class CSVExporter(object):
             for run in self.runs:
                 csvf.writerow(run)
 
-    def _push_data_filtered(self, fields):
-        if len(set(fields) - self._headers):
+    def _push_data_spooled(self, metrics):
+        headers = set()
+        with tempfile.TemporaryFile(mode='w+') as spool:
+            for run in self._runs(metrics=metrics):
+                headers.update(run)
+                spool.write(json.dumps(run) + '\n')
+            spool.seek(0)
+            with write_wherever(self.ofile) as ofo:
+                csvf = csv.DictWriter(ofo, fieldnames=self._sort_headers(headers))
+                csvf.writeheader()
+                for line in spool:
+                    csvf.writerow(json.loads(line))
+
+    def _push_data_filtered(self, fields, metrics=None):
+        """Write the given columns only. Unknown fields are reported
+        before the output is written: the campaign is read twice,
+        unless metrics are given, in which case rows are spooled
+        in a temporary file meanwhile.
+        """
+        if metrics is None:
+            self._check_fields(fields, self._headers)
+            with write_wherever(self.ofile) as ofo:
+                self._write_filtered(
+                    ofo, fields, self._runs(prefixes=self._prefixes(fields))
+                )
+            return
+        seen = set()
+        with tempfile.TemporaryFile(mode='w+') as spool:
+            for run in self._runs(prefixes=self._prefixes(fields), metrics=metrics):
+                seen.update(run)
+                spool.write(json.dumps(run) + '\n')
+            self._check_fields(fields, seen)
+            spool.seek(0)
+            with write_wherever(self.ofile) as ofo:
+                self._write_filtered(ofo, fields, (json.loads(line) for line in spool))
+
+    def _prefixes(self, fields):
+        return None if self.tidy else key_prefixes(fields)
+
+    @classmethod
+    def _write_filtered(cls, ofo, fields, runs):
+        csvf = csv.DictWriter(ofo, fieldnames=fields, extrasaction='ignore')
+        csvf.writeheader()
+        for run in runs:
+            csvf.writerow(run)
+
+    @classmethod
+    def _check_fields(cls, fields, headers):
+        missing = set(fields) - set(headers)
+        if missing:
             raise ValueError(
                 'The provided list of fields contains an element '
                 + 'that could not be found in this campaign\n'
-                + str(set(fields) - self._headers)
+                + str(missing)
             )
-        with write_wherever(self.ofile) as ofo:
-            csvf = csv.DictWriter(ofo, fieldnames=fields)
-            csvf.writeheader()
-            for run in self.runs:
-                run_f = {k: v for k, v in run.items() if k in fields}
-                csvf.writerow(run_f)
 
     @cached_property
     def _headers(self):
+        """Columns of the CSV file, context attributes first.
+        Only column names are kept while reading the campaign.
+        """
         headers = set()
         for run in self.runs:
-            headers = headers | set(run.keys())
-        return headers
+            headers.update(run)
+        return self._sort_headers(headers)
 
-    @cached_property
-    @listify
+    @classmethod
+    def _sort_headers(cls, headers):
+        context = [attr for attr in ReportNode.CONTEXT_ATTRS if attr in headers]
+        context.append('path')
+        return context + sorted(headers - set(context))
+
+    @property
     def runs(self):
-        for attrs, metrics in get_metrics(self.campaign, self.report):
-            for run in metrics:
-                run_flat = flatten_dict(run)
-                eax = dict()
-                eax.update(attrs)
-                eax.update(run_flat)
-                yield eax
+        """Generator of flattened runs"""
+        return self._runs()
+
+    def _runs(self, prefixes=None, metrics=None):
+        if metrics is None:
+            metrics = get_metrics(self.campaign, self.report)
+        for attrs, runs in metrics:
+            tables = None
+            if self.tidy and runs:
+                tables = set(
+                    'metrics.measurement.' + name
+                    for name in self.arrays.names(attrs, runs[0])
+                )
+            for run in runs:
+                if self.tidy:
+                    rows = explode_dict(run, tables=tables)
+                else:
+                    rows = [flatten_dict(run, prefixes=prefixes)]
+                for row in rows:
+                    eax = dict()
+                    eax.update(attrs)
+                    eax.update(row)
+                    yield eax
@@ -2,19 +2,154 @@
 """
 
 import collections
+import gzip
+import hashlib
+import itertools
+import json
 import logging
+import os
+import os.path as osp
+import threading
+import time
 
 from cached_property import cached_property
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, TransportError
 import six
+from six.moves import queue
 
-from hpcbench.campaign import from_file, get_metrics, ReportNode
-from hpcbench.toolbox.collections_ext import dict_merge, defrost
-from hpcbench.toolbox.functools_ext import chunks
+from hpcbench.api import ArrayMetric, Benchmark, Metric
+from hpcbench.campaign import ArrayMetrics, from_file, get_metrics, ReportNode
+from hpcbench.toolbox.collections_ext import (
+    dict_merge,
+    defrost,
+    table_rows,
+)
+from hpcbench.toolbox.functools_ext import bounded_chunks
 
 
-class ESExporter(object):
+LOGGER = logging.getLogger('hpcbench')
+
+
+class BulkIndexer(object):
+    """Send bulk requests to an Elasticsearch index
+    with a pool of workers
+
+    Subclasses provide the ``es_client``, ``index_name``,
+    and ``workers`` attributes.
+    """
+
+    BULK_WORKERS = 4
+    CHUNK_SIZE = 500
+    CHUNK_BYTES = 10 * 1024 * 1024
+    MAX_RETRIES = 5
+    INITIAL_BACKOFF = 1.0
+    MAX_BACKOFF = 60.0
+
+    def _push_data(self, lines):
+        """Send documents through a pool of bulk workers
+
+        :param lines: iterable of action and document lines
+        of a bulk request, one item per document
+        """
+        chunks = queue.Queue(maxsize=2 * self.workers)
+        results = []
+        workers = [
+            threading.Thread(target=self._bulk_worker, args=(chunks, results))
+            for _ in range(self.workers)
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        try:
+            for chunk in bounded_chunks(
+                lines, self.CHUNK_SIZE, self.CHUNK_BYTES, sizeof=len
+            ):
+                chunks.put(chunk)
+        finally:
+            for _ in workers:
+                chunks.put(None)
+            for worker in workers:
+                worker.join()
+        stats = sum(results, collections.Counter())
+        logging.info(
+            'pushed %s documents in Elasticsearch index "%s"',
+            stats['pushed'],
+            self.index_name,
+        )
+        if stats['failed']:
+            raise Exception('Could not push %s documents' % stats['failed'])
+
+    def _bulk_worker(self, chunks, results):
+        stats = collections.Counter()
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            try:
+                pushed, failed = self._send_chunk(chunk)
+            except Exception:
+                LOGGER.exception('Bulk request failed')
+                stats['failed'] += len(chunk)
+            else:
+                stats['pushed'] += pushed
+                stats['failed'] += failed
+        results.append(stats)
+
+    def _send_chunk(self, chunk):
+        """Send a chunk of documents in a bulk request,
+        retry with exponential backoff the documents whose
+        failure is transient.
+
+        :return: tuple (number of pushed documents, number of failures)
+        """
+        pushed, failed = 0, 0
+        for attempt in range(self.MAX_RETRIES + 1):
+            if attempt:
+                time.sleep(
+                    min(self.MAX_BACKOFF, self.INITIAL_BACKOFF * 2 ** (attempt - 1))
+                )
+            try:
+                resp = self.es_client.bulk(body=''.join(chunk), index=self.index_name)
+            except TransportError as exc:
+                if not self._is_transient(exc.status_code):
+                    raise
+                LOGGER.warning('Bulk request failed, will retry: %s', exc)
+                continue
+            retries = []
+            for lines, item in zip(chunk, resp['items']):
+                status = next(iter(item.values()))['status']
+                if status < 300:
+                    pushed += 1
+                elif self._is_transient(status):
+                    retries.append(lines)
+                else:
+                    LOGGER.error('Could not push document: %s', item)
+                    failed += 1
+            chunk = retries
+            if not chunk:
+                break
+        return pushed, failed + len(chunk)
+
+    @classmethod
+    def _is_transient(cls, status):
+        return status == 'N/A' or status == 429 or status >= 500
+
+
+class ESExporter(BulkIndexer):
     """Export a campaign to Elasticsearch
+
+    The campaign is traversed once. The index mapping is built
+    from the metrics declared by the benchmarks, and from
+    the first documents, buffered before creating the index.
+    Documents are then sent by several bulk workers.
+
+    Number of runs exported per category is recorded in a checkpoint
+    file in the campaign directory, so that incremental exports only
+    push the runs added since. Dumps have their own checkpoint file,
+    since dumped runs are not in the index yet.
+
+    Bulk requests can also be dumped in compressed NDJSON files,
+    to be loaded later with ``ESBulkLoader``.
     """
 
     PY_TYPE_TO_ES_FIELD_TYPE = {
@@ -26,17 +161,29 @@ class ESExporter(object):
     }
     PROPERTIES_FIELD_TYPE = dict(date='date')
     ES_DOC_TYPE = 'hpcbench_metric'
+    CHECKPOINT_FILE = 'elasticsearch-export.json'
+    DUMP_CHECKPOINT_FILE = 'elasticsearch-dump.json'
+    ID_ATTRS = ['node', 'tag', 'benchmark', 'category', 'attempt']
+    DUMP_FILE_BYTES = 100 * 1024 * 1024
+    DUMP_FILE_FORMAT = 'bulk-{:05d}.ndjson.gz'
 
-    def __init__(self, path, hosts):
+    def __init__(self, path, hosts, workers=None, incremental=False):
         """
         :param path: path to existing campaign
         :type path: str
         :param hosts: Elasticsearch cluster
         :rtype: str or list or str
+        :param workers: number of concurrent bulk requests
+        :param incremental: only push runs added since the last export,
+        with upserts in the existing index.
         """
         self.campaign = from_file(path, expandcampvars=False)
         self.report = ReportNode(path)
         self.hosts = hosts
+        self.workers = workers or self.BULK_WORKERS
+        self.incremental = incremental
+        self.arrays = ArrayMetrics(self.campaign)
+        self._exported_runs = dict()
 
     @cached_property
     def es_client(self):
@@ -60,62 +207,217 @@ class ESExporter(object):
         fields = dict(date=self.report['date'])
         return fmt.format(**fields).lower()
 
-    def export(self):
+    def export(self, metrics=None):
         """Create Elasticsearch index and feed it with campaign data
+
+        :param metrics: iterable of metrics records as provided
+        by ``get_metrics``, the campaign is read if None.
         """
         self.es_client.ping()
-        self._prepare_index()
-        self._push_data()
+        documents = iter(self._get_documents(metrics, self.checkpoint_file))
+        sample = list(itertools.islice(documents, self.CHUNK_SIZE))
+        self._prepare_index(sample)
+        documents = itertools.chain(sample, documents)
+        self._push_data(self._bulk_lines(action, doc) for action, doc in documents)
+        self._write_checkpoint(self.checkpoint_file)
+
+    def dump(self, directory, max_bytes=None, metrics=None):
+        """Write bulk requests in gzip-compressed NDJSON files
+        instead of pushing them
+
+        :param directory: output directory, created if missing
+        :param max_bytes: uncompressed size above which
+        a new file is started
+        :param metrics: iterable of metrics records as provided
+        by ``get_metrics``, the campaign is read if None.
+        :return: path to the manifest describing the dump
+        """
+        max_bytes = max_bytes or self.DUMP_FILE_BYTES
+        if not osp.isdir(directory):
+            os.makedirs(directory)
+        documents = iter(self._get_documents(metrics, self.dump_checkpoint_file))
+        sample = list(itertools.islice(documents, self.CHUNK_SIZE))
+        manifest = dict(
+            index=self.index_name,
+            mappings=self._get_index_mappings(sample),
+            incremental=self.incremental,
+            documents=0,
+            files=[],
+        )
+        ostr, size = None, 0
+        try:
+            for action, doc in itertools.chain(sample, documents):
+                lines = self._bulk_lines(action, doc).encode('utf-8')
+                if ostr is None or size + len(lines) > max_bytes and size:
+                    if ostr is not None:
+                        ostr.close()
+                    file_ = self.DUMP_FILE_FORMAT.format(len(manifest['files']))
+                    manifest['files'].append(file_)
+                    ostr, size = gzip.open(osp.join(directory, file_), 'wb'), 0
+                ostr.write(lines)
+                size += len(lines)
+                manifest['documents'] += 1
+        finally:
+            if ostr is not None:
+                ostr.close()
+        path = osp.join(directory, ESBulkLoader.MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as ostr:
+            json.dump(manifest, ostr, indent=2)
+        os.rename(path + '.tmp', path)
+        self._write_checkpoint(self.dump_checkpoint_file)
+        return path
 
     def remove_index(self):
         """Remove Elasticsearch index associated to the campaign"""
         self.index_client.close(self.index_name)
         self.index_client.delete(self.index_name)
 
-    def _prepare_index(self):
+    def _prepare_index(self, sample):
         if self.index_client.exists(self.index_name):
-            raise Exception('Index already exists: %s' % self.index_name)
+            if not self.incremental:
+                raise Exception('Index already exists: %s' % self.index_name)
         else:
-            self._create_index()
-
-    def _create_index(self):
-        self.index_client.create(self.index_name, dict(mappings=self.index_mapping))
-
-    def _push_data(self):
-        doc_count = 0
-        for runs in chunks(self._documents, 20):
-            resp = self.es_client.bulk(body=runs, index=self.index_name)
-            if resp['errors']:
-                raise Exception('Could not push documents')
-            doc_count += len(resp['items'])
-        logging.info(
-            'pushed %s documents in Elasticsearch index "%s"',
-            doc_count,
-            self.index_name,
+            self._create_index(sample)
+
+    @property
+    def checkpoint_file(self):
+        """Get path to the file recording runs pushed to Elasticsearch"""
+        return osp.join(self.report.path, self.CHECKPOINT_FILE)
+
+    @property
+    def dump_checkpoint_file(self):
+        """Get path to the file recording runs written by ``dump``"""
+        return osp.join(self.report.path, self.DUMP_CHECKPOINT_FILE)
+
+    def read_checkpoint(self, checkpoint_file):
+        """Get number of runs previously exported for the index
+        :rtype: dict category path -> number of runs
+        """
+        if osp.exists(checkpoint_file):
+            with open(checkpoint_file) as istr:
+                return json.load(istr).get(self.index_name, {})
+        return {}
+
+    def _write_checkpoint(self, checkpoint_file):
+        checkpoints = dict()
+        if osp.exists(checkpoint_file):
+            with open(checkpoint_file) as istr:
+                checkpoints = json.load(istr)
+        checkpoint = checkpoints.setdefault(self.index_name, {})
+        checkpoint.update(self._exported_runs)
+        with open(checkpoint_file + '.tmp', 'w') as ostr:
+            json.dump(checkpoints, ostr, indent=2)
+        os.rename(checkpoint_file + '.tmp', checkpoint_file)
+
+    def _create_index(self, sample):
+        self.index_client.create(
+            self.index_name, dict(mappings=self._get_index_mappings(sample))
         )
 
+    def _get_index_mappings(self, sample):
+        mapping = dict()
+        for _, doc in sample:
+            dict_merge(mapping, self._get_dict_mapping(self.ES_DOC_TYPE, doc))
+        dict_merge(mapping, self.index_mapping)
+        return mapping
+
+    @classmethod
+    def _bulk_lines(cls, action, doc):
+        """:return: action and document lines of a bulk request"""
+        if 'update' in action:
+            doc = dict(doc=doc, doc_as_upsert=True)
+        return json.dumps(action) + '\n' + json.dumps(doc) + '\n'
+
     @cached_property
     def index_mapping(self):
-        """Get Elasticsearch index mapping
+        """Get Elasticsearch index mapping built from the metrics
+        declared by the benchmarks of the campaign
         """
-        return self._get_document_mapping
+        mapping = dict()
+        for benchmarks in self.campaign.benchmarks.values():
+            for name, config in benchmarks.items():
+                for metrics in self._declared_metrics(name, config):
+                    properties = self._get_schema_mapping(metrics)
+                    dict_merge(
+                        mapping,
+                        {
+                            self.ES_DOC_TYPE: {
+                                'properties': {
+                                    'measurement': {'properties': properties}
+                                }
+                            }
+                        },
+                    )
+        return mapping
+
+    @classmethod
+    def _declared_metrics(cls, name, config):
+        if not isinstance(config, collections.Mapping) or 'type' not in config:
+            return
+        try:
+            benchmark = Benchmark.get_subclass(config['type'])()
+            if 'attributes' in config:
+                dict_merge(benchmark.attributes, defrost(config['attributes']) or {})
+            extractors = benchmark.metrics_extractors
+        except Exception as exc:
+            LOGGER.warning('Could not get metrics of benchmark %s: %s', name, exc)
+            return
+        if isinstance(extractors, collections.Mapping):
+            extractors = extractors.values()
+        elif not isinstance(extractors, list):
+            extractors = [extractors]
+        for extractor in extractors:
+            if not isinstance(extractor, list):
+                extractor = [extractor]
+            for ext in extractor:
+                yield ext.metrics
+
+    @classmethod
+    def _get_schema_mapping(cls, schema):
+        """Build Elasticsearch properties from declared metrics"""
+        mapping = {}
+        for name, metric in schema.items():
+            if isinstance(metric, ArrayMetric):
+                mapping[name] = dict(
+                    type='nested',
+                    dynamic=False,
+                    properties=cls._get_schema_mapping(metric.columns),
+                )
+            elif isinstance(metric, Metric):
+                field_type = cls.PY_TYPE_TO_ES_FIELD_TYPE.get(metric.type)
+                if field_type is not None:
+                    mapping[name] = dict(type=field_type)
+            elif isinstance(metric, list) and metric:
+                if isinstance(metric[0], dict):
+                    mapping[name] = dict(
+                        type='nested',
+                        dynamic=False,
+                        properties=cls._get_schema_mapping(metric[0]),
+                    )
+                else:
+                    mapping.update(cls._get_schema_mapping({name: metric[0]}))
+            elif isinstance(metric, dict):
+                mapping[name] = dict(properties=cls._get_schema_mapping(metric))
+        return mapping
 
     @property
     def _documents(self):
-        for metric in self._metrics:
-            yield dict(index=dict(_type=self.ES_DOC_TYPE, _id=self.document_id(metric)))
-            metric['campaign_id'] = self.campaign.campaign_id
-            yield metric
+        return self._get_documents()
 
-    def document_id(self, doc):
-        return doc['id'] + '/' + str(hash(frozenset(doc['context'].items())))
+    def _get_documents(self, metrics=None, checkpoint_file=None):
+        for metric in self._metrics(metrics, checkpoint_file):
+            action = dict(_type=self.ES_DOC_TYPE, _id=self.document_id(metric))
+            metric['campaign_id'] = self.campaign.campaign_id
+            yield dict([('update' if self.incremental else 'index', action)]), metric
 
-    @property
-    def _get_document_mapping(self):
-        fields = {}
-        for metric in self._metrics:
-            dict_merge(fields, ESExporter._get_dict_mapping(self.ES_DOC_TYPE, metric))
-        return fields
+    @classmethod
+    def document_id(cls, doc):
+        """Get identifier of a document, derived from its run and context
+        so that it remains the same across exports"""
+        key = dict((attr, doc[attr]) for attr in cls.ID_ATTRS if attr in doc)
+        key.update(id=doc['id'], context=doc.get('context', {}))
+        key = json.dumps(key, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(key).hexdigest()
 
     @classmethod
     def _get_dict_mapping(cls, prop, data, root=None):
@@ -157,19 +459,99 @@ class ESExporter(object):
         mapping[name].update(extra_params)
         return mapping
 
-    @property
-    def _runs(self):
-        for attrs, runs in get_metrics(self.campaign, self.report):
-            for run in runs:
+    @classmethod
+    def _nest_arrays(cls, measurement, arrays, prefix=''):
+        """Convert array metrics to lists of documents
+        so that they are mapped as nested fields
+
+        :param arrays: names of the array metrics, see ``ArrayMetrics``
+        """
+        eax = dict()
+        for name, value in measurement.items():
+            if prefix + name in arrays and isinstance(value, dict):
+                value = table_rows(value)
+            elif isinstance(value, dict):
+                value = cls._nest_arrays(value, arrays, prefix + name + '.')
+            eax[name] = value
+        return eax
+
+    def _runs(self, metrics=None, checkpoint_file=None):
+        if metrics is None:
+            metrics = get_metrics(self.campaign, self.report)
+        checkpoint = dict()
+        if self.incremental and checkpoint_file is not None:
+            checkpoint = self.read_checkpoint(checkpoint_file)
+        for attrs, runs in metrics:
+            path = osp.relpath(attrs.path, self.report.path)
+            exported = checkpoint.get(path, 0)
+            self._exported_runs[path] = len(runs)
+            for run in runs[exported:]:
                 yield attrs, run
 
-    @property
-    def _metrics(self):
-        for attrs, run in self._runs:
+    def _metrics(self, metrics=None, checkpoint_file=None):
+        for attrs, run in self._runs(metrics, checkpoint_file):
             if run.get('command_succeeded', False):
+                run = dict(run)
                 metrics = run.pop('metrics')
                 for metric in metrics:
                     eax = dict(metric)
+                    if 'measurement' in eax:
+                        eax['measurement'] = self._nest_arrays(
+                            eax['measurement'], self.arrays.names(attrs, run)
+                        )
                     eax.update(run)
                     eax.update(attrs)
                     yield eax
+
+
+class ESBulkLoader(BulkIndexer):
+    """Load in Elasticsearch the bulk requests dumped by
+    ``ESExporter.dump``, without requiring the campaign
+    """
+
+    MANIFEST_FILE = 'index.json'
+
+    def __init__(self, directory, hosts, workers=None):
+        """
+        :param directory: directory written by ``ESExporter.dump``
+        :param hosts: Elasticsearch cluster
+        :param workers: number of concurrent bulk requests
+        """
+        self.directory = directory
+        self.hosts = hosts
+        self.workers = workers or self.BULK_WORKERS
+        with open(osp.join(directory, self.MANIFEST_FILE)) as istr:
+            self.manifest = json.load(istr)
+
+    @cached_property
+    def es_client(self):
+        """Get Elasticsearch client
+        """
+        return Elasticsearch(self.hosts)
+
+    @property
+    def index_name(self):
+        """Get name of the Elasticsearch index to feed"""
+        return self.manifest['index']
+
+    def load(self):
+        """Create Elasticsearch index if missing and push the dumped
+        bulk requests"""
+        self.es_client.ping()
+        if self.es_client.indices.exists(self.index_name):
+            if not self.manifest['incremental']:
+                raise Exception('Index already exists: %s' % self.index_name)
+        else:
+            self.es_client.indices.create(
+                self.index_name, dict(mappings=self.manifest['mappings'])
+            )
+        self._push_data(self._lines)
+
+    @property
+    def _lines(self):
+        """Generator of action and document lines, one item per document"""
+        for file_ in self.manifest['files']:
+            path = osp.join(self.directory, file_)
+            with gzip.open(path, 'rb') as istr:
+                for action in istr:
+                    yield (action + next(istr)).decode('utf-8')
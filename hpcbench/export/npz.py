@@ -0,0 +1,228 @@
+"""Export campaign data as columnar NumPy arrays
+"""
+
+import collections
+import logging
+import os
+import os.path as osp
+
+import numpy as np
+import six
+
+from hpcbench.api import Benchmark, Metric
+from hpcbench.campaign import from_file, get_metrics, ReportNode
+
+
+LOGGER = logging.getLogger('hpcbench')
+
+
+class NPZExporter(object):
+    """Export a campaign to NumPy arrays
+
+    Every benchmark category gives a table of one row per
+    metrics record. Columns are typed according to the metrics
+    declared by the benchmark. String columns are dictionary-encoded:
+    ``<column>`` holds int32 codes (-1 for missing values)
+    and ``<column>.values`` the distinct strings.
+
+    Arrays are named ``<benchmark>/<category>/<column>``.
+    """
+
+    DTYPES = {bool: np.bool_, int: np.int64, float: np.float64}
+    CONTEXT_ATTRS = ('node', 'tag', 'attempt')
+    RUN_ATTRS = {
+        'id': six.text_type,
+        'date': np.datetime64,
+        'elapsed': float,
+        'exit_status': int,
+    }
+    VALUES_SUFFIX = '.values'
+
+    def __init__(self, path, ofile):
+        """
+        :param path: path to existing campaign
+        :param ofile: path to a ``.npz`` file, or a directory
+        where memory-mappable ``.npy`` files are written.
+        """
+        self.report = ReportNode(path)
+        self.campaign = from_file(path, expandcampvars=False)
+        self.ofile = ofile
+
+    def export(self, metrics=None):
+        """Write campaign arrays
+
+        :param metrics: iterable of metrics records as provided
+        by ``get_metrics``, the campaign is read if None.
+        """
+        arrays = collections.OrderedDict()
+        for group, table in self._tables(metrics).items():
+            for column, array in table.arrays():
+                arrays[group + '/' + column] = array
+        if self.ofile.endswith('.npz'):
+            np.savez_compressed(self.ofile, **arrays)
+        else:
+            for name, array in arrays.items():
+                path = osp.join(self.ofile, name + '.npy')
+                if not osp.isdir(osp.dirname(path)):
+                    os.makedirs(osp.dirname(path))
+                np.save(path, array)
+        return arrays
+
+    def _tables(self, metrics=None):
+        if metrics is None:
+            metrics = get_metrics(self.campaign, self.report)
+        tables = collections.OrderedDict()
+        for attrs, runs in metrics:
+            group = attrs.benchmark + '/' + attrs.category
+            table = tables.get(group)
+            if table is None:
+                table = _Table(self._schema(attrs))
+                tables[group] = table
+            context = dict(
+                (attr, attrs[attr]) for attr in self.CONTEXT_ATTRS if attr in attrs
+            )
+            for run in runs:
+                if not run.get('command_succeeded', False):
+                    continue
+                row = dict(context)
+                for attr in self.RUN_ATTRS:
+                    if attr in run:
+                        row[attr] = run[attr]
+                for metric in run.get('metrics', []):
+                    eax = dict(row)
+                    for key, value in metric.get('context', {}).items():
+                        eax['context.' + key] = value
+                    _flatten_measurement(metric.get('measurement', {}), eax)
+                    table.append(eax)
+        return tables
+
+    def _schema(self, attrs):
+        """Get types of the columns of a benchmark category"""
+        schema = dict(self.RUN_ATTRS)
+        schema.update((attr, six.text_type) for attr in self.CONTEXT_ATTRS)
+        try:
+            config = self.campaign.benchmarks[attrs.tag][attrs.benchmark]
+            benchmark = Benchmark.get_subclass(config['type'])()
+            extractors = benchmark.metrics_extractors
+            if isinstance(extractors, collections.Mapping):
+                extractors = extractors[attrs.category]
+            if not isinstance(extractors, list):
+                extractors = [extractors]
+            for extractor in extractors:
+                schema.update(_flatten_schema(extractor.metrics, 'measurement.'))
+        except Exception as exc:
+            LOGGER.warning(
+                'Could not get metrics of benchmark %s, infer types instead: %s',
+                attrs.benchmark,
+                exc,
+            )
+        return schema
+
+
+class _Table(object):
+    """Columns of a benchmark category, filled row by row"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = collections.OrderedDict()
+        self.size = 0
+
+    def append(self, row):
+        for key in row:
+            if key not in self.columns:
+                self.columns[key] = [None] * self.size
+        for key, values in self.columns.items():
+            values.append(row.get(key))
+        self.size += 1
+
+    def arrays(self):
+        """Generator of tuple (name, numpy array)"""
+        for name, values in self.columns.items():
+            type_ = self.schema.get(name) or _infer_type(values)
+            if type_ is np.datetime64:
+                yield name, np.array(
+                    [value or 'NaT' for value in values], dtype='datetime64[us]'
+                )
+            elif type_ in NPZExporter.DTYPES:
+                dtype = NPZExporter.DTYPES[type_]
+                if any(value is None for value in values):
+                    dtype = np.float64
+                    values = [np.nan if value is None else value for value in values]
+                yield name, np.array(values, dtype=dtype)
+            else:
+                codes, strings = _dictionary_encode(values)
+                yield name, codes
+                yield name + NPZExporter.VALUES_SUFFIX, strings
+
+
+def _flatten_measurement(measurement, row, prefix='measurement.'):
+    for name, value in measurement.items():
+        if isinstance(value, dict):
+            _flatten_measurement(value, row, prefix + name + '.')
+        elif not isinstance(value, list):
+            row[prefix + name] = value
+
+
+def _flatten_schema(schema, prefix):
+    for name, metric in schema.items():
+        if isinstance(metric, Metric):
+            yield prefix + name, metric.type
+        elif isinstance(metric, dict):
+            for column in _flatten_schema(metric, prefix + name + '.'):
+                yield column
+
+
+def _infer_type(values):
+    for value in values:
+        if value is not None:
+            if isinstance(value, bool):
+                return bool
+            if isinstance(value, six.integer_types):
+                return int
+            return type(value)
+
+
+def _dictionary_encode(values):
+    index = collections.OrderedDict()
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+        else:
+            codes[i] = index.setdefault(six.text_type(value), len(index))
+    return codes, np.array(list(index), dtype=six.text_type)
+
+
+def load(path, decode=True):
+    """Load arrays written by ``NPZExporter``
+
+    :param path: ``.npz`` file or directory of ``.npy`` files,
+    the latter being memory-mapped.
+    :param decode: whether dictionary-encoded columns are
+    converted back to arrays of strings, missing values being empty.
+    :return: dict ``<benchmark>/<category>`` -> dict column -> array
+    """
+    if osp.isdir(path):
+        arrays = dict()
+        for dirpath, _, files in os.walk(path):
+            for file_ in files:
+                if file_.endswith('.npy'):
+                    name = osp.relpath(osp.join(dirpath, file_[:-4]), path)
+                    name = name.replace(os.sep, '/')
+                    arrays[name] = np.load(osp.join(dirpath, file_), mmap_mode='r')
+    else:
+        with np.load(path) as data:
+            arrays = dict((name, data[name]) for name in data.files)
+    tables = collections.defaultdict(dict)
+    for name, array in arrays.items():
+        group, column = name.rsplit('/', 1)
+        tables[group][column] = array
+    if decode:
+        for table in tables.values():
+            for column in list(table):
+                if column.endswith(NPZExporter.VALUES_SUFFIX):
+                    strings = table.pop(column)
+                    column = column[: -len(NPZExporter.VALUES_SUFFIX)]
+                    strings = np.append(strings, '')
+                    table[column] = strings[table[column]]
+    return dict(tables)
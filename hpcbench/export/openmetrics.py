@@ -0,0 +1,354 @@
+"""Export campaign data in OpenMetrics text format
+"""
+
+import collections
+import datetime
+import json
+import logging
+import math
+import os
+import os.path as osp
+import re
+import time
+
+import six
+
+from hpcbench.api import Benchmark, Metric
+from hpcbench.campaign import (
+    from_file,
+    JSON_METRICS_FILE,
+    JSON_PROGRESS_FILE,
+    ProgressJournal,
+    YAML_REPORT_FILE,
+)
+
+
+LOGGER = logging.getLogger('hpcbench')
+
+
+class OpenMetricsExporter(object):
+    """Export a campaign to a file in OpenMetrics text format,
+    suitable for the textfile collector of the Prometheus node exporter.
+
+    Only the latest successful run of every
+    (node, tag, benchmark, category, metas) is exported.
+    Every numeric measurement gives a gauge named
+    ``hpcbench_<measurement>_<unit>``, whose labels are the
+    node, tag, benchmark, and category, plus the scalar metas and the
+    context of the metrics, prefixed by ``meta_`` and ``context_``.
+
+    The file can be refreshed while the campaign is running:
+    the metrics files are found with the progress journal of the campaign,
+    and only the runs appended since the previous refresh are read.
+    Campaigns without progress journal are walked at every refresh.
+    """
+
+    PREFIX = 'hpcbench'
+    CONTEXT_ATTRS = ('node', 'tag', 'benchmark', 'category')
+    DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S')
+    TAIL_SIZE = 64
+    RUN_GAUGES = collections.OrderedDict(
+        [
+            ('run_timestamp', 'Date of the latest successful run'),
+            ('run_elapsed', 'Duration of the latest successful run'),
+        ]
+    )
+
+    def __init__(self, path, ofile):
+        """
+        :param path: path to existing campaign
+        :param ofile: file to write, for instance ``hpcbench.prom``
+        in the directory of the node exporter textfile collector.
+        """
+        self.path = path
+        self.campaign = from_file(path, expandcampvars=False)
+        self.ofile = ofile
+        self._categories = dict()
+        self._units = dict()
+        self._content = None
+        self._journal = None
+        self._journal_offset = 0
+        self._finished = False
+        self._paths = set()
+
+    def export(self):
+        """Write the file, reading only the metrics files
+        modified since the previous call
+
+        :return: True if the file has been written, False
+        if its content did not change
+        """
+        paths = set()
+        for path in self._metrics_paths():
+            paths.add(path)
+            self._update_category(path)
+        for path in set(self._categories) - paths:
+            self._categories.pop(path)
+        content = self._render()
+        if content == self._content:
+            return False
+        tmp_file = osp.join(
+            osp.dirname(self.ofile), '.' + osp.basename(self.ofile) + '.tmp'
+        )
+        with open(tmp_file, 'w') as ostr:
+            ostr.write(content)
+        os.rename(tmp_file, self.ofile)
+        self._content = content
+        return True
+
+    def watch(self, interval):
+        """Refresh the file every ``interval`` seconds,
+        until the campaign is complete"""
+        while True:
+            # without progress journal, the campaign is complete
+            # once its report is written
+            complete = osp.exists(osp.join(self.path, YAML_REPORT_FILE))
+            if self.export():
+                LOGGER.info('Updated %s', self.ofile)
+            if self._journal is not None:
+                complete = self._finished
+            if complete:
+                break
+            time.sleep(interval)
+
+    def _metrics_paths(self):
+        """Get directories of the metrics files, the reports tree
+        is not available until the campaign is complete"""
+        if self._journal is None and osp.isfile(
+            osp.join(self.path, JSON_PROGRESS_FILE)
+        ):
+            self._journal = ProgressJournal(self.path)
+        if self._journal is None:
+            for dirpath, _, files in os.walk(self.path):
+                if JSON_METRICS_FILE in files:
+                    yield dirpath
+            return
+        events, self._journal_offset = self._journal.read(self._journal_offset)
+        for event in events:
+            if event['event'] == 'execution_finished':
+                # the metrics file is in the directory of the category
+                self._paths.add(osp.join(self.path, osp.dirname(event['path'])))
+            elif event['event'] == 'campaign_finished':
+                self._finished |= event['path'] == os.curdir
+        for path in self._paths:
+            if osp.isfile(osp.join(path, JSON_METRICS_FILE)):
+                yield path
+
+    def _update_category(self, path):
+        file_ = osp.join(path, JSON_METRICS_FILE)
+        try:
+            stat = os.stat(file_)
+        except OSError:
+            return
+        signature = (stat.st_mtime, stat.st_size)
+        category = self._categories.get(path)
+        if category is not None and category['signature'] == signature:
+            return
+        if category is None:
+            attrs = dict(
+                zip(
+                    self.CONTEXT_ATTRS, osp.relpath(path, self.path).split(os.sep)[-4:],
+                )
+            )
+            category = dict(attrs=attrs)
+        elif category['offset'] > stat.st_size:
+            # file has been replaced
+            category = dict(attrs=category['attrs'])
+        category = self._read_runs(file_, category)
+        category['signature'] = signature
+        self._categories[path] = category
+
+    @classmethod
+    def _read_runs(cls, path, category):
+        """Read the runs appended to a metrics file since the previous call.
+        The file may still be written by the benchmark category driver,
+        and is read again from the beginning if it has been replaced.
+
+        :param category: dict providing the ``offset`` of the first byte
+        not read yet, the ``tail`` of the content already read, and the
+        ``latest`` successful run of every metas.
+        """
+        offset, tail = category.get('offset', 0), category.get('tail', b'')
+        with open(path, 'rb') as istr:
+            istr.seek(offset - len(tail))
+            content = istr.read()
+        if not content.startswith(tail):
+            return cls._read_runs(path, dict(attrs=category['attrs']))
+        content = content[len(tail) :].decode('utf-8', 'replace')
+        latest = category.get('latest', collections.OrderedDict())
+        decoder = json.JSONDecoder()
+        pos = 0
+        while True:
+            pos = _RUNS_DELIMITERS.match(content, pos).end()
+            try:
+                run, end = decoder.raw_decode(content, pos)
+            except ValueError:
+                break
+            pos = end
+            if run.get('command_succeeded', False):
+                metas = json.dumps(run.get('metas') or {}, sort_keys=True)
+                latest.pop(metas, None)
+                latest[metas] = run
+        read = content[:pos].encode('utf-8')
+        tail = (tail + read)[-cls.TAIL_SIZE :]
+        return dict(
+            category,
+            offset=offset + len(read),
+            tail=tail,
+            latest=latest,
+            runs=list(latest.values()),
+        )
+
+    def _render(self):
+        families = collections.OrderedDict()
+        for path in sorted(self._categories):
+            attrs = self._categories[path]['attrs']
+            runs = self._categories[path]['runs']
+            if not runs:
+                continue
+            units = self._get_units(attrs, runs)
+            for run in runs:
+                labels = collections.OrderedDict(attrs)
+                for key, value in sorted((run.get('metas') or {}).items()):
+                    if isinstance(value, _LABEL_TYPES):
+                        labels['meta_' + key] = value
+                self._add_sample(
+                    families,
+                    'run_timestamp',
+                    'seconds',
+                    labels,
+                    self._timestamp(run.get('date')),
+                )
+                self._add_sample(
+                    families, 'run_elapsed', 'seconds', labels, run.get('elapsed')
+                )
+                for metric in run.get('metrics', []):
+                    eax = collections.OrderedDict(labels)
+                    for key, value in sorted(metric.get('context', {}).items()):
+                        eax['context_' + key] = value
+                    for name, value in _flatten(metric.get('measurement', {})):
+                        self._add_sample(
+                            families, name, units.get(name, ''), eax, value
+                        )
+        lines = []
+        for (name, unit), samples in families.items():
+            description = self.RUN_GAUGES.get(name, 'Benchmark measurement ' + name)
+            family = _sanitize(self.PREFIX + '_' + name)
+            if unit:
+                family += '_' + unit
+            lines.append('# HELP {} {}'.format(family, description))
+            lines.append('# TYPE {} gauge'.format(family))
+            if unit:
+                lines.append('# UNIT {} {}'.format(family, unit))
+            for labels, value in samples:
+                lines.append('{}{{{}}} {}'.format(family, labels, value))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def _add_sample(cls, families, name, unit, labels, value):
+        value = _format_value(value)
+        if value is None:
+            return
+        labels = ','.join(
+            '{}="{}"'.format(_sanitize(key), _escape(label))
+            for key, label in labels.items()
+        )
+        families.setdefault((name, _unit_suffix(unit)), []).append((labels, value))
+
+    def _get_units(self, attrs, runs):
+        """Get units of the measurements of a benchmark category"""
+        key = tuple(attrs.get(attr) for attr in self.CONTEXT_ATTRS)
+        units = self._units.get(key)
+        if units is None:
+            units = dict()
+            try:
+                units.update(self._declared_units(attrs, runs))
+            except Exception as exc:
+                LOGGER.warning(
+                    'Could not get metrics of benchmark %s: %s',
+                    attrs.get('benchmark'),
+                    exc,
+                )
+            self._units[key] = units
+        return units
+
+    def _declared_units(self, attrs, runs):
+        config = dict()
+        benchmarks = self.campaign.benchmarks
+        if attrs.get('tag') in benchmarks:
+            config = benchmarks[attrs['tag']].get(attrs.get('benchmark')) or {}
+        type_ = config.get('type') or runs[0]['benchmark']
+        benchmark = Benchmark.get_subclass(type_)()
+        extractors = benchmark.metrics_extractors
+        if isinstance(extractors, collections.Mapping):
+            extractors = extractors[attrs['category']]
+        if not isinstance(extractors, list):
+            extractors = [extractors]
+        for extractor in extractors:
+            for name, metric in _flatten(extractor.metrics):
+                if isinstance(metric, Metric):
+                    yield name, metric.unit
+
+    @classmethod
+    def _timestamp(cls, date):
+        if date is None:
+            return None
+        for fmt in cls.DATE_FORMATS:
+            try:
+                date = datetime.datetime.strptime(date, fmt)
+            except ValueError:
+                continue
+            return time.mktime(date.timetuple()) + date.microsecond / 1e6
+
+
+def _flatten(measurement, prefix=''):
+    """Generator of tuple (name, value) of the scalar measurements,
+    nested names being joined by underscores"""
+    for name, value in sorted(measurement.items()):
+        if isinstance(value, dict):
+            for item in _flatten(value, prefix + name + '_'):
+                yield item
+        elif not isinstance(value, list):
+            yield prefix + name, value
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, six.integer_types):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return None
+
+
+_LABEL_TYPES = six.string_types + six.integer_types + (float,)
+_RUNS_DELIMITERS = re.compile(r'[\s\[,]*')
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _sanitize(name):
+    name = _INVALID_NAME_CHARS.sub('_', name)
+    if name[:1].isdigit():
+        name = '_' + name
+    return name
+
+
+def _unit_suffix(unit):
+    """Convert a unit like ``MB/s`` to a metric name suffix like ``mb_per_s``"""
+    unit = unit.strip().lower().replace('/', '_per_')
+    return _sanitize(unit).strip('_')
+
+
+def _escape(value):
+    return (
+        six.text_type(value)
+        .replace('\\', r'\\')
+        .replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
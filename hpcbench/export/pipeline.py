@@ -0,0 +1,127 @@
+"""Export a campaign to several sinks at once
+"""
+
+import copy
+import logging
+import threading
+
+from six.moves import queue
+
+from hpcbench.campaign import from_file, get_metrics, ReportNode
+
+
+LOGGER = logging.getLogger('hpcbench')
+
+
+class ExportPipeline(object):
+    """Read the metrics of a campaign once and fan every record
+    out to several sinks.
+
+    Every sink is run by its own thread, and reads the records
+    from a bounded queue: the campaign traversal waits for the
+    slowest sink instead of keeping records in memory.
+    Every sink is given its own copy of the records, so that
+    it can modify them without affecting the other sinks.
+    """
+
+    QUEUE_SIZE = 16
+
+    def __init__(self, path, queue_size=None):
+        """
+        :param path: path to existing campaign
+        :param queue_size: maximum number of records waiting
+        to be consumed by every sink
+        """
+        self.report = ReportNode(path)
+        self.campaign = from_file(path, expandcampvars=False)
+        self.queue_size = queue_size or self.QUEUE_SIZE
+        self.sinks = []
+
+    def register(self, sink):
+        """Add a sink to the pipeline
+
+        :param sink: callable accepting a ``metrics`` keyword argument,
+        an iterable of records as provided by ``get_metrics``.
+        Typically the ``export`` method of an exporter.
+        :return: the given sink
+        """
+        self.sinks.append(sink)
+        return sink
+
+    def run(self):
+        """Traverse the campaign and feed every sink
+
+        A sink failure does not prevent the others from completing.
+        """
+        streams = [_Records(self.queue_size) for _ in self.sinks]
+        errors = [None] * len(self.sinks)
+        workers = [
+            threading.Thread(target=self._consume, args=(sink, stream, errors, i))
+            for i, (sink, stream) in enumerate(zip(self.sinks, streams))
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        try:
+            for record in get_metrics(self.campaign, self.report):
+                # copies are made before the first sink
+                # may modify the original record
+                for stream in streams[1:]:
+                    stream.put(copy.deepcopy(record))
+                if streams:
+                    streams[0].put(record)
+        finally:
+            for stream in streams:
+                stream.put(_Records.END)
+            for worker in workers:
+                worker.join()
+        failures = [(sink, exc) for sink, exc in zip(self.sinks, errors) if exc]
+        if failures:
+            raise Exception(
+                'Export failed for sinks: '
+                + ', '.join('%s (%s)' % (_name(sink), exc) for sink, exc in failures)
+            )
+
+    @classmethod
+    def _consume(cls, sink, stream, errors, index):
+        try:
+            sink(metrics=iter(stream))
+        except Exception as exc:
+            LOGGER.exception('Export failed for sink %s', _name(sink))
+            errors[index] = exc
+        # keep on consuming the queue so that the traversal is not blocked
+        stream.drain()
+
+
+class _Records(object):
+    """Bounded queue of metrics records, iterable until
+    the end of the campaign traversal"""
+
+    END = object()
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.done = False
+
+    def put(self, record):
+        self.queue.put(record)
+
+    def __iter__(self):
+        while not self.done:
+            record = self.queue.get()
+            if record is self.END:
+                self.done = True
+            else:
+                yield record
+
+    def drain(self):
+        for _ in self:
+            pass
+
+
+def _name(sink):
+    sink = getattr(sink, 'func', sink)
+    owner = getattr(sink, '__self__', None)
+    if owner is not None:
+        return owner.__class__.__name__
+    return getattr(sink, '__name__', repr(sink))
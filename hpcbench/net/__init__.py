@@ -1,31 +1,37 @@
 """Distribute benchmark execution across your cluster
 """
-from contextlib import closing, contextmanager
 import datetime
-import functools
+import getpass
+import hashlib
 import logging
-from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 import os
 import os.path as osp
 import re
 import shutil
 import subprocess
+import sys
 import tempfile
 
 from cached_property import cached_property
-import six
+from ClusterShell.Event import EventHandler
+from ClusterShell.NodeSet import NodeSet
+from ClusterShell.Task import task_self
+from six.moves import shlex_quote
 import yaml
 
+import hpcbench
 from hpcbench import jinja_environment
 from hpcbench.campaign import from_file as campaign_from_file
 from hpcbench.driver import write_yaml_report
-from hpcbench.toolbox.contextlib_ext import mkdtemp, pushd
+from hpcbench.toolbox.contextlib_ext import pushd
 from hpcbench.toolbox.process import find_executable
 
 
 LOGGER = logging.getLogger('benet')
 SSH = find_executable('ssh')
 SCP = find_executable('scp')
+COUNT_FILES = 'find . -type f | wc -l'
 RE_TYPE = type(re.compile('hello'))
 
 
@@ -33,6 +39,8 @@ class CampaignHolder(object):
     """Abstract class to ease usage of ``campaign`` configuration
     """
 
+    SSH_CONTROL_PERSIST = 60
+
     def __init__(self, campaign):
         self.campaign = campaign
 
@@ -54,11 +62,29 @@ class CampaignHolder(object):
 
     def _ssh_cmd(self, args, cmd=None):
         cmd = cmd or SSH
-        command = [cmd]
+        return [cmd] + self.ssh_options + args
+
+    @cached_property
+    def ssh_options(self):
+        """Get options given to SSH commands
+        :rtype: list of string
+        """
+        options = []
         ssh_config = self.campaign.network.get('ssh_config_file')
         if ssh_config:
-            command += ['-F', ssh_config]
-        return command + args
+            options += ['-F', ssh_config]
+        if self.campaign.network.get('ssh_multiplexing', True):
+            control_dir = osp.join(
+                tempfile.gettempdir(), 'hpcbench-ssh-' + getpass.getuser()
+            )
+            if not osp.isdir(control_dir):
+                os.makedirs(control_dir, 0o700)
+            options += [
+                '-oControlMaster=auto',
+                '-oControlPath=' + osp.join(control_dir, '%C'),
+                '-oControlPersist=%d' % self.SSH_CONTROL_PERSIST,
+            ]
+        return options
 
     @cached_property
     def remote_output_dir(self):
@@ -81,10 +107,18 @@ class CampaignHolder(object):
 
 class BeNet(CampaignHolder):
     """Main driver
+
+    Remote commands are executed with the ClusterShell ``Task`` engine,
+    on at most ``network.fanout`` nodes at a time. A failure on a node
+    does not prevent the others from completing.
     """
 
     INSTALLER_SCRIPT = 'hpcbench-benet.sh'
     REMOTE_BENCH_RUNNER = osp.join(tempfile.gettempdir(), INSTALLER_SCRIPT)
+    CONNECT_TIMEOUT = 10
+    ENVS_DIR = 'envs'
+    WHEELHOUSE_DIR = 'wheelhouse'
+    ENV_COMPLETE_FILE = '.complete'
 
     def __init__(self, campaign_file, logger=None):
         self.campaign_file = campaign_file
@@ -93,6 +127,7 @@ class BeNet(CampaignHolder):
         now = datetime.datetime.now()
         output_dir = now.strftime(self.campaign.output_dir)
         self.campaign_path = osp.normpath(output_dir)
+        self.failures = dict()
 
     def run(self, *nodes):
         """Execute benchmarks on every node specified in arguments.
@@ -105,17 +140,21 @@ class BeNet(CampaignHolder):
         @write_yaml_report
         def _run():
             self._build_installer()
-            runner = functools.partial(run_on_host, self.campaign)
-            if self.campaign.network.max_concurrent_runs > 1:
-                pool = Pool(self.campaign.network.max_concurrent_runs)
-                pool.map(runner, nodes)
-            else:
-                for node in nodes:
-                    runner(node)
-            return nodes
+            self._build_remote_campaign()
+            self._run_on_nodes(nodes)
+            report = dict(
+                children=[node for node in nodes if node not in self.failures]
+            )
+            if self.failures:
+                report['failures'] = self.failures
+            return report
 
         with pushd(self.campaign_path):
             _run()
+        if self.failures:
+            raise Exception(
+                'Benchmarks failed on nodes: %s' % NodeSet.fromlist(self.failures)
+            )
 
     @property
     def nodes(self):
@@ -124,6 +163,254 @@ class BeNet(CampaignHolder):
         """
         return self.campaign.network.nodes
 
+    @cached_property
+    def task(self):
+        """Get ClusterShell task executing the remote commands"""
+        task = task_self()
+        task.set_info('fanout', self.campaign.network.fanout)
+        task.set_info('ssh_path', SSH)
+        task.set_info('scp_path', SCP)
+        task.set_info('connect_timeout', self.CONNECT_TIMEOUT)
+        task.set_info(
+            'ssh_options', ' '.join(shlex_quote(opt) for opt in self.ssh_options)
+        )
+        return task
+
+    @property
+    def remote_campaign_file(self):
+        """Get path to the campaign file given to ``ben-sh`` on nodes"""
+        return osp.join(
+            tempfile.gettempdir(), 'hpcbench-benet-%s.yaml' % self.remote_output_dir
+        )
+
+    def _run_on_nodes(self, all_nodes):
+        self.log.info('installing remote installer')
+        nodes = self._copy(
+            self.REMOTE_BENCH_RUNNER, self.REMOTE_BENCH_RUNNER, all_nodes
+        )
+        nodes = self._copy(self.remote_campaign_file, self.remote_campaign_file, nodes)
+        try:
+            nodes = self._deploy_wheelhouse(nodes)
+            self.log.info('Executing benchmarks on nodes')
+            fanout = self.campaign.network.get('max_concurrent_runs')
+            command = ' '.join(
+                ['sh', self.REMOTE_BENCH_RUNNER, shlex_quote(self.remote_campaign_file)]
+            )
+            nodes = self._execute(command, nodes, fanout=fanout, log_output=True)
+            self._retrieve_results(nodes)
+            self._execute(
+                'rm -rf ' + shlex_quote(self.remote_results_dir),
+                [node for node in nodes if node not in self.failures],
+                record=False,
+            )
+        finally:
+            # the wheelhouse may be shared by the nodes,
+            # it is removed once every node is done
+            self.log.info('removing remote installer')
+            self._execute(
+                ' '.join(
+                    [
+                        'rm',
+                        '-rf',
+                        self.REMOTE_BENCH_RUNNER,
+                        shlex_quote(self.remote_campaign_file),
+                        shlex_quote(self.remote_wheelhouse_dir),
+                    ]
+                ),
+                all_nodes,
+                record=False,
+            )
+            if osp.exists(self.remote_campaign_file):
+                os.remove(self.remote_campaign_file)
+
+    def _deploy_wheelhouse(self, nodes):
+        """Push the wheels of the packages to install to the nodes
+        where the environment is not available yet
+
+        :return: nodes ready to execute the installer
+        """
+        outputs = dict()
+        marker = osp.join(self.remote_env_dir, self.ENV_COMPLETE_FILE)
+        nodes = self._execute(
+            'test -f %s && echo cached || echo missing' % shlex_quote(marker),
+            nodes,
+            outputs=outputs,
+        )
+        missing = [node for node in nodes if outputs[node].strip() != 'cached']
+        if not missing:
+            self.log.info('reusing environment %s on nodes', self.remote_env_key)
+            return nodes
+        wheelhouse = self._build_wheelhouse()
+        if wheelhouse is None:
+            # the installer falls back on the package index
+            return nodes
+        self.log.info('pushing wheelhouse to nodes: %s', NodeSet.fromlist(missing))
+        try:
+            command = 'rm -rf {0} && mkdir -p {1}'.format(
+                shlex_quote(self.remote_wheelhouse_dir),
+                shlex_quote(osp.dirname(self.remote_wheelhouse_dir)),
+            )
+            pushed = self._execute(command, missing)
+            pushed = set(self._copy(wheelhouse, self.remote_wheelhouse_dir, pushed))
+        finally:
+            shutil.rmtree(wheelhouse)
+        return [node for node in nodes if node not in missing or node in pushed]
+
+    def _build_wheelhouse(self):
+        """Build the wheels of the packages to install on nodes,
+        and of their dependencies
+
+        :return: path to a temporary directory, None if
+        the wheels could not be built
+        """
+        wheelhouse = tempfile.mkdtemp(prefix='hpcbench-wheelhouse-')
+        command = [sys.executable, '-m', 'pip', 'wheel', '--wheel-dir', wheelhouse]
+        try:
+            subprocess.check_call(command + self.pip_requirements)
+        except Exception as exc:
+            shutil.rmtree(wheelhouse)
+            self.log.warning(
+                'Could not build wheelhouse, nodes will install packages '
+                'from the package index: %s',
+                exc,
+            )
+            return None
+        return wheelhouse
+
+    @cached_property
+    def pip_requirements(self):
+        """Get ``pip`` arguments of the packages installed on nodes,
+        HPCBench followed by the plugins
+        :rtype: list of string
+        """
+        plugins = self.campaign.network.get('pip_plugins') or []
+        return [self.pip_installer_url] + sorted(set(plugins))
+
+    @cached_property
+    def remote_env_key(self):
+        """Get identifier of the remote environment,
+        changing with the packages to install and the version
+        of HPCBench, since the installer URL may be a branch"""
+        requirements = [hpcbench.__version__] + self.pip_requirements
+        requirements = '\n'.join(requirements).encode('utf-8')
+        return hashlib.sha1(requirements).hexdigest()[:16]
+
+    @property
+    def remote_env_dir(self):
+        """Get directory of the virtualenv on nodes"""
+        return osp.join(self.remote_work_dir, self.ENVS_DIR, self.remote_env_key)
+
+    @property
+    def remote_wheelhouse_dir(self):
+        """Get directory on nodes where the wheels are pushed"""
+        return osp.join(self.remote_work_dir, self.WHEELHOUSE_DIR, self.remote_env_key)
+
+    def _retrieve_results(self, nodes):
+        """Stream the results of the nodes in the campaign directory,
+        and ensure that every file of the nodes has been received
+        """
+        self.log.info('retrieving results')
+        outputs = dict()
+        command = BeNetHost.remote_results_command(self.remote_results_dir, COUNT_FILES)
+        nodes = self._execute(command, nodes, outputs=outputs)
+        if not nodes:
+            return
+        compression = self.campaign.network.results_compression
+        pool = ThreadPool(min(len(nodes), self.campaign.network.fanout))
+        try:
+            pool.map(
+                lambda node: self._retrieve_node(
+                    node, compression, int(outputs[node].strip())
+                ),
+                nodes,
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+    def _retrieve_node(self, node, compression, files):
+        host = BeNetHost(self.campaign, node)
+        try:
+            host.retrieve_results(self.remote_results_dir, compression, files)
+        except Exception as exc:
+            self._fail(node, str(exc))
+
+    @property
+    def remote_results_dir(self):
+        """Get directory on nodes where ``ben-sh`` writes its results"""
+        return osp.join(self.remote_work_dir, self.remote_output_dir)
+
+    def _execute(
+        self, command, nodes, fanout=None, log_output=False, record=True, outputs=None
+    ):
+        """Execute a command on nodes in parallel
+
+        :param outputs: optional dict filled with the standard output
+        of the nodes where the command succeeded
+        :return: nodes where the command succeeded
+        """
+        if not nodes:
+            return []
+        handler = _NodeLogger(self.log) if log_output else None
+        self.task.set_info('fanout', fanout or self.campaign.network.fanout)
+        try:
+            worker = self.task.shell(
+                command,
+                nodes=NodeSet.fromlist(nodes),
+                handler=handler,
+                stderr=True,
+                stdin=False,
+            )
+            self.task.run()
+        finally:
+            self.task.set_info('fanout', self.campaign.network.fanout)
+        succeeded = self._check_worker(worker, nodes, command, record)
+        if outputs is not None:
+            for node in succeeded:
+                output = worker.node_buffer(node) or b''
+                if isinstance(output, bytes):
+                    output = output.decode('utf-8', 'replace')
+                outputs[node] = output
+        return succeeded
+
+    def _copy(self, source, dest, nodes):
+        """Copy a file to nodes
+
+        :return: nodes where the copy succeeded
+        """
+        if not nodes:
+            return []
+        worker = self.task.copy(source, dest, NodeSet.fromlist(nodes), stderr=True)
+        self.task.run()
+        return self._check_worker(worker, nodes, 'copy of ' + source)
+
+    def _check_worker(self, worker, nodes, description, record=True):
+        statuses = dict()
+        for retcode, keys in worker.iter_retcodes():
+            for node in keys:
+                statuses[node] = retcode
+        for node in worker.iter_keys_timeout():
+            statuses[node] = 'timeout'
+        succeeded = []
+        for node in nodes:
+            status = statuses.get(node)
+            if status == 0:
+                succeeded.append(node)
+                continue
+            error = worker.node_error(node) or b''
+            if isinstance(error, bytes):
+                error = error.decode('utf-8', 'replace')
+            reason = '%s failed (exit status: %s) %s' % (description, status, error)
+            if record:
+                self._fail(node, reason.strip())
+            else:
+                self.log.warning('%s: %s', node, reason.strip())
+        return succeeded
+
+    def _fail(self, node, reason):
+        self.log.error('%s: %s', node, reason)
+        self.failures[node] = reason
+
     def _build_installer(self):
         self.log.info('Generating installer script %s', BeNet.REMOTE_BENCH_RUNNER)
         template = jinja_environment.get_template(self.installer_template)
@@ -134,23 +421,55 @@ class BeNet(CampaignHolder):
         properties = dict(
             prelude=prelude,
             work_dir=self.remote_work_dir,
-            hpcbench_pip_pkg=self.pip_installer_url,
+            hpcbench_pip_pkg=' '.join(
+                shlex_quote(requirement) for requirement in self.pip_requirements
+            ),
             output_dir=self.remote_output_dir,
+            env_dir=osp.join(self.ENVS_DIR, self.remote_env_key),
+            env_complete_file=self.ENV_COMPLETE_FILE,
+            wheelhouse_dir=osp.join(self.WHEELHOUSE_DIR, self.remote_env_key),
         )
         with open(BeNet.REMOTE_BENCH_RUNNER, 'w') as ostr:
             template.stream(**properties).dump(ostr)
 
+    def _build_remote_campaign(self):
+        with open(self.remote_campaign_file, 'w') as ostr:
+            yaml.dump(self._prepare_campaign(), ostr)
+
+    def _prepare_campaign(self):
+        def _nameddict_to_dict(ndict):
+            eax = {}
+            for key, value in ndict.items():
+                if isinstance(value, dict):
+                    value = _nameddict_to_dict(value)
+                elif isinstance(value, (list)):
+                    value = [
+                        _nameddict_to_dict(item) if isinstance(item, dict) else item
+                        for item in value
+                    ]
+                elif isinstance(value, RE_TYPE):
+                    value = value.pattern
+                eax[key] = value
+            return eax
+
+        campaign = _nameddict_to_dict(self.campaign)
+        campaign['output_dir'] = self.campaign.campaign_id
+        return campaign
+
     def _prelude(self, *nodes):
         if osp.isdir(self.campaign_path):
             raise RuntimeError(
                 'Campaign output directory already exists: %s' % self.campaign_path
             )
-        has_error = False
-        for node in nodes:
-            if not self._check_ssh_access(node):
-                has_error = True
-        if has_error:
-            raise RuntimeError('Could not reach some nodes')
+        self.log.info(
+            'checking SSH connectivity with nodes: %s', NodeSet.fromlist(nodes)
+        )
+        reachable = self._execute('true', nodes, record=False)
+        unreachable = [node for node in nodes if node not in reachable]
+        if unreachable:
+            raise RuntimeError(
+                'Could not reach some nodes: %s' % NodeSet.fromlist(unreachable)
+            )
 
     @cached_property
     def pip_installer_url(self):
@@ -158,118 +477,90 @@ class BeNet(CampaignHolder):
         """
         return self.campaign.network.pip_installer_url
 
-    def _check_ssh_access(self, node):
-        self.log.info('checking SSH connectivity with node: %s', node)
-        command = self.ssh(node, 'true')
-        if subprocess.call(command) == 0:
-            return True
-        return False
 
+class _NodeLogger(EventHandler):
+    """Log output of remote commands, line by line"""
 
-def run_on_host(campaign, node, **kwargs):
-    """Wrapper function around ``BeNetHost`` class
-    meant to be used with ``multiprocessing`` module.
-    """
-    return BeNetHost(campaign, node, **kwargs).run()
+    def __init__(self, logger):
+        super(_NodeLogger, self).__init__()
+        self.logger = logger
+
+    def ev_read(self, worker, node, sname, msg):
+        if isinstance(msg, bytes):
+            msg = msg.decode('utf-8', 'replace')
+        log = self.logger.getChild(node)
+        if sname == worker.SNAME_STDERR:
+            log.warning(msg)
+        else:
+            log.info(msg)
 
 
 class BeNetHost(CampaignHolder):
-    """Remote benchmark execution
+    """Results of a node
     """
 
+    TAR_COMPRESSION_FLAGS = dict(gzip='z', xz='J', none='')
+
     def __init__(self, campaign, node, logger=None):
         """
         :param campaign: campaign configuration as a dictionary
-        :param node: server where to execute benchmarks
+        :param node: server where benchmarks were executed
         :keyword logger: optional logger object
         """
         super(BeNetHost, self).__init__(campaign)
         self.node = node
         self.log = logger or LOGGER.getChild(node)
 
-    def run(self):
-        """Execute benchmark on the specified node
+    @classmethod
+    def remote_results_command(cls, results_dir, command):
+        """Build a shell command executed in the only directory
+        created by ``ben-sh`` in the given directory"""
+        return 'cd {} && set -- */ && [ $# -eq 1 ] && cd "$1" && {}'.format(
+            shlex_quote(results_dir), command
+        )
+
+    def retrieve_results(self, results_dir, compression, files):
+        """Stream the results of the node in a directory named after
+        the node in the current directory, without intermediate archive.
+
+        :param results_dir: remote directory given to ``ben-sh``
+        :param compression: one of ``gzip``, ``xz``, or ``none``
+        :param files: number of files expected
         """
-        with self._scp_bensh_runner():
-            self._execute_bensh_runner()
-            path = self._retrieve_tarball()
+        flag = self.TAR_COMPRESSION_FLAGS[compression]
+        dest = osp.abspath(self.node)
+        partial = osp.join(osp.dirname(dest), '.' + self.node + '.partial')
+        os.mkdir(partial)
+        try:
+            remote = self.ssh(
+                self.node,
+                self.remote_results_command(results_dir, 'tar c%sf - .' % flag),
+            )
+            sender = subprocess.Popen(remote, stdout=subprocess.PIPE)
             try:
-                self._aggregate_tarball(path)
+                receiver = subprocess.Popen(
+                    ['tar', 'x%sf' % flag, '-', '-C', partial], stdin=sender.stdout
+                )
             finally:
-                os.remove(path)
-
-    def _execute_bensh_runner(self):
-        self.log.info('Executing benchmarks on node')
-        with closing(six.moves.cStringIO()) as config:
-            campaign = self._prepare_campaign()
-            yaml.dump(campaign, config)
-            command = self.ssh(self.node, 'sh', BeNet.REMOTE_BENCH_RUNNER, '-')
-            process = subprocess.Popen(command, stdin=subprocess.PIPE)
-            yml_config = config.getvalue()  # pragma pylint: disable=no-member
-            process.communicate(input=yml_config.encode('utf-8'))
-        exit_status = process.wait()
-        if exit_status != 0:
-            raise Exception('remote ben-sh failed')
-
-    def _prepare_campaign(self):
-        def _nameddict_to_dict(ndict):
-            eax = {}
-            for key, value in ndict.items():
-                if isinstance(value, dict):
-                    value = _nameddict_to_dict(value)
-                elif isinstance(value, (list)):
-                    value = [
-                        _nameddict_to_dict(item) if isinstance(item, dict) else item
-                        for item in value
-                    ]
-                elif isinstance(value, RE_TYPE):
-                    value = value.pattern
-                eax[key] = value
-            return eax
-
-        campaign = _nameddict_to_dict(self.campaign)
-        campaign['output_dir'] = self.campaign.campaign_id
-        return campaign
-
-    def _retrieve_tarball(self):
-        fdesc, archive = tempfile.mkstemp(
-            prefix='hpcbench-campaign-result', suffix='.tar.bz2'
-        )
-        os.close(fdesc)
-        remote_file = osp.join(
-            self.remote_work_dir, self.remote_output_dir + '.tar.bz2'
-        )
-        cmd = self.scp('{}:{}'.format(self.node, remote_file), archive)
-        subprocess.check_call(cmd)
-        return archive
-
-    def _aggregate_tarball(self, path):
-        with mkdtemp(prefix='hpcbench-campaign-result', remove=False) as tmpd:
-            local_output_dir = os.getcwd()
-            with pushd(tmpd):
-                subprocess.check_call(['tar', 'jxf', path])
-                dirs = [
-                    _dir
-                    for _dir in os.listdir(self.remote_output_dir)
-                    if osp.isdir(osp.join(self.remote_output_dir, _dir))
-                ]
-                if len(dirs) != 1:
-                    raise Exception('Expected one directory but got: %s' % dirs)
-                shutil.move(
-                    osp.join(self.remote_output_dir, dirs[0]),
-                    osp.join(local_output_dir, self.node),
+                sender.stdout.close()
+            received = receiver.wait()
+            sent = sender.wait()
+            if sent != 0 or received != 0:
+                raise Exception(
+                    'could not retrieve results '
+                    '(exit status: remote %s, local %s)' % (sent, received)
                 )
-
-    @contextmanager
-    def _scp_bensh_runner(self):
-        self.log.info('installing remote installer')
-        command = self.scp(
-            BeNet.REMOTE_BENCH_RUNNER, self.node + ':' + BeNet.REMOTE_BENCH_RUNNER
-        )
-        subprocess.check_call(command)
-        try:
-            yield
-        finally:
-            self.log.info('removing remote installer')
-            command = self.ssh(self.node, 'rm', '-f', BeNet.REMOTE_BENCH_RUNNER)
-            subprocess.check_call(command)
+            actual = sum(
+                1
+                for dirpath, _, filenames in os.walk(partial)
+                for name in filenames
+                if not osp.islink(osp.join(dirpath, name))
+            )
+            if actual != files:
+                raise Exception(
+                    'received %s files out of %s expected' % (actual, files)
+                )
+            os.rename(partial, dest)
+        except Exception:
+            shutil.rmtree(partial)
+            raise
@@ -100,24 +100,100 @@ class Configuration(nameddict):
         return config
 
 
-def flatten_dict(dic, parent_key='', sep='.'):
+def flatten_dict(dic, parent_key='', sep='.', prefixes=None):
     """Flatten sub-keys of a dictionary
+
+    :param prefixes: optional set of flattened keys to keep,
+    with the keys of all their parents. Other sub-trees are skipped.
     """
     items = []
     for key, value in dic.items():
         new_key = parent_key + sep + key if parent_key else key
+        if prefixes is not None and new_key not in prefixes:
+            continue
         if isinstance(value, collections.MutableMapping):
-            items.extend(flatten_dict(value, new_key, sep=sep).items())
+            items.extend(flatten_dict(value, new_key, sep, prefixes).items())
         elif isinstance(value, list):
             for idx, elt in enumerate(value):
-                items.extend(
-                    flatten_dict(elt, new_key + sep + str(idx), sep=sep).items()
-                )
+                elt_key = new_key + sep + str(idx)
+                if prefixes is not None and elt_key not in prefixes:
+                    continue
+                if isinstance(elt, collections.MutableMapping):
+                    items.extend(flatten_dict(elt, elt_key, sep, prefixes).items())
+                else:
+                    items.append((elt_key, elt))
         else:
             items.append((new_key, value))
     return dict(items)
 
 
+def explode_dict(dic, sep='.', index_key='index', tables=None):
+    """Flatten a dictionary in rows instead of columns.
+    Every element of a list-valued field gives a row with the
+    element fields, its position in the list, and the scalar fields
+    of the enclosing dictionaries. Lists are not crossed with each other.
+
+    :param index_key: name of the sub-key providing the list position
+    :param tables: optional set of flattened keys of dictionaries
+    of equal-length lists, whose columns are zipped into rows.
+    Keys located in list elements are relative to the element.
+    :return: generator of flat dictionaries
+    """
+    tables = tables or set()
+    scalars, lists = dict(), []
+    _split_dict(dic, '', sep, scalars, lists, tables)
+    has_rows = False
+    for key, values in lists:
+        prefix = key + sep
+        sub_tables = set(
+            table[len(prefix) :] for table in tables if table.startswith(prefix)
+        )
+        for idx, elt in enumerate(values):
+            if isinstance(elt, collections.Mapping):
+                rows = explode_dict(elt, sep, index_key, sub_tables)
+            else:
+                rows = [{None: elt}]
+            for row in rows:
+                eax = dict(scalars)
+                eax[key + sep + index_key] = idx
+                for sub_key, value in row.items():
+                    eax[key if sub_key is None else key + sep + sub_key] = value
+                has_rows = True
+                yield eax
+    if not has_rows:
+        yield scalars
+
+
+def _split_dict(dic, parent_key, sep, scalars, lists, tables):
+    for key, value in dic.items():
+        new_key = parent_key + sep + key if parent_key else key
+        if new_key in tables and isinstance(value, collections.Mapping):
+            lists.append((new_key, table_rows(value)))
+        elif isinstance(value, collections.Mapping):
+            _split_dict(value, new_key, sep, scalars, lists, tables)
+        elif isinstance(value, list):
+            lists.append((new_key, value))
+        else:
+            scalars[new_key] = value
+
+
+def table_rows(table):
+    """:return: list of dict built from columns of a table"""
+    names = list(table)
+    return [dict(zip(names, row)) for row in zip(*[table[name] for name in names])]
+
+
+def key_prefixes(keys, sep='.'):
+    """:return: set of the given flattened keys and all their parents
+    """
+    prefixes = set()
+    for key in keys:
+        parts = key.split(sep)
+        for i in range(len(parts)):
+            prefixes.add(sep.join(parts[: i + 1]))
+    return prefixes
+
+
 def dict_merge(dct, merge_dct):
     """ Recursive dict merge. Inspired by :meth:``dict.update()``, instead of
     updating only top-level keys, dict_merge recurses down into dicts nested
@@ -184,6 +260,9 @@ class FrozenDict(collections.Mapping):
     def __str__(self):
         return str(self._d)
 
+    def __reduce__(self):
+        return self.__class__, (self._d,)
+
     def __hash__(self):
         if self._hash is None:
             self._hash = 0
@@ -222,6 +301,9 @@ class FrozenList(collections.Sequence):
     def __str__(self):
         return str(self._l)
 
+    def __reduce__(self):
+        return self.__class__, (self._l,)
+
     def __eq__(self, obj):
         if isinstance(obj, FrozenList):
             return self._l == obj._l
@@ -232,6 +314,38 @@ class FrozenList(collections.Sequence):
 yaml.add_representer(FrozenList, SafeRepresenter.represent_list)
 
 
+class LRUCache(object):
+    """Mapping bounded in number of entries. When full,
+    the least recently used entry is discarded."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._d = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._d.pop(key)
+        except KeyError:
+            return default
+        self._d[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._d.pop(key, None)
+        self._d[key] = value
+        while len(self._d) > self.maxsize:
+            self._d.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._d
+
+    def __len__(self):
+        return len(self._d)
+
+    def clear(self):
+        self._d.clear()
+
+
 def freeze(obj):
     """Transform tree of dict and list in read-only
     data structure.
@@ -38,6 +38,28 @@ def chunks(iterator, size):
         yield [item] + list(islice(iterator, size - 1))
 
 
+def bounded_chunks(iterable, size, max_bytes, sizeof=len):
+    """Split an iterable into chunks of at most `size` elements
+    and `max_bytes` bytes, the size of an element being given
+    by the `sizeof` callable. An element larger than `max_bytes`
+    gives a chunk on its own.
+    Example:
+        >>> x = bounded_chunks(['a', 'bb', 'ccc', 'd'], 3, 4)
+        >>> list(x)
+        [['a', 'bb'], ['ccc', 'd']]
+    """
+    chunk, chunk_bytes = [], 0
+    for item in iterable:
+        item_bytes = sizeof(item)
+        if chunk and (len(chunk) == size or chunk_bytes + item_bytes > max_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(item)
+        chunk_bytes += item_bytes
+    if chunk:
+        yield chunk
+
+
 def listify(func=None, wrapper=list):
     """
     A decorator which wraps a function's return value in ``list(...)``.
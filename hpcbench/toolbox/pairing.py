@@ -0,0 +1,216 @@
+"""Strategies to select pairs of nodes for point-to-point benchmarks
+
+Every strategy is a generator given the sorted list of nodes
+and yielding the pairs lazily, each pair being a list of 2 nodes.
+"""
+import collections
+import random
+import re
+
+from ClusterShell.NodeSet import NodeSet
+
+
+def all_pairs(nodes):
+    """Every entry of the strictly upper triangular matrix of nodes,
+    i.e. n * (n - 1) / 2 pairs"""
+    for pos, node in enumerate(nodes):
+        for other in nodes[pos + 1 :]:
+            yield [node, other]
+
+
+def covering(nodes, k=2):
+    """Pairs such as every node appears in at least ``k`` of them.
+
+    Nodes are paired with the nodes located at distance 1, 2, ...
+    on the ring of nodes, which requires about n * k / 2 pairs.
+    """
+    count = len(nodes)
+    for distance in range(1, min((k + 1) // 2, count // 2) + 1):
+        for pos, node in enumerate(nodes):
+            other = (pos + distance) % count
+            if 2 * distance == count and other < pos:
+                # both directions of the diameter are the same pairs
+                continue
+            yield [node, nodes[other]]
+
+
+def ring(nodes):
+    """Every node with its successor on the ring of nodes"""
+    return covering(nodes, k=2)
+
+
+def hypercube(nodes):
+    """Pairs of the recursive doubling algorithm: at step ``s``,
+    node ``i`` is paired with node ``i XOR 2^s``, i.e. n * log2(n) / 2 pairs.
+    Partners beyond the number of nodes are skipped.
+    """
+    count = len(nodes)
+    distance = 1
+    while distance < count:
+        for pos, node in enumerate(nodes):
+            other = pos ^ distance
+            if pos < other < count:
+                yield [node, nodes[other]]
+        distance *= 2
+
+
+def random_k(nodes, k=1, seed=None):
+    """Every node with ``k`` distinct partners picked randomly.
+
+    :param seed: seed of the random generator, to select the same
+    pairs on every execution
+    """
+    rand = random.Random(seed)
+    count = len(nodes)
+    k = min(k, count - 1)
+    selected = set()
+    for pos, node in enumerate(nodes):
+        for other in rand.sample(range(count - 1), k):
+            other += other >= pos  # skip the node itself
+            pair = (min(pos, other), max(pos, other))
+            if pair not in selected:
+                selected.add(pair)
+                yield [nodes[pair[0]], nodes[pair[1]]]
+
+
+def switch(nodes, topology):
+    """One pair of nodes per leaf switch of the network topology.
+
+    :param topology: path to a SLURM ``topology.conf`` file, where
+    leaf switches are described with ``SwitchName=<name> Nodes=<nodes>``
+    """
+    nodes = set(nodes)
+    for _, switch_nodes in read_topology(topology):
+        members = sorted(node for node in switch_nodes if node in nodes)
+        if len(members) >= 2:
+            yield members[:2]
+
+
+def read_topology(path):
+    """Parse leaf switches of a SLURM ``topology.conf`` file
+
+    :return: list of tuple (switch name, list of nodes)
+    """
+    switches = []
+    with open(path) as istr:
+        for line in istr:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            fields = dict(
+                field.split('=', 1) for field in re.split(r'\s+', line) if '=' in field
+            )
+            if 'SwitchName' in fields and 'Nodes' in fields:
+                switches.append((fields['SwitchName'], list(NodeSet(fields['Nodes']))))
+    return switches
+
+
+def tournament(nodes):
+    """Every pair of nodes, grouped in rounds of disjoint pairs
+    with the circle method of round-robin tournaments:
+    n - 1 rounds of n / 2 pairs, or n rounds when n is odd.
+
+    :return: generator of list of pairs
+    """
+    # with an odd number of nodes, the node paired with None sits out
+    ring = list(nodes) + ([None] if len(nodes) % 2 else [])
+    count = len(ring)
+    for _ in range(count - 1):
+        pairs = []
+        for pos in range(count // 2):
+            first, second = ring[pos], ring[count - 1 - pos]
+            if first is not None and second is not None:
+                pairs.append(sorted([first, second]))
+        if pairs:
+            yield pairs
+        # keep the first node in place and rotate the others
+        ring = [ring[0], ring[-1]] + ring[1:-1]
+
+
+ROUNDS_WINDOW = 32
+
+
+def disjoint_rounds(pairs, window=ROUNDS_WINDOW):
+    """Greedily group pairs in rounds where no node appears twice
+
+    :param window: maximum number of rounds being filled, the oldest
+    one is yielded when a pair does not fit in any of them.
+    None to keep every round until all pairs are grouped.
+    :return: generator of list of pairs
+    """
+    rounds = collections.deque()
+    for pair in pairs:
+        for round_nodes, round_pairs in rounds:
+            if not round_nodes.intersection(pair):
+                break
+        else:
+            if len(rounds) == window:
+                yield rounds.popleft()[1]
+            round_nodes, round_pairs = set(), []
+            rounds.append((round_nodes, round_pairs))
+        round_nodes.update(pair)
+        round_pairs.append(pair)
+    for _, round_pairs in rounds:
+        yield round_pairs
+
+
+STRATEGIES = dict(
+    tag=all_pairs,
+    ring=ring,
+    hypercube=hypercube,
+    random=random_k,
+    covering=covering,
+    switch=switch,
+)
+
+
+def parse(value, valid=None):
+    """Check a ``node_pairing`` benchmark attribute
+
+    :param value: either the name of a strategy, or a dictionary
+    with a single key, the strategy, whose value provides the
+    parameters of the strategy, for instance ``{random: {k: 3, seed: 0}}``
+    :param valid: names of the accepted strategies,
+    default are the keys of ``STRATEGIES``
+    :return: tuple (strategy, parameters)
+    :raise ValueError: if the value is not valid
+    """
+    valid = valid or STRATEGIES
+    if hasattr(value, 'items'):
+        if len(value) != 1:
+            raise ValueError(
+                'Unexpected node_pairing value: {} '
+                'expected a dictionary with one key'.format(value)
+            )
+        strategy, options = list(value.items())[0]
+        options = dict(options or {})
+    else:
+        strategy, options = value, dict()
+    if strategy not in valid:
+        msg = 'Unexpected {0} value: got "{1}" but valid values are {2}'
+        raise ValueError(msg.format('node_pairing', strategy, sorted(valid)))
+    return strategy, options
+
+
+def node_pairs(nodes, strategy, **options):
+    """Iterator of node pairs selected by a strategy
+
+    :param nodes: list of nodes
+    :param strategy: key of ``STRATEGIES``
+    :param options: parameters of the strategy
+    """
+    return STRATEGIES[strategy](sorted(nodes), **options)
+
+
+def rounds(nodes, strategy, **options):
+    """Iterator of rounds of disjoint node pairs selected by a strategy.
+    Pairs of a round can be tested concurrently.
+
+    :param nodes: list of nodes
+    :param strategy: key of ``STRATEGIES``
+    :param options: parameters of the strategy
+    :return: generator of list of pairs
+    """
+    if strategy == 'tag':
+        return tournament(sorted(nodes))
+    return disjoint_rounds(node_pairs(nodes, strategy, **options))
@@ -1,2 +1,2 @@
-from .cluster import SlurmCluster  # noqa
+from .cluster import SlurmCache, SlurmCluster  # noqa
 from .job import Job  # noqa
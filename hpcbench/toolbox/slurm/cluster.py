@@ -1,9 +1,13 @@
 import collections
 import datetime
 import csv
+import json
 import logging
+import os
+import os.path as osp
 import re
 import subprocess
+import time
 
 from cached_property import cached_property
 from ClusterShell.NodeSet import NodeSet
@@ -18,6 +22,67 @@ SINFO_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
 SINFO_ENV = dict(SINFO_TIME_FORMAT=SINFO_TIME_FORMAT)
 
 
+class SlurmCache(object):
+    """Cache of the cluster information reported by ``sinfo``,
+    optionally persisted in a JSON file so that it can be shared
+    by several processes.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        """
+        :param path: JSON file, None to keep the cache in memory
+        :param ttl: number of seconds during which an entry is valid,
+        0 to disable the cache
+        """
+        self.path = path
+        self.ttl = ttl
+        self._entries = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = dict()
+            if self.path is not None and osp.exists(self.path):
+                try:
+                    with open(self.path) as istr:
+                        self._entries = json.load(istr)
+                except ValueError:
+                    logging.warning('Ignoring invalid SLURM cache %s', self.path)
+        return self._entries
+
+    def get(self, key, func):
+        """Get an entry, computed with ``func`` if missing or expired"""
+        if not self.ttl:
+            return func()
+        entry = self.entries.get(key)
+        if entry is not None and 0 <= time.time() - entry['date'] < self.ttl:
+            return entry['value']
+        value = func()
+        self.entries[key] = dict(date=time.time(), value=value)
+        self._dump()
+        return value
+
+    def save(self, path):
+        """Persist the cache in the given file, if not empty"""
+        self.path = path
+        if self.entries:
+            self._dump()
+
+    def invalidate(self):
+        """Remove all entries, and the file if any"""
+        self._entries = dict()
+        if self.path is not None and osp.exists(self.path):
+            os.remove(self.path)
+
+    def _dump(self):
+        if self.path is None:
+            return
+        tmp_file = self.path + '.%d.tmp' % os.getpid()
+        with open(tmp_file, 'w') as ostr:
+            json.dump(self.entries, ostr)
+        os.rename(tmp_file, self.path)
+
+
 class Reservation(collections.namedtuple('Reservation', RESERVATION_FIELDS)):
     @property
     def active(self):
@@ -37,8 +102,13 @@ class Reservation(collections.namedtuple('Reservation', RESERVATION_FIELDS)):
 
 
 class SlurmCluster:
-    def __init__(self, partitions=None):
-        self.partitions = partitions or self.__class__.discover_partitions()
+    def __init__(self, partitions=None, cache=None):
+        """
+        :param partitions: nodes of every partition, discovered
+        with ``sinfo`` if not specified
+        :param cache: optional ``SlurmCache``
+        """
+        self.partitions = partitions or self.__class__.discover_partitions(cache)
 
     @cached_property
     @listify()
@@ -48,31 +118,61 @@ class SlurmCluster:
                 yield node
 
     @classmethod
-    def reservation(cls, name):
+    def reservation(cls, name, cache=None):
         """get nodes of a given reservation"""
-        return cls.reservations()[name]
+        return cls.reservations(cache)[name]
 
     @classmethod
     @listify(wrapper=dict)
-    def reservations(self):
+    def reservations(cls, cache=None):
         """get nodes of every reservations"""
-        command = [SINFO, '--reservation']
-        output = subprocess.check_output(command, env=SINFO_ENV)
-        output = output.decode()
-        it = iter(output.splitlines())
-        next(it)
-        for line in it:
+        if cache is None:
+            lines = cls._sinfo_reservations()
+        else:
+            lines = cache.get('reservations', cls._sinfo_reservations)
+        for line in lines:
             rsv = Reservation.from_sinfo(line)
             yield rsv.name, rsv
 
     @classmethod
-    def discover_partitions(cls):
-        command = [SINFO, '--Node', '--format', '%all']
+    def _sinfo_reservations(cls):
+        command = [SINFO, '--reservation']
+        output = subprocess.check_output(command, env=SINFO_ENV)
+        return output.decode().splitlines()[1:]
+
+    @classmethod
+    def discover_partitions(cls, cache=None):
         try:
-            output = subprocess.check_output(command, env=SINFO_ENV)
+            if cache is None:
+                rows = cls._sinfo_nodes()
+            else:
+                rows = cache.get('nodes', cls._sinfo_nodes)
         except OSError:
             logging.exception('Could not extract cluster information')
             return dict()
+        if not rows:
+            return dict()
+
+        class Node(collections.namedtuple('Node', sorted(rows[0]))):
+            @property
+            def name(self):
+                return self.hostnames
+
+            def __str__(self):
+                return self.name
+
+        partitions = dict()
+        for row in rows:
+            partitions.setdefault(row['partition'], []).append(Node(**row))
+        return partitions
+
+    @classmethod
+    def _sinfo_nodes(cls):
+        """Parse the nodes table reported by ``sinfo``
+        :return: list of dict
+        """
+        command = [SINFO, '--Node', '--format', '%all']
+        output = subprocess.check_output(command, env=SINFO_ENV)
         reader = csv.DictReader(output.decode().splitlines(), delimiter='|')
         sanitizer_re = re.compile('[^0-9a-zA-Z]+')
 
@@ -95,16 +195,7 @@ class SlurmCluster:
         }
         float_fields = {'cpu_load'}
         reader.fieldnames = [sanitize(field) for field in reader.fieldnames]
-
-        class Node(collections.namedtuple('Node', set(reader.fieldnames))):
-            @property
-            def name(self):
-                return self.hostnames
-
-            def __str__(self):
-                return self.name
-
-        partitions = dict()
+        rows = []
         for row in reader:
             for key in row:
                 row[key] = row[key].strip()
@@ -120,5 +211,5 @@ class SlurmCluster:
                         row[key] = conv_type(row[key])
                     except ValueError:
                         pass
-            partitions.setdefault(row['partition'], []).append(Node(**row))
-        return partitions
+            rows.append(row)
+        return rows
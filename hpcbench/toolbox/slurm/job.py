@@ -10,6 +10,37 @@ from ..process import find_executable
 
 SACCT_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
 SACCT = find_executable('sacct', required=False)
+SACCT_FIELDS = 'JobID,Node,NCPUs,ExitCode,Start,End'
+SACCT_UNFINISHED_END = {'Unknown', ''}
+
+
+def sacct(jobids, fields=SACCT_FIELDS):
+    """Query SLURM accounting about several jobs with a single command
+
+    :param jobids: list of job identifiers
+    :param fields: comma separated list of fields to report
+    :return: generator of list of fields, one per job
+    """
+    environ = dict(os.environ)
+    # Override any system-specific time format setting
+    environ['SLURM_TIME_FORMAT'] = SACCT_DATE_FORMAT
+    output = subprocess.check_output(
+        [
+            SACCT,
+            '-n',
+            '-X',
+            '-P',
+            '-o',
+            fields,
+            '-j',
+            ','.join(str(jobid) for jobid in jobids),
+        ],
+        env=environ,
+    ).decode()
+    for line in output.splitlines():
+        line = line.strip()
+        if line:
+            yield line.split('|')
 
 
 class Job(
@@ -17,43 +48,82 @@ class Job(
 ):
     @classmethod
     def fromid(cls, jobid):
-        environ = dict(os.environ)
-        # Override any system-specific time format setting
-        environ['SLURM_TIME_FORMAT'] = SACCT_DATE_FORMAT
-        output = subprocess.check_output(
-            [
-                SACCT,
-                '-n',
-                '-X',
-                '-P',
-                '-o',
-                "Node,NCPUs,ExitCode,Start,End",
-                '-j',
-                str(jobid),
-            ],
-            env=environ,
-        ).decode()
-        nodes, cpus, exit_code, start, end = output.strip().split('|', 5)
-        start = datetime.datetime.strptime(start, SACCT_DATE_FORMAT)
-        if end == 'Unknown':
-            end = datetime.datetime.now()
-        else:
-            end = datetime.datetime.strptime(end, SACCT_DATE_FORMAT)
+        jobid = str(jobid)
+        for fields in sacct([jobid]):
+            if fields[0] == jobid:
+                return cls._from_sacct(fields, now=datetime.datetime.now())
+        raise Exception('Unknown SLURM job: ' + jobid)
+
+    @classmethod
+    def finished(cls, jobid):
+        """Check whether a SLURM job is finished or not"""
+        return str(jobid) in cls.finished_jobs([jobid])
+
+    @classmethod
+    def finished_jobs(cls, jobids):
+        """Get the finished jobs among several ones,
+        with a single ``sacct`` command. A job array is finished
+        when all its tasks are.
+
+        :return: dict job identifier -> Job
+        """
+        jobids = [str(jobid) for jobid in jobids]
+        requested = set(jobids)
+        tasks = dict()
+        for fields in sacct(jobids):
+            # tasks of job array 42 are reported as 42_0, 42_[1-3%2], ...
+            jobid = fields[0].split('_', 1)[0]
+            if jobid in requested:
+                tasks.setdefault(jobid, []).append(fields)
+        jobs = dict()
+        for jobid, rows in tasks.items():
+            if all(fields[-1] not in SACCT_UNFINISHED_END for fields in rows):
+                jobs[jobid] = cls._from_tasks(jobid, rows)
+        return jobs
+
+    @classmethod
+    def _from_tasks(cls, jobid, rows):
+        """Build a job from the ``sacct`` rows of its tasks"""
+        tasks = [cls._from_sacct(fields) for fields in rows]
+        if len(tasks) == 1:
+            return tasks[0]._replace(id=jobid)
+        nodes = NodeSet()
+        for task in tasks:
+            nodes.update(task.nodes)
+        # tasks cancelled before starting have no dates
+        starts = [task.start for task in tasks if task.start is not None]
+        ends = [task.end for task in tasks if task.end is not None]
+        return cls(
+            id=jobid,
+            nodes=nodes,
+            cpus=sum(task.cpus for task in tasks),
+            exit_code=max(task.exit_code for task in tasks),
+            start=min(starts) if starts else None,
+            end=max(ends) if ends else None,
+        )
+
+    @classmethod
+    def _from_sacct(cls, fields, now=None):
+        """Build a job from the output of ``sacct``
+        :param now: end date of the job if not finished yet
+        """
+        jobid, nodes, cpus, exit_code, start, end = fields
         exit_code = exit_code.split(':')[0]
+        if nodes.startswith('None'):  # "None assigned" if the job never started
+            nodes = ''
         return cls(
-            id=str(jobid),
+            id=jobid,
             nodes=NodeSet(nodes),
             cpus=int(cpus),
             exit_code=int(exit_code),
-            start=start,
-            end=end,
+            start=_parse_date(start),
+            end=_parse_date(end) or now,
         )
 
-    @classmethod
-    def finished(cls, jobid):
-        """Check whether a SLURM job is finished or not"""
-        output = subprocess.check_output(
-            [SACCT, '-n', '-X', '-o', "end", '-j', str(jobid)]
-        )
-        end = output.strip().decode()
-        return end not in {'Unknown', ''}
+
+def _parse_date(date):
+    try:
+        return datetime.datetime.strptime(date, SACCT_DATE_FORMAT)
+    except ValueError:
+        # Unknown or None, when the job is not started or finished
+        return None
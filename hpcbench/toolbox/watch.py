@@ -0,0 +1,125 @@
+"""Wait for file modifications
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import time
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+
+def _load_libc():
+    name = ctypes.util.find_library('c')
+    if name is None:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+_LIBC = _load_libc()
+
+
+class FileWatcher(object):
+    """Wait for the modifications of a file
+
+    inotify is used when available, otherwise the size and
+    modification time of the file are polled. Note that inotify
+    does not report modifications made by other hosts on network
+    file-systems, so callers should not wait without a timeout.
+    """
+
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, path, poll_interval=None, inotify=True):
+        """
+        :param path: file to watch, that must exist
+        :param poll_interval: delay between two checks when
+        inotify is not available
+        :param inotify: False to always poll the file
+        """
+        self.path = path
+        self.poll_interval = poll_interval or self.POLL_INTERVAL
+        self._signature = self._stat()
+        self._fd = None
+        if inotify and _LIBC is not None:
+            self._fd = self._inotify_watch(path)
+
+    @property
+    def inotify(self):
+        """True if inotify is used to watch the file"""
+        return self._fd is not None
+
+    @classmethod
+    def _inotify_watch(cls, path):
+        fd = _LIBC.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if fd < 0:
+            return None
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE
+        if _LIBC.inotify_add_watch(fd, path.encode('utf-8'), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def wait(self, timeout):
+        """Block until the file is modified or the timeout expires
+
+        :param timeout: maximum duration of the wait, in seconds
+        :return: True if a modification has been detected
+        """
+        if self._fd is not None:
+            ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+            if ready:
+                self._drain()
+                return True
+            return False
+        deadline = time.time() + timeout
+        while True:
+            signature = self._stat()
+            if signature != self._signature:
+                self._signature = signature
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def _drain(self):
+        """Consume pending inotify events"""
+        while True:
+            try:
+                if not os.read(self._fd, 4096):
+                    return
+            except OSError as exc:
+                if exc.errno == errno.EAGAIN:
+                    return
+                raise
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
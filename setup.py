@@ -67,8 +67,13 @@ setup(
         ben-csv = hpcbench.cli.bencsv:main
         ben-doc = hpcbench.cli.bendoc:main
         ben-elastic = hpcbench.cli.benelastic:main
+        ben-export = hpcbench.cli.benexport:main
+        ben-index = hpcbench.cli.benindex:main
+        ben-ingest = hpcbench.cli.beningest:main
         ben-merge = hpcbench.cli.benmerge:main
         ben-nett = hpcbench.cli.bennett:main
+        ben-openmetrics = hpcbench.cli.benopenmetrics:main
+        ben-npz = hpcbench.cli.bennpz:main
         ben-wait = hpcbench.cli.benwait:main
         ben-sh = hpcbench.cli.bensh:main
         ben-tpl = hpcbench.cli.bentpl:main
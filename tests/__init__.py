@@ -69,6 +69,25 @@ class DriverTestCase(object):
         shutil.rmtree(cls.TEST_DIR)
 
 
+class CampaignTestCase(object):
+    """Execute a fresh campaign in a temporary directory before every test"""
+
+    CAMPAIGN_FILE = 'fake_campaign.yaml'
+
+    @classmethod
+    def campaign_file(cls):
+        return osp.join(osp.dirname(__file__), cls.CAMPAIGN_FILE)
+
+    def setUp(self):
+        self.temp_dir = DriverTestCase.mkdtemp()
+        with pushd(self.temp_dir):
+            driver = bensh.main(self.campaign_file())
+        self.campaign_path = osp.join(self.temp_dir, driver.campaign_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
 class NullExtractor(MetricsExtractor):
     @property
     def metrics(self):
@@ -17,31 +17,83 @@ class TestImb(AbstractBenchmarkTest, unittest.TestCase):
             min_lat_bytes=1,
             minb_lat=0.20,
             minb_lat_bytes=1,
-            raw=[
-                dict(bytes=1, latency=0.20, bandwidth=4.89),
-                dict(bytes=2, latency=0.21, bandwidth=9.66),
-                dict(bytes=4, latency=0.21, bandwidth=19.04),
-                dict(bytes=8, latency=0.24, bandwidth=33.06),
-                dict(bytes=16, latency=0.22, bandwidth=74.40),
-                dict(bytes=32, latency=0.22, bandwidth=147.82),
-                dict(bytes=64, latency=0.23, bandwidth=283.16),
-                dict(bytes=128, latency=0.28, bandwidth=453.82),
-                dict(bytes=256, latency=0.28, bandwidth=924.05),
-                dict(bytes=512, latency=0.34, bandwidth=1497.03),
-                dict(bytes=1024, latency=0.43, bandwidth=2376.19),
-                dict(bytes=2048, latency=0.57, bandwidth=3574.67),
-                dict(bytes=4096, latency=1.12, bandwidth=3672.09),
-                dict(bytes=8192, latency=2.54, bandwidth=3229.0),
-                dict(bytes=16384, latency=3.34, bandwidth=4901.71),
-                dict(bytes=32768, latency=5.83, bandwidth=5623.53),
-                dict(bytes=65536, latency=8.85, bandwidth=7401.94),
-                dict(bytes=131072, latency=16.83, bandwidth=7790.19),
-                dict(bytes=262144, latency=33.17, bandwidth=7904.11),
-                dict(bytes=524288, latency=62.83, bandwidth=8344.45),
-                dict(bytes=1048576, latency=183.61, bandwidth=5710.82),
-                dict(bytes=2097152, latency=409.45, bandwidth=5121.82),
-                dict(bytes=4194304, latency=797.81, bandwidth=5257.28),
-            ],
+            raw=dict(
+                bandwidth=[
+                    4.89,
+                    9.66,
+                    19.04,
+                    33.06,
+                    74.4,
+                    147.82,
+                    283.16,
+                    453.82,
+                    924.05,
+                    1497.03,
+                    2376.19,
+                    3574.67,
+                    3672.09,
+                    3229.0,
+                    4901.71,
+                    5623.53,
+                    7401.94,
+                    7790.19,
+                    7904.11,
+                    8344.45,
+                    5710.82,
+                    5121.82,
+                    5257.28,
+                ],
+                bytes=[
+                    1,
+                    2,
+                    4,
+                    8,
+                    16,
+                    32,
+                    64,
+                    128,
+                    256,
+                    512,
+                    1024,
+                    2048,
+                    4096,
+                    8192,
+                    16384,
+                    32768,
+                    65536,
+                    131072,
+                    262144,
+                    524288,
+                    1048576,
+                    2097152,
+                    4194304,
+                ],
+                latency=[
+                    0.2,
+                    0.21,
+                    0.21,
+                    0.24,
+                    0.22,
+                    0.22,
+                    0.23,
+                    0.28,
+                    0.28,
+                    0.34,
+                    0.43,
+                    0.57,
+                    1.12,
+                    2.54,
+                    3.34,
+                    5.83,
+                    8.85,
+                    16.83,
+                    33.17,
+                    62.83,
+                    183.61,
+                    409.45,
+                    797.81,
+                ],
+            ),
         ),
         IMB.ALL_TO_ALL: dict(
             max_bw=3685.14,
@@ -55,47 +55,32 @@ class TestOSU(AbstractBenchmarkTest, unittest.TestCase):
             max_bw_bytes=4194304,
             maxb_bw=11952.24,
             maxb_bw_bytes=4194304,
-            raw=[
-                {'bandwidth': 11923.92, 'bytes': 2097152},
-                {'bandwidth': 11952.24, 'bytes': 4194304},
-            ],
+            raw=dict(bandwidth=[11923.92, 11952.24], bytes=[2097152, 4194304]),
         ),
         OSU.OSU_LAT: dict(
             min_lat=3.68,
             min_lat_bytes=16,
             minb_lat=3.68,
             minb_lat_bytes=16,
-            raw=[
-                {'bytes': 16, 'latency': 3.68},
-                {'bytes': 32, 'latency': 3.85},
-                {'bytes': 64, 'latency': 3.84},
-            ],
+            raw=dict(bytes=[16, 32, 64], latency=[3.68, 3.85, 3.84]),
         ),
         OSU.OSU_ALLTOALLV: dict(
             min_lat=1.31,
             min_lat_bytes=128,
             minb_lat=8.64,
             minb_lat_bytes=64,
-            raw=[
-                {'bytes': 64, 'latency': 8.64},
-                {'bytes': 128, 'latency': 1.31},
-                {'bytes': 256, 'latency': 1.58},
-                {'bytes': 512, 'latency': 1.71},
-                {'bytes': 1024, 'latency': 1.98},
-            ],
+            raw=dict(
+                bytes=[64, 128, 256, 512, 1024], latency=[8.64, 1.31, 1.58, 1.71, 1.98]
+            ),
         ),
         OSU.OSU_ALLGATHERV: dict(
             min_lat=1.64,
             min_lat_bytes=64,
             minb_lat=1.64,
             minb_lat_bytes=64,
-            raw=[
-                {'bytes': 64, 'latency': 1.64},
-                {'bytes': 128, 'latency': 6.18},
-                {'bytes': 256, 'latency': 1.84},
-                {'bytes': 512, 'latency': 2.37},
-                {'bytes': 1024, 'latency': 3.06},
-            ],
+            raw=dict(
+                bytes=[64, 128, 256, 512, 1024], latency=[1.64, 6.18, 1.84, 2.37, 3.06]
+            ),
         ),
         OSU.OSU_MBW_MR: dict(
             max_bw=4306.41,
@@ -104,13 +89,11 @@ class TestOSU(AbstractBenchmarkTest, unittest.TestCase):
             maxb_bw=4306.41,
             maxb_mr=4205474.79,
             maxb_bw_bytes=1024,
-            raw=[
-                {'bytes': 64, 'bandwidth': 489.18, 'msg_rate': 7643378.59},
-                {'bytes': 128, 'bandwidth': 998.25, 'msg_rate': 7798822.08},
-                {'bytes': 256, 'bandwidth': 1912.59, 'msg_rate': 7471067.52},
-                {'bytes': 512, 'bandwidth': 3080.21, 'msg_rate': 6016034.42},
-                {'bytes': 1024, 'bandwidth': 4306.41, 'msg_rate': 4205474.79},
-            ],
+            raw=dict(
+                bandwidth=[489.18, 998.25, 1912.59, 3080.21, 4306.41],
+                bytes=[64, 128, 256, 512, 1024],
+                msg_rate=[7643378.59, 7798822.08, 7471067.52, 6016034.42, 4205474.79],
+            ),
         ),
     }
 
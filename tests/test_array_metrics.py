@@ -0,0 +1,124 @@
+import csv
+import glob
+import os.path as osp
+import unittest
+
+from cached_property import cached_property
+
+from hpcbench.api import ArrayMetric, Benchmark, Metrics
+from hpcbench.campaign import ArrayMetrics, from_file, get_metrics, ReportNode
+from hpcbench.cli import bencsv
+from hpcbench.driver.benchmark import MetricsDriver
+from hpcbench.export.es import ESExporter
+from . import CampaignTestCase, FakeBenchmark, FakeExtractor
+
+
+class ArrayExtractor(FakeExtractor):
+    SERIES = dict(size=[1, 2, 4], time=[0.5, 0.75, 1.25])
+
+    @cached_property
+    def metrics(self):
+        metrics = dict(super(ArrayExtractor, self).metrics)
+        metrics.update(series=ArrayMetric(dict(size=Metrics.Byte, time=Metrics.Second)))
+        return metrics
+
+    def extract_metrics(self, metas):
+        metrics = super(ArrayExtractor, self).extract_metrics(metas)
+        metrics.update(series=dict(ArrayExtractor.SERIES))
+        return metrics
+
+
+class ArrayBenchmark(FakeBenchmark, Benchmark):
+    name = 'fake_array'
+
+    @property
+    def metrics_extractors(self):
+        return dict(main=ArrayExtractor())
+
+
+class TestArrayMetricCheck(unittest.TestCase):
+    SCHEMA = dict(series=ArrayMetric(dict(size=Metrics.Byte, time=Metrics.Second)))
+
+    def check(self, value):
+        MetricsDriver._check_metrics(self.SCHEMA, dict(series=value))
+
+    def test_valid(self):
+        self.check(dict(size=[1, 2], time=[1.0, 2.0]))
+        self.check(dict(size=[], time=[]))
+
+    def test_invalid(self):
+        with self.assertRaises(Exception):
+            self.check([dict(size=1, time=1.0)])
+        with self.assertRaises(Exception):
+            self.check(dict(size=[1, 2]))
+        with self.assertRaises(Exception):
+            self.check(dict(size=[1, 2], time=[1.0]))
+        with self.assertRaises(Exception):
+            self.check(dict(size=[1, 2], time=[1.0, 'foo']))
+
+
+class TestESArrayMetric(unittest.TestCase):
+    def test_nested_documents(self):
+        measurement = dict(
+            performance=1.0, stats=dict(series=dict(size=[1, 2], time=[0.5, 1.0]))
+        )
+        self.assertEqual(
+            ESExporter._nest_arrays(measurement, {'stats.series'}),
+            dict(
+                performance=1.0,
+                stats=dict(series=[dict(size=1, time=0.5), dict(size=2, time=1.0)]),
+            ),
+        )
+        # only declared array metrics are converted
+        self.assertEqual(ESExporter._nest_arrays(measurement, set()), measurement)
+
+
+class TestArrayMetricsNames(unittest.TestCase):
+    def test_names(self):
+        campaign = from_file(TestArraySidecar.campaign_file())
+        arrays = ArrayMetrics(campaign)
+        context = dict(tag='*', benchmark='bench-name', category='main')
+        names = arrays.names(context, dict(benchmark=ArrayBenchmark.name))
+        self.assertEqual(names, {'series'})
+        # unknown benchmarks do not declare any array
+        context = dict(tag='*', benchmark='unknown', category='main')
+        self.assertEqual(arrays.names(context, dict(benchmark='unknown')), set())
+
+
+class TestArraySidecar(CampaignTestCase, unittest.TestCase):
+    CAMPAIGN_FILE = 'test_array_metrics.yaml'
+
+    def test_sidecar(self):
+        pattern = osp.join(self.campaign_path, '*', '*', '*', '*', '*', '*.npz')
+        self.assertEqual(len(glob.glob(pattern)), len(FakeBenchmark.INPUTS))
+        campaign = from_file(self.campaign_path)
+        runs = [
+            run
+            for _, runs in get_metrics(campaign, ReportNode(self.campaign_path))
+            for run in runs
+        ]
+        self.assertEqual(len(runs), len(FakeBenchmark.INPUTS))
+        for run in runs:
+            series = run['metrics'][0]['measurement']['series']
+            self.assertEqual(series, ArrayExtractor.SERIES)
+
+    def test_csv_long(self):
+        output = osp.join(self.temp_dir, 'output.csv')
+        bencsv.main(['--long', '-o', output, self.campaign_path])
+        with open(output) as istr:
+            rows = [
+                row
+                for row in csv.DictReader(istr)
+                if row['metrics.measurement.series.index']
+            ]
+        self.assertEqual(len(rows), 3 * len(FakeBenchmark.INPUTS))
+        self.assertEqual(
+            {
+                (
+                    row['metrics.measurement.series.size'],
+                    row['metrics.measurement.series.time'],
+                )
+                for row in rows
+            },
+            {('1', '0.5'), ('2', '0.75'), ('4', '1.25')},
+        )
@@ -1,67 +1,92 @@
-import datetime
+import json
+import operator
 import os
 import os.path as osp
 import shutil
+import socket
+import stat
+import subprocess
+import sys
+from textwrap import dedent
+import threading
+import time
 import unittest
 
 import mock
-import six
 import yaml
 
-from hpcbench.campaign import ReportNode, YAML_REPORT_FILE
-from hpcbench.cli.benwait import main as benwait, wait_for_completion
-from . import DriverTestCase
+from hpcbench.campaign import ProgressJournal, ReportNode, YAML_REPORT_FILE
+from hpcbench.cli import bensh
+from hpcbench.cli.benwait import (
+    main as benwait,
+    ProgressMonitor,
+    ReportStatus,
+    wait_for_completion,
+)
+from hpcbench.toolbox.contextlib_ext import pushd
+from hpcbench.toolbox.slurm import Job
+from . import DriverTestCase, FakeBenchmark
 
 
-class sacct:
-    """Helper class to create mock objets in unit-tests below"""
-
-    SACCT_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
-    JOB_SACCT_DESCRIPTION = "r1i5n[3,13-14,17]|288|42|" "%s|2018-06-12T10:08:10"
-
-    def __init__(self):
-        self._returned_values = []
-
-    def r(self, end=None):
-        """Append a sacct response to the Mock object
-        informing that the job is still running
-        """
-        if end:
-            assert isinstance(end, datetime.datetime)
-            end = end.strftime(sacct.SACCT_DATE_FORMAT)
-            status = self.JOB_SACCT_DESCRIPTION % end
-        else:
-            end = 'Unknown'
-            status = None
-        self._returned_values.append(end.encode())
-        if status:
-            self._returned_values.append(status.encode())
-        return self
-
-    def cd(self):
-        """Append a sacct response to the Mock object
-        informing that the job completed
-        """
-        return self.r(end=datetime.datetime.now())
+FAKE_SACCT = '''\
+import json
+import os.path as osp
+import sys
 
-    def mock(self):
-        """Build the mock object"""
-        return mock.patch("subprocess.check_output", side_effect=self._returned_values)
+state_file = osp.join(osp.dirname(__file__), 'state.json')
+with open(state_file) as istr:
+    state = json.load(istr)
+args = sys.argv[1:]
+jobids = args[args.index('-j') + 1].split(',')
+state['calls'].append(jobids)
+for jobid in jobids:
+    polls = state['polls'].get(jobid)
+    if polls is None:
+        continue
+    state['polls'][jobid] = polls - 1
+    end = 'Unknown' if polls > 0 else '2018-06-12T10:08:10'
+    print('|'.join([jobid, 'r1i5n[3,13-14,17]', '288', '42:0',
+                    '2018-06-12T10:00:00', end]))
+with open(state_file, 'w') as ostr:
+    json.dump(state, ostr)
+'''
 
 
 class TestBenWait(unittest.TestCase):
-    SACCT_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
-
     @classmethod
     def setUpClass(cls):
         cls.REPORT = ReportNode(cls._create_fake_campaign())
-        os.environ['SACCT'] = 'true'
 
     @classmethod
     def tearDownClass(cls):
-        os.environ.pop('SACCT')
         shutil.rmtree(cls.REPORT.path)
 
+    def setUp(self):
+        self.bin_dir = DriverTestCase.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.bin_dir)
+        path = osp.join(self.bin_dir, 'sacct')
+        with open(path, 'w') as ostr:
+            ostr.write('#!' + sys.executable + '\n' + dedent(FAKE_SACCT))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        patcher = mock.patch('hpcbench.toolbox.slurm.job.SACCT', path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sacct(self, **polls):
+        """Set number of polls after which jobs are reported finished
+        :return: list of job identifiers given to every sacct call
+        """
+        state_file = osp.join(self.bin_dir, 'state.json')
+        if polls:
+            with open(state_file, 'w') as ostr:
+                json.dump(dict(polls=polls, calls=[]), ostr)
+        else:
+            with open(state_file) as istr:
+                return json.load(istr)['calls']
+
     @classmethod
     def _create_fake_campaign(cls):
         campaign = DriverTestCase.mkdtemp()
@@ -76,33 +101,222 @@ class TestBenWait(unittest.TestCase):
 
     def test_all_completed(self):
         """both sbatch jobs terminated"""
-        with sacct().cd().cd().mock() as mock:
-            six.assertCountEqual(
-                self,
-                [job['id'] for job in wait_for_completion(self.REPORT)],
-                ["1", "2"],
-            )
-            self.assertEqual(mock.call_count, 4)
-
-    def test_wait_one(self):
-        """wait for a job once"""
-        scenarii = [
-            sacct().r().cd().cd().mock(),  # wait once for the first job
-            sacct().cd().r().cd().mock(),  # wait once for the second job
+        self.sacct(**{'1': 0, '2': 0})
+        jobs = wait_for_completion(self.REPORT)
+        self.assertEqual([job['id'] for job in jobs], ['1', '2'])
+        self.assertEqual(jobs[0]['exit_code'], 42)
+        self.assertEqual(jobs[0]['cpus'], 288)
+        self.assertEqual(self.sacct(), [['1', '2']])
+        self.sleep.assert_not_called()
+
+    def test_batched_polls(self):
+        """outstanding jobs are polled together with backoff"""
+        self.sacct(**{'1': 1, '2': 4})
+        jobs = wait_for_completion(self.REPORT, interval=3)
+        self.assertEqual([job['id'] for job in jobs], ['1', '2'])
+        self.assertEqual(self.sacct(), [['1', '2'], ['1', '2'], ['2'], ['2'], ['2']])
+        self.assertEqual(
+            [call[0][0] for call in self.sleep.call_args_list], [1, 2, 3, 3]
+        )
+
+    def test_unknown_job(self):
+        """job not in the accounting database yet"""
+        self.sacct(**{'1': 0})
+        self.assertFalse(Job.finished(2))
+        self.sacct(**{'1': 0, '2': 0})
+        self.assertTrue(Job.finished(2))
+
+    def test_sharded_jobs(self):
+        """tags sharded in separate jobs provide a list of job ids"""
+        campaign = DriverTestCase.mkdtemp()
+        self.addCleanup(shutil.rmtree, campaign)
+        with open(osp.join(campaign, YAML_REPORT_FILE), 'w') as ostr:
+            yaml.dump(dict(jobid=[3, 4]), ostr)
+        self.sacct(**{'3': 0, '4': 1})
+        jobs = wait_for_completion(ReportNode(campaign))
+        self.assertEqual([job['id'] for job in jobs], ['3', '4'])
+
+    def _create_sharded_campaign(self, shards):
+        """Create reports of a campaign whose tag is sharded in SLURM job 3,
+        the execution of the first shard succeeds, the others fail
+        :return: campaign directory
+        """
+        campaign = DriverTestCase.mkdtemp()
+        self.addCleanup(shutil.rmtree, campaign)
+        tag_dir = osp.join(campaign, 'sbatch', 'tag')
+        reports = [
+            (campaign, dict(children=['sbatch'])),
+            (osp.dirname(tag_dir), dict(children=['tag'])),
+            (tag_dir, dict(jobid=3, children=shards)),
         ]
-        for scenario in scenarii:
-            with scenario as mock:
-                resp = wait_for_completion(self.REPORT, interval=0.5)
-                six.assertCountEqual(self, [job['id'] for job in resp], ["1", "2"])
-                self.assertEqual(mock.call_count, 5)
+        for shard in shards:
+            path = osp.join(tag_dir, shard)
+            for child in ['node', 'tag', 'bench', 'category', 'run']:
+                reports.append((path, dict(children=[child])))
+                path = osp.join(path, child)
+            reports.append((path, dict(command_succeeded=shard == shards[0])))
+        for path, report in reports:
+            if not osp.isdir(path):
+                os.makedirs(path)
+            with open(osp.join(path, YAML_REPORT_FILE), 'w') as ostr:
+                yaml.dump(report, ostr)
+        return campaign
+
+    def test_sharded_status(self):
+        """every shard of a tag provides a campaign"""
+        shards = ['shard-0', 'shard-1']
+        campaign = self._create_sharded_campaign(shards)
+        tag_dir = osp.join(campaign, 'sbatch', 'tag')
+        status = ReportStatus(ReportNode(campaign), [dict(id='3')]).status
+        self.assertEqual(
+            [
+                (osp.relpath(benchmark['path'], tag_dir), benchmark['succeeded'])
+                for benchmark in status['benchmark']
+            ],
+            [
+                (osp.join(shard, 'node', 'tag', 'bench', 'category', 'run'), ok)
+                for shard, ok in zip(shards, [True, False])
+            ],
+        )
+        self.assertFalse(status['succeeded'])
+
+    def test_missed_events(self):
+        """status of SLURM campaigns is read from the reports"""
+        campaign = self._create_sharded_campaign(['shard-0', 'shard-1'])
+        journal = ProgressJournal.create(campaign)
+        journal.emit('campaign_started', campaign)
+        journal.emit('campaign_finished', campaign)
+        self.sacct(**{'3': 0})
+        status = benwait(['-s', campaign])
+        self.assertEqual(
+            [False, True],
+            sorted(benchmark['succeeded'] for benchmark in status['benchmark']),
+        )
+        self.assertFalse(status['succeeded'])
 
     def test_benwait_executable(self):
         """Test ben-wait entry-point"""
-        with sacct().r().cd().r().cd().mock() as mock:
-            status = benwait(["-n", "0.5", self.REPORT.path])
-        six.assertCountEqual(
-            self,
+        self.sacct(**{'1': 1, '2': 1})
+        status = benwait(["-n", "0.5", self.REPORT.path])
+        self.assertEqual(
             [(job['id'], job['exit_code']) for job in status['sbatch']],
             [("1", 42), ("2", 42)],
         )
-        self.assertEqual(mock.call_count, 6)
+        self.assertEqual(len(self.sacct()), 2)
+
+
+class TestProgressJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = DriverTestCase.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def test_campaign_events(self):
+        with pushd(self.temp_dir):
+            campaign_path = bensh.main(
+                osp.splitext(__file__)[0] + '.yaml'
+            ).campaign_path
+        campaign_path = osp.join(self.temp_dir, campaign_path)
+        events, _ = ProgressJournal(campaign_path).read()
+        names = [event['event'] for event in events]
+        self.assertEqual(names[0], 'campaign_started')
+        self.assertEqual(names[-1], 'campaign_finished')
+        self.assertEqual(names.count('run_started'), len(FakeBenchmark.INPUTS))
+        self.assertEqual(names.count('execution_finished'), len(FakeBenchmark.INPUTS))
+
+        # status is built from the journal instead of the reports
+        collect = ReportNode.collect
+
+        def collect_jobids(report, *keys, **kwargs):
+            self.assertEqual(keys, ('jobid',))
+            return collect(report, *keys, **kwargs)
+
+        with mock.patch.object(
+            ReportNode, 'collect', autospec=True, side_effect=collect_jobids
+        ):
+            status = benwait(['-s', campaign_path])
+        expected = ReportStatus(ReportNode(campaign_path), []).status
+        key = operator.itemgetter('path')
+        self.assertEqual(
+            sorted(status['benchmark'], key=key),
+            sorted(expected['benchmark'], key=key),
+        )
+        self.assertTrue(status['succeeded'])
+
+    def test_malformed_events(self):
+        journal = ProgressJournal.create(self.temp_dir)
+        journal.emit('campaign_started', self.temp_dir)
+        with open(journal.file, 'a') as ostr:
+            ostr.write('{"date": "2018-06-12T10:0{"event": \n')
+        journal.emit('campaign_finished', self.temp_dir)
+        events, offset = journal.read()
+        self.assertEqual(
+            ['campaign_started', 'campaign_finished'],
+            [event['event'] for event in events],
+        )
+        self.assertEqual(offset, os.path.getsize(journal.file))
+
+    def test_running_campaign(self):
+        journal = ProgressJournal.create(self.temp_dir)
+        journal.emit('campaign_started', self.temp_dir)
+        sbatch = osp.join(self.temp_dir, 'sbatch', 'tag', 'campaign')
+        execution = osp.join(sbatch, 'node', 'tag', 'bench', 'category', 'id')
+        os.makedirs(execution)
+        statuses = []
+        monitor = ProgressMonitor(ReportNode(self.temp_dir), statuses.append)
+        self.addCleanup(monitor.close)
+
+        def run():
+            time.sleep(0.2)
+            journal.emit('campaign_started', sbatch)
+            journal.emit('execution_finished', execution, succeeded=False)
+            journal.emit('campaign_finished', sbatch)
+            time.sleep(0.2)
+            journal.emit('campaign_finished', self.temp_dir)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+        monitor.wait_campaign(interval=0.1)
+        self.assertTrue(monitor.finished)
+        self.assertEqual(len(statuses), 1)
+        self.assertEqual(
+            statuses[0],
+            dict(
+                node='node',
+                tag='tag',
+                benchmark='bench',
+                category='category',
+                attempt='id',
+                succeeded=False,
+                path=osp.join(
+                    self.temp_dir,
+                    'sbatch',
+                    'tag',
+                    'campaign',
+                    'node',
+                    'tag',
+                    'bench',
+                    'category',
+                    'id',
+                ),
+            ),
+        )
+
+    def test_driver_stopped(self):
+        driver = subprocess.Popen([sys.executable, '-c', 'pass'])
+        driver.wait()
+        journal = ProgressJournal.create(self.temp_dir)
+        journal.emit(
+            'campaign_started',
+            self.temp_dir,
+            host=socket.gethostname(),
+            pid=driver.pid,
+        )
+        monitor = ProgressMonitor(ReportNode(self.temp_dir))
+        self.addCleanup(monitor.close)
+        self.assertTrue(monitor.driver_alive())
+        monitor.update()
+        self.assertFalse(monitor.driver_alive())
+        self.assertFalse(monitor.wait_campaign(interval=3600))
+        status = benwait(['-s', self.temp_dir])
+        self.assertFalse(status['succeeded'])
@@ -4,6 +4,7 @@ import os.path as osp
 import shutil
 import unittest
 
+from hpcbench.campaign import get_metrics
 from hpcbench.cli import bencsv, bensh
 from hpcbench.export.csvexport import CSVExporter
 from hpcbench.toolbox.contextlib_ext import pushd
@@ -40,6 +41,59 @@ class TestCSV(unittest.TestCase):
                 metric_perf = {float(p[self.PERFORMANCE_METRIC]) for p in table}
                 self.assertEqual(metric_perf, set(FakeBenchmark.INPUTS))
 
+    def test_csv_prefetch(self):
+        with pushd(self.temp_dir):
+            bench = bensh.main(TestCSV.campaign_file())
+            exporter = bencsv.main(
+                ['--prefetch=2', '--output', self.OUTFILE, bench.campaign_path]
+            )
+            self.assertGreater(len(exporter.report._cache), 1)
+            with open(self.OUTFILE, 'r') as f:
+                table = [row for row in csv.DictReader(f)]
+                metric_perf = {float(p[self.PERFORMANCE_METRIC]) for p in table}
+                self.assertEqual(metric_perf, set(FakeBenchmark.INPUTS))
+
+    def test_csv_fields(self):
+        fields = ['benchmark', self.PERFORMANCE_METRIC]
+        with pushd(self.temp_dir):
+            bench = bensh.main(TestCSV.campaign_file())
+            bencsv.main(
+                ['--output', self.OUTFILE, '-f', ','.join(fields), bench.campaign_path]
+            )
+            with open(self.OUTFILE, 'r') as f:
+                reader = csv.DictReader(f)
+                self.assertEqual(reader.fieldnames, fields)
+                metric_perf = {float(p[self.PERFORMANCE_METRIC]) for p in reader}
+                self.assertEqual(metric_perf, set(FakeBenchmark.INPUTS))
+            with self.assertRaises(ValueError):
+                bencsv.main(
+                    ['--output', 'unknown.csv', '-f', 'unknown', bench.campaign_path]
+                )
+            self.assertFalse(osp.exists('unknown.csv'))
+            exporter = CSVExporter(bench.campaign_path, 'unknown.csv')
+            metrics = get_metrics(exporter.campaign, exporter.report)
+            with self.assertRaises(ValueError):
+                exporter.export(['unknown'], metrics=metrics)
+            self.assertFalse(osp.exists('unknown.csv'))
+
+    def test_csv_long(self):
+        with pushd(self.temp_dir):
+            bench = bensh.main(TestCSV.campaign_file())
+            bencsv.main(['--output', self.OUTFILE, '--long', bench.campaign_path])
+            with open(self.OUTFILE, 'r') as f:
+                reader = csv.DictReader(f)
+                self.assertNotIn(
+                    'metrics.0.measurement.pairs.0.first', reader.fieldnames
+                )
+                table = [row for row in reader]
+        pairs = [row for row in table if row['metrics.measurement.pairs.index']]
+        self.assertEqual(len(pairs), 2 * len(FakeBenchmark.INPUTS))
+        self.assertEqual(
+            {row['metrics.measurement.pairs.first'] for row in pairs}, {'1.5', '3.0'}
+        )
+        metric_perf = {float(p['metrics.measurement.performance']) for p in table}
+        self.assertEqual(metric_perf, set(FakeBenchmark.INPUTS))
+
     @classmethod
     def campaign_file(cls, suffix=""):
         return osp.splitext(inspect.getfile(cls))[0] + suffix + '.yaml'
@@ -9,19 +9,23 @@ import tempfile
 import unittest
 
 from cached_property import cached_property
+import mock
 import six
 import yaml
 
 from hpcbench.api import Benchmark
-from hpcbench.campaign import ReportNode
+from hpcbench.campaign import JSON_METRICS_FILE, ReportNode
 from hpcbench.cli import bendoc, benelastic, benumb
-from hpcbench.driver import CampaignDriver
+from hpcbench.driver import CampaignDriver, write_yaml_report
+from hpcbench.driver.base import Enumerator
 from hpcbench.driver.executor import SrunExecutionDriver, Command
 from hpcbench.driver.campaign import HostDriver, BenchmarkTagDriver
 from hpcbench.driver.benchmark import (
     BenchmarkDriver,
     BenchmarkCategoryDriver,
+    ExecutionSpool,
     FixedAttempts,
+    MetricsWriter,
 )
 from hpcbench.toolbox.contextlib_ext import capture_stdout, mkdtemp, pushd
 from . import BuildInfoBench, DriverTestCase, FakeBenchmark
@@ -91,6 +95,57 @@ class TestDriver(DriverTestCase, unittest.TestCase):
             exporter.remove_index()
 
 
+class TestReportJournal(unittest.TestCase):
+    def test_generator_report(self):
+        @write_yaml_report
+        def _children(count):
+            for i in range(count):
+                yield 'child-{}'.format(i)
+
+        with mkdtemp() as test_dir, pushd(test_dir):
+            report = _children(1000)
+            self.assertNotIn('children', report)
+            self.assertEqual(os.listdir('.'), ['hpcbench.yaml'])
+            with open('hpcbench.yaml') as istr:
+                data = yaml.safe_load(istr)
+            self.assertEqual(
+                data['children'], ['child-{}'.format(i) for i in range(1000)]
+            )
+            self.assertIn('elapsed', data)
+            _children(0)
+            with open('hpcbench.yaml') as istr:
+                self.assertEqual(yaml.safe_load(istr)['children'], [])
+
+    def test_add_child_to_report(self):
+        with mkdtemp() as test_dir, pushd(test_dir):
+            with open('hpcbench.yaml', 'w') as ostr:
+                yaml.dump(dict(children=['a'], jobid=42), ostr)
+            for i, child in enumerate(['b', 'c', 'd']):
+                Enumerator._add_child_to_report(child, first=i == 0)
+            with open('hpcbench.yaml') as istr:
+                data = yaml.safe_load(istr)
+            self.assertEqual(data, dict(children=['a', 'b', 'c', 'd'], jobid=42))
+
+    def test_linked_files_unchanged(self):
+        with mkdtemp() as test_dir, pushd(test_dir):
+            with open('hpcbench.yaml', 'w') as ostr:
+                yaml.dump(dict(children=['a']), ostr)
+            with open(JSON_METRICS_FILE, 'w') as ostr:
+                json.dump([], ostr)
+            os.link('hpcbench.yaml', 'linked.yaml')
+            os.link(JSON_METRICS_FILE, 'linked.json')
+            Enumerator._add_child_to_report('b')
+            os.mkdir('a')
+            with open(osp.join('a', 'hpcbench.yaml'), 'w') as ostr:
+                yaml.dump(dict(command_succeeded=True), ostr)
+            with MetricsWriter() as metrics:
+                metrics.append('a')
+            with open('linked.yaml') as istr:
+                self.assertEqual(yaml.safe_load(istr), dict(children=['a']))
+            with open('linked.json') as istr:
+                self.assertEqual(json.load(istr), [])
+
+
 class TestFakeBenchmark(AbstractBenchmarkTest, unittest.TestCase):
     exposed_benchmark = False
 
@@ -175,10 +230,55 @@ class TestHostDriver(unittest.TestCase):
                 ),
                 'main',
             )()
-            metas = bench.execution_matrix(None)[0]['metas']
+            with open(JSON_METRICS_FILE) as istr:
+                metas = json.load(istr)[0]['metas']
             build_info = metas.get('build_info')
             self.assertEqual(build_info, bench.build_info)
 
+    def test_execution_matrix_evaluated_once(self):
+        node = 'node01'
+        benchmark = mock.Mock()
+        benchmark.name = 'benchmark'
+        benchmark.execution_matrix.return_value = iter(
+            [
+                dict(category='foo', command=['foo', str(i)])
+                if i % 2
+                else dict(category='bar', command=['bar', str(i)])
+                for i in range(6)
+            ]
+        )
+        driver = BenchmarkDriver(
+            BenchmarkTagDriver(
+                HostDriver(
+                    CampaignDriver(TestHostDriver.CAMPAIGN_FILE, node=node), node
+                ),
+                '*',
+            ),
+            benchmark,
+            FakeBenchmark.DEFAULT_BENCHMARK_NAME,
+            dict(),
+        )
+        self.assertEqual(driver.children, {'foo', 'bar'})
+        for category in driver.children:
+            commands = [
+                cmd.execution['command'][0]
+                for cmd, _ in driver.child_builder(category).children
+            ]
+            self.assertEqual(commands, [category] * 3)
+        self.assertEqual(len(list(driver.execution_matrix)), 6)
+        self.assertEqual(benchmark.execution_matrix.call_count, 1)
+
+    def test_execution_spool(self):
+        rows = [dict(category='foo' if i % 2 else 'bar', value=i) for i in range(6)]
+        spool = ExecutionSpool(iter(rows))
+        self.assertEqual(list(spool), ['bar', 'foo'])
+        foo = spool.executions('foo')
+        self.assertEqual(next(foo), rows[1])
+        # concurrent readers of the same category
+        self.assertEqual(list(spool.executions('foo')), rows[1::2])
+        self.assertEqual(list(foo), rows[3::2])
+        self.assertEqual(list(spool.executions('unknown')), [])
+
     def slurm(self, **kwargs):
         node = kwargs.get('node', 'node01')
         tag = kwargs.get('tag', 'group_nodes')
@@ -275,3 +375,25 @@ class TestHostDriver(unittest.TestCase):
             self.network.nodes('*'), ['node{0:02}'.format(id_) for id_ in range(1, 11)]
         )
         self.assertEqual(self.network.nodes('unknown_group'), [])
+
+    def test_node_tags_method(self):
+        self.assertEqual(
+            self.network.node_tags('node01'),
+            {'*', 'n01', 'group_nodes', 'group_rectags', 'group_localhost'},
+        )
+        self.assertEqual(
+            self.network.node_tags('node10'),
+            {'*', 'n10', 'group_match', 'group_rectags', 'group_localhost'},
+        )
+        self.assertIs(
+            self.network.node_tags('node01'), self.network.node_tags('node01')
+        )
+
+    def test_node_index_method(self):
+        self.assertEqual(self.network.node_index('group_nodes', 'node03'), 2)
+        self.assertEqual(self.network.node_index('*', 'node10'), 9)
+        with self.assertRaises(ValueError):
+            self.network.node_index('group_nodes', 'node04')
+        self.assertEqual(
+            self.network.node_pairs('group_nodes', 'node02'), [['node02', 'node03']]
+        )
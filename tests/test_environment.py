@@ -52,7 +52,9 @@ class EnvBenchmark(Benchmark):
     name = "environment"
 
     def __init__(self):
-        super(EnvBenchmark, self).__init__(attributes=dict(environment={}, modules=[]))
+        super(EnvBenchmark, self).__init__(
+            attributes=dict(environment={}, modules=[], executions=1)
+        )
 
     @property
     def metric_required(self):
@@ -70,14 +72,20 @@ class EnvBenchmark(Benchmark):
     def modules(self):
         return self.attributes['modules']
 
+    @property
+    def executions(self):
+        """number of executions of the benchmark"""
+        return self.attributes['executions']
+
     def execution_matrix(self, context):
-        yield dict(
-            category='ut',
-            command=['true'],
-            environment=self.environment,
-            modules=self.modules,
-            metas=dict(foo='foo'),
-        )
+        for _ in range(self.executions):
+            yield dict(
+                category='ut',
+                command=['true'],
+                environment=self.environment,
+                modules=self.modules,
+                metas=dict(foo='foo'),
+            )
 
     def pre_execute(self, execution, context):
         del context  # unused
@@ -152,7 +160,7 @@ class TestEnvironment(DriverTestCase, unittest.TestCase):
     def test(self):
         report = ReportNode(self.CAMPAIGN_PATH)
         keys = ('modules', 'environment', 'metas')
-        expected_tests = 14
+        expected_tests = 16
         tests = 0
         for path, env in report.collect(*keys, with_path=True):
             context = report.path_context(path)
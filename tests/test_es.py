@@ -0,0 +1,226 @@
+import gzip
+import json
+import os.path as osp
+import shutil
+import threading
+import unittest
+
+import mock
+from six.moves import BaseHTTPServer
+from six.moves.urllib.parse import unquote
+
+from hpcbench.cli import benelastic, beningest
+from hpcbench.export import ESBulkLoader, ESExporter
+from . import CampaignTestCase, FakeBenchmark
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Minimal emulation of the Elasticsearch REST API"""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, data=None):
+        body = json.dumps(data or {}).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode('utf-8')
+
+    @property
+    def index(self):
+        return unquote(self.path.split('?')[0].strip('/'))
+
+    @staticmethod
+    def assertUpsert(doc):
+        assert doc['doc_as_upsert'] is True
+
+    def do_HEAD(self):
+        if self.index in self.server.indices:
+            self._reply(200)
+        elif self.path == '/':
+            self._reply(200)
+        else:
+            self._reply(404)
+
+    def do_PUT(self):
+        self.server.indices[self.index] = json.loads(self._body())
+        self._reply(200, dict(acknowledged=True, index=self.index))
+
+    def do_POST(self):
+        lines = self._body().splitlines()
+        items, errors = [], False
+        with self.server.lock:
+            self.server.bulk_requests += 1
+            for action, doc in zip(lines[::2], lines[1::2]):
+                ((op_type, action),) = json.loads(action).items()
+                doc = json.loads(doc)
+                if op_type == 'update':
+                    self.assertUpsert(doc)
+                    doc = doc['doc']
+                self.server.operations.append(op_type)
+                status = self.server.status(action['_id'])
+                if status < 300:
+                    self.server.documents[action['_id']] = doc
+                else:
+                    errors = True
+                items.append({op_type: dict(_id=action['_id'], status=status)})
+        self._reply(200, dict(errors=errors, items=items))
+
+
+class StandInServer(BaseHTTPServer.HTTPServer):
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.lock = threading.Lock()
+        self.indices = dict()
+        self.documents = dict()
+        self.attempts = dict()
+        self.bulk_requests = 0
+        self.operations = []
+        self.failures = dict()
+
+    def status(self, doc_id):
+        """Status of a document push, consume configured failures"""
+        self.attempts[doc_id] = self.attempts.get(doc_id, 0) + 1
+        statuses = self.failures.get(doc_id)
+        if statuses:
+            return statuses.pop(0)
+        return 201
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server_address
+
+
+@mock.patch.object(ESExporter, 'INITIAL_BACKOFF', 0.01)
+@mock.patch.object(ESExporter, 'CHUNK_SIZE', 2)
+class TestESExporter(CampaignTestCase, unittest.TestCase):
+    def setUp(self):
+        super(TestESExporter, self).setUp()
+        self.server = StandInServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(TestESExporter, self).tearDown()
+
+    def exporter(self):
+        return ESExporter(self.campaign_path, self.server.url, workers=2)
+
+    def test_export(self):
+        exporter = self.exporter()
+        doc_ids = [exporter.document_id(doc) for _, doc in exporter._documents]
+        self.server.failures[doc_ids[0]] = [429, 503]
+        self.exporter().export()
+        self.assertEqual(len(self.server.documents), len(FakeBenchmark.INPUTS))
+        perfs = {
+            doc['measurement']['performance'] for doc in self.server.documents.values()
+        }
+        self.assertEqual(perfs, set(FakeBenchmark.INPUTS))
+        # only the failed document is sent again
+        self.assertEqual(self.server.attempts[doc_ids[0]], 3)
+        for doc_id in doc_ids[1:]:
+            self.assertEqual(self.server.attempts[doc_id], 1)
+        mapping = self.server.indices[exporter.index_name]['mappings']
+        measurement = mapping[ESExporter.ES_DOC_TYPE]['properties']['measurement']
+        self.assertEqual(measurement['properties']['performance'], dict(type='float'))
+        self.assertEqual(measurement['properties']['pairs']['type'], 'nested')
+
+    def test_permanent_failure(self):
+        exporter = self.exporter()
+        doc_id = exporter.document_id(next(iter(exporter._documents))[1])
+        self.server.failures[doc_id] = [400]
+        with self.assertRaises(Exception) as exc:
+            exporter.export()
+        self.assertEqual(str(exc.exception), 'Could not push 1 documents')
+        self.assertEqual(self.server.attempts[doc_id], 1)
+        self.assertEqual(len(self.server.documents), len(FakeBenchmark.INPUTS) - 1)
+
+    def test_document_id(self):
+        ids = [
+            self.exporter().document_id(doc) for _, doc in self.exporter()._documents
+        ]
+        self.assertEqual(len(set(ids)), len(FakeBenchmark.INPUTS))
+        self.assertEqual(
+            ids,
+            [self.exporter().document_id(doc) for _, doc in self.exporter()._documents],
+        )
+        self.assertTrue(all(len(doc_id) == 40 for doc_id in ids))
+
+    def test_incremental(self):
+        exporter = self.exporter()
+        exporter.export()
+        self.assertEqual(self.server.operations, ['index'] * len(FakeBenchmark.INPUTS))
+        with open(exporter.checkpoint_file) as istr:
+            checkpoint = json.load(istr)
+        ((category, count),) = checkpoint[exporter.index_name].items()
+        self.assertEqual(count, len(FakeBenchmark.INPUTS))
+
+        # nothing new to export
+        del self.server.operations[:]
+        ESExporter(self.campaign_path, self.server.url, incremental=True).export()
+        self.assertEqual(self.server.operations, [])
+
+        # pretend last run was added after previous export
+        checkpoint[exporter.index_name][category] = count - 1
+        with open(exporter.checkpoint_file, 'w') as ostr:
+            json.dump(checkpoint, ostr)
+        ESExporter(self.campaign_path, self.server.url, incremental=True).export()
+        self.assertEqual(self.server.operations, ['update'])
+        self.assertEqual(len(self.server.documents), len(FakeBenchmark.INPUTS))
+        with open(exporter.checkpoint_file) as istr:
+            self.assertEqual(json.load(istr), {exporter.index_name: {category: count}})
+
+        # without incremental mode, index must not exist
+        with self.assertRaises(Exception):
+            self.exporter().export()
+
+    def test_incremental_after_dump(self):
+        dump_dir = osp.join(self.temp_dir, 'bulk')
+        ESExporter(self.campaign_path, self.server.url, incremental=True).dump(dump_dir)
+        ESExporter(self.campaign_path, self.server.url, incremental=True).export()
+        self.assertEqual(self.server.operations, ['update'] * len(FakeBenchmark.INPUTS))
+        # nothing new to dump
+        ESExporter(self.campaign_path, self.server.url, incremental=True).dump(dump_dir)
+        with open(osp.join(dump_dir, ESBulkLoader.MANIFEST_FILE)) as istr:
+            self.assertEqual(json.load(istr)['documents'], 0)
+
+    def test_dump_and_ingest(self):
+        exporter = self.exporter()
+        dump_dir = osp.join(self.temp_dir, 'bulk')
+        benelastic.main(['-o', dump_dir, '--file-size=1', self.campaign_path])
+        with open(osp.join(dump_dir, ESBulkLoader.MANIFEST_FILE)) as istr:
+            manifest = json.load(istr)
+        self.assertEqual(manifest['index'], exporter.index_name)
+        self.assertEqual(manifest['documents'], len(FakeBenchmark.INPUTS))
+        # one document per file because of the tiny file size
+        self.assertEqual(len(manifest['files']), len(FakeBenchmark.INPUTS))
+        with gzip.open(osp.join(dump_dir, manifest['files'][0]), 'rb') as istr:
+            self.assertEqual(len(istr.read().splitlines()), 2)
+        self.assertEqual(self.server.bulk_requests, 0)
+        # dumped runs are not considered exported to Elasticsearch
+        self.assertFalse(osp.exists(exporter.checkpoint_file))
+        self.assertTrue(osp.exists(exporter.dump_checkpoint_file))
+
+        # bulk files are loaded without the campaign
+        shutil.rmtree(self.campaign_path)
+        beningest.main(['--es', self.server.url, '-j', '2', dump_dir])
+        self.assertEqual(self.server.operations, ['index'] * len(FakeBenchmark.INPUTS))
+        perfs = {
+            doc['measurement']['performance'] for doc in self.server.documents.values()
+        }
+        self.assertEqual(perfs, set(FakeBenchmark.INPUTS))
+        self.assertEqual(
+            self.server.indices[exporter.index_name]['mappings'], manifest['mappings'],
+        )
+        with self.assertRaises(Exception):
+            beningest.main(['--es', self.server.url, dump_dir])
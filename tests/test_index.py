@@ -0,0 +1,124 @@
+import os
+import os.path as osp
+import unittest
+
+import mock
+
+from hpcbench.campaign import (
+    CampaignIndex,
+    from_file,
+    get_metrics,
+    ReportNode,
+    SQLITE_INDEX_FILE,
+)
+from hpcbench.cli import benindex
+from hpcbench.toolbox.collections_ext import LRUCache
+from . import CampaignTestCase, FakeBenchmark
+
+
+class TestCampaignIndex(CampaignTestCase, unittest.TestCase):
+
+    KEYS = ['benchmark', 'category', 'command_succeeded']
+
+    def collect(self, index=None):
+        report = ReportNode(self.campaign_path, index=index)
+        return sorted(
+            (osp.relpath(path, self.campaign_path), values)
+            for path, values in report.collect(*self.KEYS, with_path=True)
+        )
+
+    def test_index_created(self):
+        self.assertTrue(osp.isfile(osp.join(self.campaign_path, SQLITE_INDEX_FILE)))
+        self.assertIsNotNone(ReportNode(self.campaign_path).index)
+
+    def test_collect(self):
+        expected = self.collect(index=False)
+        self.assertEqual(len(expected), len(FakeBenchmark.INPUTS))
+        self.assertEqual(self.collect(), expected)
+
+    def test_tree_order(self):
+        def _walk(index):
+            report = ReportNode(self.campaign_path, index=index)
+            return (
+                list(report.collect(*self.KEYS, with_path=True)),
+                list(report.metrics_paths()),
+            )
+
+        self.assertEqual(_walk(None), _walk(False))
+
+    def test_find(self):
+        index = CampaignIndex.find(osp.join(self.campaign_path, 'foo', 'bar'))
+        self.assertEqual(index.root, osp.realpath(self.campaign_path))
+
+    def test_rebuild(self):
+        expected = self.collect(index=False)
+        os.remove(osp.join(self.campaign_path, SQLITE_INDEX_FILE))
+        self.assertIsNone(ReportNode(self.campaign_path).index)
+        index = benindex.main([self.campaign_path])
+        self.assertIsInstance(index, CampaignIndex)
+        self.assertEqual(self.collect(), expected)
+
+    def test_get_metrics(self):
+        campaign = from_file(osp.join(self.campaign_path, 'campaign.yaml'))
+
+        def _metrics(index):
+            report = ReportNode(self.campaign_path, index=index)
+            return list(get_metrics(campaign, report))
+
+        metrics = _metrics(None)
+        self.assertEqual(metrics, _metrics(False))
+        perfs = set()
+        for context, runs in metrics:
+            self.assertEqual(context.benchmark, 'bench-name')
+            for run in runs:
+                perfs.add(run['metrics'][0]['measurement']['performance'])
+        self.assertEqual(perfs, set(FakeBenchmark.INPUTS))
+
+    def test_prefetch(self):
+        expected = self.collect(index=False)
+        report = ReportNode(self.campaign_path, index=False)
+        self.assertIs(report.prefetch(concurrency=4), report)
+        self.assertEqual(len(report._cache), len(list(report.map(id, with_path=True))))
+        with mock.patch.object(ReportNode, 'PREFETCH_PROCESS_MIN_REPORTS', 1):
+            report = ReportNode(self.campaign_path, index=False)
+            report.prefetch(concurrency=4, processes=2)
+        self.assertEqual(
+            sorted(
+                (osp.relpath(path, self.campaign_path), values)
+                for path, values in report.collect(*self.KEYS, with_path=True)
+            ),
+            expected,
+        )
+
+    def test_prefetch_larger_than_cache(self):
+        expected = self.collect(index=False)
+        cache = LRUCache(maxsize=4)
+        report = ReportNode(self.campaign_path, index=False, cache=cache)
+        report.prefetch(concurrency=4)
+        # the top of the tree is loaded, the cache is not enlarged
+        self.assertEqual(cache.maxsize, 4)
+        self.assertIn(report.path, cache)
+        self.assertLessEqual(len(cache), 4)
+        self.assertGreater(len(cache), 1)
+        self.assertEqual(
+            sorted(
+                (osp.relpath(path, self.campaign_path), values)
+                for path, values in report.collect(*self.KEYS, with_path=True)
+            ),
+            expected,
+        )
+        self.assertLessEqual(len(cache), 4)
+
+    def test_bounded_cache(self):
+        expected = self.collect(index=False)
+        cache = LRUCache(maxsize=2)
+        report = ReportNode(self.campaign_path, index=False, cache=cache)
+        self.assertFalse(hasattr(report, '__dict__'))
+        self.assertEqual(
+            sorted(
+                (osp.relpath(path, self.campaign_path), values)
+                for path, values in report.collect(*self.KEYS, with_path=True)
+            ),
+            expected,
+        )
+        self.assertEqual(len(cache), 2)
@@ -1,12 +1,22 @@
 import inspect
+import os
 import os.path as osp
 import shutil
 import unittest
 
-from hpcbench.campaign import merge_campaigns
+import mock
+
+from hpcbench.campaign import (
+    CampaignMerge,
+    from_file,
+    get_metrics,
+    merge_campaigns,
+    ReportNode,
+    YAML_REPORT_FILE,
+)
 from hpcbench.cli import benmerge, bensh
 from hpcbench.toolbox.contextlib_ext import pushd
-from . import DriverTestCase
+from . import DriverTestCase, FakeBenchmark
 
 
 class TestMerge(unittest.TestCase):
@@ -39,6 +49,91 @@ class TestMerge(unittest.TestCase):
                 ]
             )
 
+    def run_campaigns(self, *argvs):
+        """Execute campaigns in distinct directories
+        :return: path to the campaign directories
+        """
+        paths = []
+        for i, argv in enumerate(argvs):
+            with pushd(osp.join(self.temp_dir, str(i)), mkdir=True):
+                path = bensh.main(argv + [TestMerge.campaign_file()]).campaign_path
+                paths.append(osp.abspath(path))
+        return paths
+
+    def test_kway_links(self):
+        paths = self.run_campaigns(['-n', 'foo'], ['-n', 'bar'], ['-n', 'baz'])
+        with pushd(self.temp_dir):
+            reads = []
+            reader = CampaignMerge._reader_yaml
+
+            def read_yaml(path):
+                reads.append(path)
+                return reader(path)
+
+            with mock.patch.object(CampaignMerge, '_reader_yaml', read_yaml):
+                merge_campaigns(*paths, jobs=2)
+        # every input data file is read once, only the root
+        # reports are merged as nodes are different
+        self.assertEqual(len(reads), len(set(reads)))
+        self.assertEqual(
+            {osp.relpath(path, osp.dirname(osp.dirname(path))) for path in reads}
+            - {
+                osp.join(osp.basename(path), 'campaign.expanded.yaml') for path in paths
+            },
+            {osp.join(osp.basename(path), YAML_REPORT_FILE) for path in paths},
+        )
+        report = ReportNode(paths[0])
+        self.assertIsNotNone(report.index)
+        self.assertEqual(report['children'], ['foo', 'bar', 'baz'])
+        runs = [
+            run for _, runs in get_metrics(from_file(paths[0]), report) for run in runs
+        ]
+        self.assertEqual(len(runs), 3 * len(FakeBenchmark.INPUTS))
+        # runs of the other campaigns are hard-linked
+        linked = 0
+        for node, path in zip(['bar', 'baz'], paths[1:]):
+            for dirpath, _, files in os.walk(osp.join(path, node)):
+                for src in [osp.join(dirpath, file_) for file_ in files]:
+                    dest = osp.join(paths[0], osp.relpath(src, path))
+                    if osp.islink(src):
+                        self.assertEqual(os.readlink(src), os.readlink(dest))
+                    else:
+                        self.assertEqual(os.stat(src).st_ino, os.stat(dest).st_ino)
+                        linked += 1
+        self.assertGreater(linked, 0)
+        self.assertEqual(
+            len(list(report.collect('command_succeeded'))),
+            3 * len(FakeBenchmark.INPUTS),
+        )
+
+        # merging again in the output campaign leaves linked files unchanged
+        contents = dict()
+        for dirpath, _, files in os.walk(paths[1]):
+            for file_ in files:
+                with open(osp.join(dirpath, file_), 'rb') as istr:
+                    contents[osp.join(dirpath, file_)] = istr.read()
+        with pushd(osp.join(self.temp_dir, 'again'), mkdir=True):
+            path = bensh.main(['-n', 'bar', TestMerge.campaign_file()]).campaign_path
+            merge_campaigns(paths[0], path)
+        for file_, content in contents.items():
+            with open(file_, 'rb') as istr:
+                self.assertEqual(istr.read(), content)
+
+    def test_same_host_inputs_unchanged(self):
+        paths = self.run_campaigns([], [], [])
+        report = osp.join(paths[1], YAML_REPORT_FILE)
+        with open(report) as istr:
+            content = istr.read()
+        benmerge.main(['--copy'] + paths)
+        with open(report) as istr:
+            self.assertEqual(istr.read(), content)
+        runs = [
+            run
+            for _, runs in get_metrics(from_file(paths[0]), ReportNode(paths[0]))
+            for run in runs
+        ]
+        self.assertEqual(len(runs), 3 * len(FakeBenchmark.INPUTS))
+
     @classmethod
     def campaign_file(cls, suffix=""):
         return osp.splitext(inspect.getfile(cls))[0] + suffix + '.yaml'
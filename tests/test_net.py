@@ -1,31 +1,57 @@
 import os
 import os.path as osp
+import shutil
+import stat
+import subprocess
+import sys
+from textwrap import dedent
 import unittest
 
+import mock
+import yaml
+
 from hpcbench.cli import bennett
-from hpcbench.net import CampaignHolder
+from hpcbench.net import BeNet, BeNetHost
 from hpcbench.toolbox.contextlib_ext import mkdtemp, pushd
+from . import DriverTestCase
+
 
+FAKE_SSH = '''\
+import subprocess
+import sys
 
-def custom_ssh(self, *args):
-    # get rid of node
-    return list(args[1:])
+args = sys.argv[1:]
+while args[0].startswith('-'):
+    if args.pop(0) in ('-F', '-l', '-i', '-p'):
+        args.pop(0)
+if args.pop(0) == 'unreachable':
+    sys.exit(255)
+sys.exit(subprocess.call(' '.join(args), shell=True))
+'''
 
+FAKE_SCP = '''\
+import shutil
+import sys
 
-def custom_scp(self, *args):
-    src, dest = args
-    if ':' in src:
-        src = src.split(':', 1)[1]
-    elif ':' in dest:
-        dest = dest.split(':', 1)[1]
-    if src != dest:
-        return ['cp', src, dest]
-    else:
-        return ['true']
+args = [arg for arg in sys.argv[1:] if not arg.startswith('-')]
+src, dest = [arg.split(':', 1)[-1] for arg in args[-2:]]
+if '-r' in sys.argv:
+    shutil.copytree(src, dest)
+elif src != dest:
+    shutil.copy(src, dest)
+'''
 
 
-CampaignHolder.ssh = custom_ssh
-CampaignHolder.scp = custom_scp
+FAKE_VIRTUALENV = '''\
+#!/bin/sh -e
+echo "$1" >> "$(dirname "$0")/virtualenv.calls"
+sleep 0.2
+mkdir -p "$1/bin"
+for script in pip ben-sh; do
+    printf '#!/bin/sh\\n' > "$1/bin/$script"
+    chmod +x "$1/bin/$script"
+done
+'''
 
 
 class TestNet(unittest.TestCase):
@@ -33,6 +59,23 @@ class TestNet(unittest.TestCase):
     def get_campaign_file():
         return osp.splitext(__file__)[0] + '.yaml'
 
+    def setUp(self):
+        self.bin_dir = DriverTestCase.mkdtemp()
+        self.patchers = []
+        for name, code in [('SSH', FAKE_SSH), ('SCP', FAKE_SCP)]:
+            path = osp.join(self.bin_dir, name.lower())
+            with open(path, 'w') as ostr:
+                ostr.write('#!' + sys.executable + '\n' + dedent(code))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+            patcher = mock.patch('hpcbench.net.' + name, path)
+            patcher.start()
+            self.patchers.append(patcher)
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.bin_dir)
+
     @unittest.skipIf(
         'TRAVIS_TAG' in os.environ, 'version to deploy is not available on PyPi yet'
     )
@@ -40,3 +83,171 @@ class TestNet(unittest.TestCase):
         with mkdtemp() as temp_dir:
             with pushd(temp_dir):
                 bennett.main(TestNet.get_campaign_file())
+
+    def test_unreachable_nodes(self):
+        with mkdtemp() as temp_dir:
+            with pushd(temp_dir):
+                benet = BeNet(TestNet.get_campaign_file())
+                with self.assertRaises(RuntimeError) as exc:
+                    benet.run('localhost', 'unreachable')
+        self.assertEqual(str(exc.exception), 'Could not reach some nodes: unreachable')
+
+    def make_results(self):
+        """Create results of a remote ben-sh execution
+        :return: directory given to ben-sh
+        """
+        results_dir = osp.join(self.bin_dir, 'remote')
+        node_dir = osp.join(results_dir, 'host', 'bench')
+        os.makedirs(node_dir)
+        for path in ['hpcbench.yaml', osp.join('bench', 'metrics.json')]:
+            with open(osp.join(results_dir, 'host', path), 'w') as ostr:
+                ostr.write(path)
+        os.symlink('metrics.json', osp.join(node_dir, 'latest'))
+        return results_dir
+
+    def test_retrieve_results(self):
+        results_dir = self.make_results()
+        campaign = BeNet(TestNet.get_campaign_file()).campaign
+        with mkdtemp() as temp_dir:
+            with pushd(temp_dir):
+                for compression in ['gzip', 'xz', 'none']:
+                    host = BeNetHost(campaign, 'localhost')
+                    host.retrieve_results(results_dir, compression, 2)
+                    with open(osp.join('localhost', 'bench', 'metrics.json')) as istr:
+                        self.assertEqual(istr.read(), 'bench/metrics.json')
+                    self.assertEqual(
+                        os.readlink(osp.join('localhost', 'bench', 'latest')),
+                        'metrics.json',
+                    )
+                    self.assertEqual(os.listdir('.'), ['localhost'])
+                    shutil.rmtree('localhost')
+
+                # missing files are detected
+                with self.assertRaises(Exception) as exc:
+                    BeNetHost(campaign, 'localhost').retrieve_results(
+                        results_dir, 'gzip', 3
+                    )
+                self.assertEqual(
+                    str(exc.exception), 'received 2 files out of 3 expected'
+                )
+                self.assertEqual(os.listdir('.'), [])
+
+    def test_retrieve_nodes_results(self):
+        results_dir = self.make_results()
+        with mkdtemp() as temp_dir:
+            with pushd(temp_dir):
+                benet = BeNet(TestNet.get_campaign_file())
+                with mock.patch.object(
+                    BeNet, 'remote_results_dir', new_callable=mock.PropertyMock
+                ) as remote_results_dir:
+                    remote_results_dir.return_value = results_dir
+                    benet._retrieve_results(['localhost', 'unreachable'])
+                self.assertEqual(os.listdir('.'), ['localhost'])
+        self.assertEqual(list(benet.failures), ['unreachable'])
+
+    def test_failure_isolated(self):
+        def execute(command, nodes, **kwargs):
+            outputs = kwargs.get('outputs')
+            if outputs is not None:
+                outputs.update((node, '1') for node in nodes)
+            return nodes
+
+        with mkdtemp() as temp_dir:
+            with pushd(temp_dir):
+                benet = BeNet(TestNet.get_campaign_file())
+                with mock.patch.object(
+                    BeNet, '_execute', side_effect=execute
+                ), mock.patch.object(
+                    BeNet, '_deploy_wheelhouse', side_effect=lambda nodes: nodes
+                ):
+                    with self.assertRaises(Exception) as exc:
+                        benet.run('localhost', 'node1')
+        # results could not be retrieved, the error is reported per node
+        self.assertEqual(
+            str(exc.exception), 'Benchmarks failed on nodes: localhost,node1'
+        )
+        self.assertEqual(set(benet.failures), {'localhost', 'node1'})
+
+    def test_remote_env_key(self):
+        def env_key(**network):
+            network.update(nodes=['localhost'])
+            campaign_file = osp.join(self.bin_dir, 'campaign.yaml')
+            with open(campaign_file, 'w') as ostr:
+                yaml.dump(dict(network=network), ostr)
+            return BeNet(campaign_file).remote_env_key
+
+        key = env_key()
+        self.assertEqual(key, env_key(pip_plugins=[]))
+        self.assertNotEqual(key, env_key(pip_installer_url='hpcbench==0.1'))
+        self.assertNotEqual(key, env_key(pip_plugins=['plugin-a']))
+        self.assertEqual(
+            env_key(pip_plugins=['plugin-a', 'plugin-b']),
+            env_key(pip_plugins=['plugin-b', 'plugin-a']),
+        )
+        with mock.patch('hpcbench.__version__', '0.0.1.dev42'):
+            self.assertNotEqual(key, env_key())
+
+    def test_deploy_wheelhouse(self):
+        def build_wheelhouse():
+            wheelhouse = DriverTestCase.mkdtemp()
+            open(osp.join(wheelhouse, 'hpcbench-0.1-py2.py3-none-any.whl'), 'w').close()
+            return wheelhouse
+
+        benet = BeNet(TestNet.get_campaign_file())
+        wheel = osp.join(
+            benet.remote_wheelhouse_dir, 'hpcbench-0.1-py2.py3-none-any.whl'
+        )
+        self.addCleanup(shutil.rmtree, benet.remote_work_dir, True)
+        with mock.patch.object(
+            BeNet, '_build_wheelhouse', side_effect=build_wheelhouse
+        ) as build:
+            self.assertEqual(benet._deploy_wheelhouse(['localhost']), ['localhost'])
+            self.assertTrue(osp.exists(wheel))
+            self.assertEqual(build.call_count, 1)
+
+            # the environment is available, nothing is pushed
+            shutil.rmtree(benet.remote_wheelhouse_dir)
+            os.makedirs(benet.remote_env_dir)
+            open(osp.join(benet.remote_env_dir, BeNet.ENV_COMPLETE_FILE), 'w').close()
+            self.assertEqual(benet._deploy_wheelhouse(['localhost']), ['localhost'])
+            self.assertFalse(osp.exists(wheel))
+            self.assertEqual(build.call_count, 1)
+
+    @unittest.skipIf(
+        osp.exists('/usr/local/bin/virtualenv'), 'installer would use virtualenv'
+    )
+    def test_shared_environment(self):
+        """nodes sharing the work directory build the environment once"""
+        benet = BeNet(TestNet.get_campaign_file())
+        self.addCleanup(shutil.rmtree, benet.remote_work_dir, True)
+        virtualenv = osp.join(self.bin_dir, 'virtualenv')
+        with open(virtualenv, 'w') as ostr:
+            ostr.write(FAKE_VIRTUALENV)
+        os.chmod(virtualenv, os.stat(virtualenv).st_mode | stat.S_IEXEC)
+        installer = osp.join(self.bin_dir, 'installer.sh')
+        with mock.patch.object(BeNet, 'REMOTE_BENCH_RUNNER', installer):
+            benet._build_installer()
+        env = dict(os.environ, PATH=self.bin_dir + os.pathsep + os.environ['PATH'])
+        with open(os.devnull, 'w') as devnull:
+            installers = [
+                subprocess.Popen(
+                    ['sh', installer, 'campaign.yaml'], env=env, stdout=devnull
+                )
+                for _ in range(3)
+            ]
+            self.assertEqual([0] * 3, [installer.wait() for installer in installers])
+        with open(osp.join(self.bin_dir, 'virtualenv.calls')) as istr:
+            self.assertEqual([benet.remote_env_dir + '\n'], istr.readlines())
+
+    def test_wheelhouse_failure(self):
+        benet = BeNet(TestNet.get_campaign_file())
+        self.addCleanup(shutil.rmtree, benet.remote_work_dir, True)
+        error = subprocess.CalledProcessError(1, 'pip')
+        with mock.patch('hpcbench.net.subprocess.check_call', side_effect=error):
+            wheelhouse = DriverTestCase.mkdtemp()
+            with mock.patch('hpcbench.net.tempfile.mkdtemp', return_value=wheelhouse):
+                self.assertIsNone(benet._build_wheelhouse())
+            self.assertFalse(osp.exists(wheelhouse))
+            # nodes install the packages from the package index
+            self.assertEqual(benet._deploy_wheelhouse(['localhost']), ['localhost'])
+        self.assertFalse(osp.exists(benet.remote_wheelhouse_dir))
@@ -0,0 +1,40 @@
+import os.path as osp
+import unittest
+
+import numpy as np
+
+from hpcbench.cli import bennpz
+from hpcbench.export.npz import load
+from . import CampaignTestCase, FakeBenchmark
+
+
+class TestNPZ(CampaignTestCase, unittest.TestCase):
+
+    GROUP = 'bench-name/main'
+
+    def check_table(self, tables):
+        self.assertEqual(list(tables), [self.GROUP])
+        table = tables[self.GROUP]
+        perfs = table['measurement.performance']
+        self.assertEqual(perfs.dtype, np.float64)
+        self.assertEqual(set(perfs), set(FakeBenchmark.INPUTS))
+        self.assertEqual(table['exit_status'].dtype, np.int64)
+        self.assertEqual(table['date'].dtype, np.dtype('datetime64[us]'))
+        self.assertEqual(set(table['context.executor']), {'local'})
+        self.assertEqual(len(table['node']), len(FakeBenchmark.INPUTS))
+
+    def test_npz(self):
+        output = osp.join(self.temp_dir, 'metrics.npz')
+        bennpz.main(['-o', output, self.campaign_path])
+        self.check_table(load(output))
+        tables = load(output, decode=False)
+        table = tables[self.GROUP]
+        self.assertEqual(table['node'].dtype, np.int32)
+        self.assertEqual(list(table['node']), [0] * len(FakeBenchmark.INPUTS))
+        self.assertEqual(len(table['node.values']), 1)
+
+    def test_npy_directory(self):
+        output = osp.join(self.temp_dir, 'metrics')
+        bennpz.main(['-o', output, self.campaign_path])
+        self.assertTrue(osp.isfile(osp.join(output, self.GROUP, 'date.npy')))
+        self.check_table(load(output))
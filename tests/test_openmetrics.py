@@ -0,0 +1,116 @@
+import glob
+import json
+import os
+import os.path as osp
+import threading
+import time
+import unittest
+
+import mock
+
+from hpcbench.campaign import JSON_METRICS_FILE, ProgressJournal, YAML_REPORT_FILE
+from hpcbench.cli import benopenmetrics
+from hpcbench.export import OpenMetricsExporter
+from . import CampaignTestCase, FakeBenchmark
+
+
+class TestOpenMetrics(CampaignTestCase, unittest.TestCase):
+    def setUp(self):
+        super(TestOpenMetrics, self).setUp()
+        self.output = osp.join(self.temp_dir, 'hpcbench.prom')
+
+    def samples(self, family):
+        with open(self.output) as istr:
+            return [line for line in istr if line.startswith(family + '{')]
+
+    def test_export(self):
+        benopenmetrics.main(['-o', self.output, self.campaign_path])
+        with open(self.output) as istr:
+            lines = istr.read().splitlines()
+        self.assertEqual(lines[-1], '# EOF')
+        self.assertIn('# UNIT hpcbench_performance_m m', lines)
+        self.assertIn('# TYPE hpcbench_run_elapsed_seconds gauge', lines)
+        perfs = self.samples('hpcbench_performance_m')
+        self.assertEqual(len(perfs), len(FakeBenchmark.INPUTS))
+        self.assertEqual(
+            {float(line.rsplit(' ', 1)[1]) for line in perfs}, set(FakeBenchmark.INPUTS)
+        )
+        self.assertIn('benchmark="bench-name",category="main"', perfs[0])
+        self.assertIn('meta_field="1.0",context_executor="local"', perfs[0])
+        # lists are not exported
+        self.assertFalse(any('pairs' in line for line in lines))
+        self.assertEqual(os.listdir(self.temp_dir).count('.hpcbench.prom.tmp'), 0)
+
+    def test_latest_run(self):
+        (metrics_file,) = glob.glob(
+            osp.join(self.campaign_path, '*', '*', '*', '*', JSON_METRICS_FILE)
+        )
+        exporter = OpenMetricsExporter(self.campaign_path, self.output)
+        self.assertTrue(exporter.export())
+        self.assertFalse(exporter.export())
+
+        # the metrics file is written again, runs being appended
+        with open(metrics_file) as istr:
+            runs = json.load(istr)
+        os.remove(metrics_file)
+        with open(metrics_file, 'w') as ostr:
+            ostr.write('[\n' + ',\n'.join(json.dumps(run) for run in runs))
+        self.assertFalse(exporter.export())
+        # a new run of the first metas, another one still being written
+        new_run = dict(runs[0])
+        new_run['metrics'] = [dict(measurement=dict(performance=42.0))]
+        failed_run = dict(runs[0], command_succeeded=False)
+        nested_run = dict(runs[0], metas=dict(build_info=dict(cc='gcc')))
+        with open(metrics_file, 'a') as ostr:
+            ostr.write(',\n' + json.dumps(new_run) + ',\n' + json.dumps(failed_run))
+            ostr.write(',\n' + json.dumps(nested_run)[:-1])
+        self.assertTrue(exporter.export())
+        perfs = self.samples('hpcbench_performance_m')
+        self.assertEqual(len(perfs), len(FakeBenchmark.INPUTS))
+        self.assertEqual(
+            {float(line.rsplit(' ', 1)[1]) for line in perfs},
+            set(FakeBenchmark.INPUTS[1:]) | {42.0},
+        )
+        # only the new runs are read
+        with open(metrics_file, 'a') as ostr:
+            ostr.write('}\n]\n')
+        with mock.patch.object(
+            json.JSONDecoder,
+            'raw_decode',
+            side_effect=json.JSONDecoder.raw_decode,
+            autospec=True,
+        ) as raw_decode:
+            self.assertTrue(exporter.export())
+        self.assertEqual(raw_decode.call_count, 2)
+        perfs = self.samples('hpcbench_performance_m')
+        self.assertEqual(len(perfs), len(FakeBenchmark.INPUTS) + 1)
+        # nested metas are not labels
+        self.assertFalse(any('build_info' in line for line in perfs))
+
+    def test_watch(self):
+        # campaign is complete, so the file is written once
+        exporter = benopenmetrics.main(
+            ['-o', self.output, '--watch', '3600', self.campaign_path]
+        )
+        self.assertIsNotNone(exporter._content)
+        self.assertTrue(osp.exists(self.output))
+
+    def test_watch_running(self):
+        journal = ProgressJournal(self.campaign_path)
+        with open(journal.file) as istr:
+            events = istr.readlines()
+        self.assertIn('"campaign_finished"', events[-1])
+        # campaign is still running, but its report is already written
+        with open(journal.file, 'w') as ostr:
+            ostr.writelines(events[:-1])
+        self.assertTrue(osp.exists(osp.join(self.campaign_path, YAML_REPORT_FILE)))
+        exporter = OpenMetricsExporter(self.campaign_path, self.output)
+        watcher = threading.Thread(target=exporter.watch, args=(0.05,))
+        watcher.start()
+        self.addCleanup(watcher.join)
+        time.sleep(0.3)
+        self.assertTrue(watcher.is_alive())
+        self.assertTrue(osp.exists(self.output))
+        journal.emit('campaign_finished', self.campaign_path)
+        watcher.join(5)
+        self.assertFalse(watcher.is_alive())
@@ -0,0 +1,94 @@
+import json
+import os.path as osp
+import unittest
+
+import mock
+
+from hpcbench.campaign import get_metrics
+from hpcbench.cli import benexport
+from hpcbench.export import CSVExporter, ExportPipeline
+from hpcbench.export.npz import load
+from . import CampaignTestCase, FakeBenchmark
+
+
+class TestExportPipeline(CampaignTestCase, unittest.TestCase):
+    def test_single_traversal(self):
+        csv_file = osp.join(self.temp_dir, 'metrics.csv')
+        npz_file = osp.join(self.temp_dir, 'metrics.npz')
+        dump_dir = osp.join(self.temp_dir, 'bulk')
+        traversal = mock.Mock(side_effect=get_metrics)
+        with mock.patch('hpcbench.export.pipeline.get_metrics', traversal), mock.patch(
+            'hpcbench.export.csvexport.get_metrics', side_effect=AssertionError
+        ), mock.patch(
+            'hpcbench.export.npz.get_metrics', side_effect=AssertionError
+        ), mock.patch(
+            'hpcbench.export.es.get_metrics', side_effect=AssertionError
+        ):
+            benexport.main(
+                [
+                    '--csv',
+                    csv_file,
+                    '--npz',
+                    npz_file,
+                    '--es-dump',
+                    dump_dir,
+                    self.campaign_path,
+                ]
+            )
+        self.assertEqual(traversal.call_count, 1)
+
+        expected_csv = osp.join(self.temp_dir, 'expected.csv')
+        CSVExporter(self.campaign_path, expected_csv).export()
+        with open(csv_file) as istr, open(expected_csv) as expected:
+            self.assertEqual(istr.read(), expected.read())
+        perfs = load(npz_file)['bench-name/main']['measurement.performance']
+        self.assertEqual(set(perfs), set(FakeBenchmark.INPUTS))
+        with open(osp.join(dump_dir, 'index.json')) as istr:
+            self.assertEqual(json.load(istr)['documents'], len(FakeBenchmark.INPUTS))
+
+    def test_sink_failure(self):
+        records = []
+
+        def collect(metrics):
+            records.extend(metrics)
+
+        def fail(metrics):
+            raise Exception('no space left')
+
+        pipeline = ExportPipeline(self.campaign_path, queue_size=1)
+        pipeline.register(fail)
+        pipeline.register(collect)
+        with self.assertRaises(Exception) as exc:
+            pipeline.run()
+        self.assertEqual(
+            str(exc.exception), 'Export failed for sinks: fail (no space left)'
+        )
+        self.assertEqual(len(records), 1)
+        _, runs = records[0]
+        self.assertEqual(len(runs), len(FakeBenchmark.INPUTS))
+
+    def test_sink_isolation(self):
+        records = []
+
+        def mutate(metrics):
+            for _, runs in metrics:
+                for run in runs:
+                    run['metrics'][0]['measurement'].clear()
+
+        def collect(metrics):
+            records.extend(metrics)
+
+        pipeline = ExportPipeline(self.campaign_path, queue_size=1)
+        pipeline.register(mutate)
+        pipeline.register(collect)
+        pipeline.run()
+        perfs = set(
+            run['metrics'][0]['measurement']['performance']
+            for _, runs in records
+            for run in runs
+        )
+        self.assertEqual(perfs, set(FakeBenchmark.INPUTS))
+
+    def test_no_sink(self):
+        with self.assertRaises(SystemExit):
+            benexport.main([self.campaign_path])
@@ -0,0 +1,124 @@
+import json
+import os
+import os.path as osp
+import shutil
+import stat
+import sys
+import textwrap
+import unittest
+
+from hpcbench.api import Benchmark
+from . import DriverTestCase, NullExtractor
+
+
+class RoundsBenchmark(Benchmark):
+    """Benchmark testing all pairs of nodes. Executions of a round
+    wait for each other, so they fail unless they run concurrently.
+    """
+
+    name = 'rounds-ut'
+
+    BARRIER = '''\
+        import os
+        import sys
+        import time
+
+        barrier, count = sys.argv[1], int(sys.argv[2])
+        os.makedirs(barrier, exist_ok=True)
+        open(os.path.join(barrier, str(os.getpid())), 'w').close()
+        deadline = time.time() + 20
+        while len(os.listdir(barrier)) < count:
+            if time.time() > deadline:
+                sys.exit(1)
+            time.sleep(0.1)
+        '''
+
+    def __init__(self):
+        super(RoundsBenchmark, self).__init__(attributes=dict())
+
+    @property
+    def in_campaign_template(self):
+        return False
+
+    metric_required = False
+
+    def execution_matrix(self, context):
+        barrier = TestRounds.BARRIER_DIR
+        script = osp.join(barrier, 'barrier.py')
+        with open(script, 'w') as ostr:
+            ostr.write(textwrap.dedent(self.BARRIER))
+        for round_, pairs in enumerate(context.cluster.pair_rounds('tag')):
+            for pair in pairs:
+                yield dict(
+                    category='main',
+                    command=[
+                        sys.executable,
+                        script,
+                        osp.join(barrier, str(round_)),
+                        str(len(pairs)),
+                    ],
+                    srun_nodes=pair,
+                    round=round_,
+                )
+
+    @property
+    def metrics_extractors(self):
+        return NullExtractor()
+
+
+class TestRounds(DriverTestCase, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.SLURM_UT_DIR = cls.mkdtemp()
+        cls.BARRIER_DIR = cls.mkdtemp()
+        srun_ut = osp.join(cls.SLURM_UT_DIR, 'srun-ut')
+        with open(srun_ut, 'w') as ostr:
+            ostr.write(
+                textwrap.dedent(
+                    """\
+                #!/bin/bash -e
+                # skip options
+                while [[ "$1" == -* ]] ; do shift ; done
+                exec $@ >slurm-localhost-1.stdout 2>slurm-localhost-1.stderr
+                """
+                )
+            )
+        st = os.stat(srun_ut)
+        os.chmod(srun_ut, st.st_mode | stat.S_IEXEC)
+        os.environ['PATH'] = cls.SLURM_UT_DIR + os.pathsep + os.environ['PATH']
+        super(cls, cls).setUpClass()
+
+    def test_concurrent_rounds(self):
+        metrics_file = osp.join(
+            self.CAMPAIGN_PATH,
+            self.driver.node,
+            '*',
+            'bench-name',
+            'main',
+            'metrics.json',
+        )
+        with open(metrics_file) as istr:
+            runs = json.load(istr)
+        self.assertEqual(6, len(runs))
+        self.assertTrue(all(run['command_succeeded'] for run in runs))
+        self.assertEqual([0, 0, 1, 1, 2, 2], [run['round'] for run in runs])
+        pairs = set(tuple(run['srun_nodes']) for run in runs)
+        self.assertEqual(
+            {
+                ('n1', 'n2'),
+                ('n1', 'n3'),
+                ('n1', 'n4'),
+                ('n2', 'n3'),
+                ('n2', 'n4'),
+                ('n3', 'n4'),
+            },
+            pairs,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        length = len(cls.SLURM_UT_DIR + os.pathsep)
+        os.environ['PATH'] = os.environ['PATH'][length:]
+        shutil.rmtree(cls.SLURM_UT_DIR)
+        shutil.rmtree(cls.BARRIER_DIR)
+        super(cls, cls).tearDownClass()
@@ -1,4 +1,5 @@
 from io import StringIO
+import glob
 import os
 import os.path as osp
 import shutil
@@ -10,10 +11,17 @@ import unittest
 import mock
 from mock import Mock
 
-from hpcbench.campaign import from_file, ReportNode
+from hpcbench.campaign import (
+    from_file,
+    JSON_SLURM_CACHE_FILE,
+    ReportNode,
+    slurm_cache,
+    YAML_CAMPAIGN_FILE,
+)
 from hpcbench.driver import CampaignDriver
 from hpcbench.driver.slurm import SlurmDriver, SbatchDriver
 from hpcbench.toolbox.edsl import kwargsql
+from hpcbench.toolbox.slurm import SlurmCache
 from . import DriverTestCase
 from .test_spack import CO_MOCK, CC_MOCK
 
@@ -98,6 +106,109 @@ class TestExcludeNodeInSbatch(TestSlurm):
     EXCLUDE_NODES = "node01,node02"
 
 
+class TestSlurmShardsArray(DriverTestCase, unittest.TestCase):
+    """Tag split in 2 shards submitted as a job array"""
+
+    SBATCH_UT = textwrap.dedent(
+        """\
+        #!/bin/bash -e
+        echo "$@" >> sbatch-args.log
+        while [[ "$1" == -* ]] ; do shift ; done
+        export SLURMD_NODENAME=n1
+        last=$(sed -n 's/^#SBATCH --array=0-\\([0-9]*\\).*/\\1/p' "$1")
+        if [ -n "$last" ] ; then
+            for task in $(seq 0 $last) ; do
+                export SLURM_ARRAY_TASK_ID=$task
+                source "$1" > slurm-12345_$task.out 2>&1
+            done
+            echo 12345
+        else
+            source "$@" > slurm-$((12345 + $2)).out 2>&1
+            echo $((12345 + $2))
+        fi
+        """
+    )
+    SRUN_UT = textwrap.dedent(
+        """\
+        #!/bin/bash -e
+        while [[ "$1" == -* ]] ; do shift ; done
+        exec $@ >slurm-localhost-1.stdout 2>slurm-localhost-1.stderr
+        """
+    )
+
+    @classmethod
+    def get_campaign_file(cls):
+        return osp.join(osp.dirname(__file__), 'test_slurm_shards_array.yaml')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.SLURM_UT_DIR = cls.mkdtemp()
+        for name, content in [
+            ('sbatch-shards-ut', cls.SBATCH_UT),
+            ('srun-ut', cls.SRUN_UT),
+        ]:
+            path = osp.join(cls.SLURM_UT_DIR, name)
+            with open(path, 'w') as ostr:
+                ostr.write(content)
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        os.environ['PATH'] = cls.SLURM_UT_DIR + os.pathsep + os.environ['PATH']
+        super(TestSlurmShardsArray, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        length = len(cls.SLURM_UT_DIR + os.pathsep)
+        os.environ['PATH'] = os.environ['PATH'][length:]
+        shutil.rmtree(cls.SLURM_UT_DIR)
+        super(TestSlurmShardsArray, cls).tearDownClass()
+
+    @property
+    def sbatch_report(self):
+        root = ReportNode(self.CAMPAIGN_PATH)
+        path, _ = root.collect_one('jobid', with_path=True)
+        return ReportNode(path)
+
+    def check_jobid(self, jobid):
+        self.assertEqual(12345, jobid)
+        with open(osp.join(self.sbatch_report.path, self.sbatch_report['sbatch'])) as f:
+            sbatch = f.read()
+        self.assertIn('#SBATCH --array=0-1%2\n', sbatch)
+        self.assertIn('--shard=${SLURM_ARRAY_TASK_ID:-$1}/2 ', sbatch)
+
+    def test_shards(self):
+        report = self.sbatch_report
+        self.check_jobid(report['jobid'])
+        self.assertEqual(2, len(report['children']))
+        inputs = []
+        for shard in report['children']:
+            outputs = osp.join(
+                report.path, shard, '*', 'uc1', 'test-slurm', '*', '*', 'slurm-*.stdout'
+            )
+            shard_inputs = []
+            for output in glob.glob(outputs):
+                with open(output) as istr:
+                    shard_inputs.append(int(istr.read()))
+            self.assertIn(len(shard_inputs), [2, 3])
+            inputs += shard_inputs
+        self.assertEqual([1, 2, 3, 4, 5], sorted(inputs))
+
+
+class TestSlurmShardsJobs(TestSlurmShardsArray):
+    """Tag split in 2 shards submitted as separate jobs"""
+
+    @classmethod
+    def get_campaign_file(cls):
+        return osp.join(osp.dirname(__file__), 'test_slurm_shards_jobs.yaml')
+
+    def check_jobid(self, jobid):
+        self.assertEqual([12345, 12346], jobid)
+        with open(osp.join(self.sbatch_report.path, 'sbatch-args.log')) as istr:
+            calls = istr.read().splitlines()
+        self.assertEqual(2, len(calls))
+        self.assertNotIn('--dependency', calls[0])
+        self.assertIn('--dependency=afterany:12345 ', calls[1])
+        self.assertTrue(calls[1].endswith(' 1'))
+
+
 class TestSbatchFail(DriverTestCase, unittest.TestCase):
 
     check_output = Mock()
@@ -283,3 +394,32 @@ class TestSlurmCluster(unittest.TestCase):
         campaign = osp.join(osp.dirname(__file__), 'test_slurm_cluster_rsv.yaml')
         campaign = from_file(campaign)
         self.assertEqual(11, len(campaign.network.nodes))
+
+    def test_campaign_cache(self):
+        campaign_file = osp.join(osp.dirname(__file__), 'test_slurm_cluster.yaml')
+        campaign_dir = DriverTestCase.mkdtemp()
+        self.addCleanup(shutil.rmtree, campaign_dir)
+        shutil.copy(campaign_file, osp.join(campaign_dir, YAML_CAMPAIGN_FILE))
+        with open(self.__class__.SINFO_OUTPUT_FILE) as istr:
+            sinfo = istr.read().encode()
+        cache = SlurmCache()
+        with mock.patch('subprocess.check_output', return_value=sinfo):
+            from_file(campaign_file, slurm_cache=cache)
+        self.assertEqual(cache.ttl, 3600)
+        cache.save(osp.join(campaign_dir, JSON_SLURM_CACHE_FILE))
+
+        # sinfo is not called anymore
+        with mock.patch('subprocess.check_output', side_effect=AssertionError):
+            campaign = from_file(campaign_dir)
+        self.assertEqual(35, len(campaign.network.nodes))
+
+        # dependent processes look for the cache in the parent directories
+        job_dir = osp.join(campaign_dir, 'uc1-sbatch', 'uc1')
+        os.makedirs(job_dir)
+        cache = slurm_cache(job_dir, lookup=True)
+        self.assertEqual(
+            cache.path, osp.join(osp.realpath(campaign_dir), JSON_SLURM_CACHE_FILE)
+        )
+        cache.invalidate()
+        self.assertFalse(osp.exists(cache.path))
+        self.assertIsNone(slurm_cache(job_dir, lookup=True).path)
@@ -1,4 +1,5 @@
 import os
+import pickle
 import shutil
 import tempfile
 import unittest
@@ -7,9 +8,12 @@ from hpcbench.toolbox.collections_ext import (
     Configuration,
     dict_map_kv,
     dict_merge,
+    explode_dict,
     flatten_dict,
     FrozenDict,
     FrozenList,
+    key_prefixes,
+    LRUCache,
     nameddict,
 )
 
@@ -104,6 +108,72 @@ class TestFlattenDict(unittest.TestCase):
             {'foo.0.bar': 42, 'foo.1.pika': 'plop', 'foo.2.bar': 43},
         )
 
+    def test_explode(self):
+        rows = list(
+            explode_dict(
+                {
+                    'foo': 42,
+                    'bar': {'raw': [dict(size=1, bw=2.0), dict(size=2, bw=4.0)]},
+                    'pika': [1],
+                    'empty': [],
+                }
+            )
+        )
+        self.assertEqual(
+            rows,
+            [
+                {'foo': 42, 'bar.raw.index': 0, 'bar.raw.size': 1, 'bar.raw.bw': 2.0},
+                {'foo': 42, 'bar.raw.index': 1, 'bar.raw.size': 2, 'bar.raw.bw': 4.0},
+                {'foo': 42, 'pika.index': 0, 'pika': 1},
+            ],
+        )
+        self.assertEqual(list(explode_dict({'foo': 42})), [{'foo': 42}])
+
+    def test_explode_tables(self):
+        run = {'foo': [{'raw': {'size': [1, 2], 'bw': [2.0, 4.0]}}]}
+        self.assertEqual(
+            list(explode_dict(run, tables={'foo.raw'})),
+            [
+                {
+                    'foo.index': 0,
+                    'foo.raw.index': 0,
+                    'foo.raw.size': 1,
+                    'foo.raw.bw': 2.0,
+                },
+                {
+                    'foo.index': 0,
+                    'foo.raw.index': 1,
+                    'foo.raw.size': 2,
+                    'foo.raw.bw': 4.0,
+                },
+            ],
+        )
+        # undeclared dictionaries of lists are not zipped
+        self.assertEqual(
+            list(explode_dict(run)),
+            [
+                {'foo.index': 0, 'foo.raw.size.index': 0, 'foo.raw.size': 1},
+                {'foo.index': 0, 'foo.raw.size.index': 1, 'foo.raw.size': 2},
+                {'foo.index': 0, 'foo.raw.bw.index': 0, 'foo.raw.bw': 2.0},
+                {'foo.index': 0, 'foo.raw.bw.index': 1, 'foo.raw.bw': 4.0},
+            ],
+        )
+
+    def test_prefixes(self):
+        prefixes = key_prefixes(['bar.foo', 'pika.1.bar'])
+        self.assertEqual(prefixes, {'bar', 'bar.foo', 'pika', 'pika.1', 'pika.1.bar'})
+        self.assertEqual(
+            flatten_dict(
+                {
+                    'foo': 42,
+                    'bar': {'foo': 43, 'pika': 44},
+                    'pika': [dict(bar=1), dict(bar=2)],
+                },
+                prefixes=prefixes,
+            ),
+            {'bar.foo': 43, 'pika.1.bar': 2},
+        )
+
 
 class TestDictMerge(unittest.TestCase):
     def test_dm_empty(self):
@@ -191,6 +261,25 @@ class TestFrozenDataStructures(unittest.TestCase):
         with self.assertRaises(TypeError):
             fl += [42]
 
+    def test_pickle(self):
+        d = FrozenDict(foo=FrozenList([42]))
+        self.assertEqual(pickle.loads(pickle.dumps(d)), d)
+        self.assertIsInstance(pickle.loads(pickle.dumps(d))['foo'], FrozenList)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
 
 if __name__ == '__main__':
     unittest.main()
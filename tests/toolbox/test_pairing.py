@@ -0,0 +1,123 @@
+import collections
+import itertools
+import os.path as osp
+import shutil
+import tempfile
+import types
+import unittest
+
+from hpcbench.toolbox import pairing
+
+
+class TestPairing(unittest.TestCase):
+    NODES = ['node{0:02}'.format(id_) for id_ in range(1, 11)]
+
+    def degrees(self, pairs):
+        degrees = collections.Counter()
+        for pair in pairs:
+            self.assertEqual(2, len(set(pair)))
+            degrees.update(pair)
+        return degrees
+
+    def test_lazy(self):
+        for strategy in ['tag', 'ring', 'hypercube', 'random', 'covering']:
+            pairs = pairing.node_pairs(self.NODES, strategy)
+            self.assertIsInstance(pairs, types.GeneratorType)
+
+    def test_all_pairs(self):
+        pairs = list(pairing.node_pairs(['n3', 'n1', 'n2'], 'tag'))
+        self.assertEqual([['n1', 'n2'], ['n1', 'n3'], ['n2', 'n3']], pairs)
+
+    def test_ring(self):
+        pairs = list(pairing.node_pairs(['n1', 'n2', 'n3'], 'ring'))
+        self.assertEqual([['n1', 'n2'], ['n2', 'n3'], ['n3', 'n1']], pairs)
+        self.assertEqual([['n1', 'n2']], list(pairing.ring(['n1', 'n2'])))
+        self.assertEqual([], list(pairing.ring(['n1'])))
+
+    def test_hypercube(self):
+        pairs = list(pairing.hypercube(self.NODES[:4]))
+        self.assertEqual(4, len(pairs))
+        self.assertEqual({2}, set(self.degrees(pairs).values()))
+        pairs = list(pairing.hypercube(self.NODES))
+        self.assertIn(['node01', 'node09'], pairs)
+        self.assertEqual(set(self.NODES), set(self.degrees(pairs)))
+
+    def test_covering(self):
+        for k in range(1, len(self.NODES)):
+            pairs = list(pairing.covering(self.NODES, k=k))
+            self.assertEqual(len(pairs), len(set(tuple(sorted(p)) for p in pairs)))
+            degrees = self.degrees(pairs)
+            self.assertEqual(set(self.NODES), set(degrees))
+            self.assertGreaterEqual(min(degrees.values()), k)
+        self.assertEqual(45, len(list(pairing.covering(self.NODES, k=100))))
+
+    def test_random(self):
+        pairs = list(pairing.random_k(self.NODES, k=3, seed=42))
+        self.assertEqual(pairs, list(pairing.random_k(self.NODES, k=3, seed=42)))
+        self.assertEqual(len(pairs), len(set(tuple(p) for p in pairs)))
+        self.assertGreaterEqual(min(self.degrees(pairs).values()), 3)
+        self.assertEqual(3, len(list(pairing.random_k(self.NODES[:3], k=5))))
+
+    def test_switch(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            topology = osp.join(tmpdir, 'topology.conf')
+            with open(topology, 'w') as ostr:
+                ostr.write(
+                    '# leaf switches\n'
+                    'SwitchName=s0 Nodes=node[01-04]\n'
+                    'SwitchName=s1 Nodes=node[05-08]  # comment\n'
+                    'SwitchName=s2 Nodes=node[09-12]\n'
+                    'SwitchName=s3 Nodes=node13\n'
+                    'SwitchName=s4 Switches=s[0-3]\n'
+                )
+            pairs = list(pairing.node_pairs(self.NODES, 'switch', topology=topology))
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(
+            [['node01', 'node02'], ['node05', 'node06'], ['node09', 'node10']], pairs
+        )
+
+    def test_parse(self):
+        self.assertEqual(('ring', {}), pairing.parse('ring'))
+        self.assertEqual(
+            ('random', dict(k=2, seed=0)), pairing.parse(dict(random=dict(k=2, seed=0)))
+        )
+        self.assertEqual(('covering', {}), pairing.parse(dict(covering=None)))
+        self.assertEqual(('node', {}), pairing.parse('node', {'node'}))
+        with self.assertRaises(ValueError):
+            pairing.parse('node')
+        with self.assertRaises(ValueError):
+            pairing.parse(dict(ring=None, tag=None))
+
+    def test_tournament(self):
+        for count in [2, 3, 4, 7, 10]:
+            nodes = self.NODES[:count]
+            rounds = list(pairing.tournament(nodes))
+            self.assertEqual(count - 1 if count % 2 == 0 else count, len(rounds))
+            for round_ in rounds:
+                self.assertEqual(2 * len(round_), len(self.degrees(round_)))
+            pairs = [pair for round_ in rounds for pair in round_]
+            self.assertEqual(sorted(pairing.all_pairs(nodes)), sorted(pairs))
+
+    def test_rounds(self):
+        rounds = list(pairing.rounds(self.NODES, 'covering', k=3))
+        for round_ in rounds:
+            self.assertEqual(2 * len(round_), len(self.degrees(round_)))
+        pairs = [pair for round_ in rounds for pair in round_]
+        self.assertEqual(sorted(pairing.covering(self.NODES, k=3)), sorted(pairs))
+        self.assertEqual(
+            rounds, list(pairing.disjoint_rounds(pairing.covering(self.NODES, k=3)))
+        )
+
+    def test_lazy_rounds(self):
+        self.assertIsInstance(pairing.rounds(self.NODES, 'ring'), types.GeneratorType)
+        star = (['n0', 'n' + str(i)] for i in itertools.count(1))
+        rounds = pairing.disjoint_rounds(star, window=2)
+        self.assertEqual([['n0', 'n1']], next(rounds))
+        self.assertEqual([['n0', 'n2']], next(rounds))
+        pairs = [['n1', 'n2'], ['n3', 'n4'], ['n1', 'n3']]
+        self.assertEqual(
+            [[['n1', 'n2'], ['n3', 'n4']], [['n1', 'n3']]],
+            list(pairing.disjoint_rounds(pairs, window=1)),
+        )
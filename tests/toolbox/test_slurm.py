@@ -1,9 +1,11 @@
 import os.path as osp
+import shutil
+import tempfile
 import unittest
 
 import mock
 
-from hpcbench.toolbox.slurm import SlurmCluster
+from hpcbench.toolbox.slurm import Job, SlurmCache, SlurmCluster
 
 
 class TestSlurm(unittest.TestCase):
@@ -37,3 +39,57 @@ class TestSlurm(unittest.TestCase):
         self.assertFalse(bar.active)
         with self.assertRaises(KeyError):
             SlurmCluster.reservation('?')
+
+    @mock.patch('subprocess.check_output')
+    def test_cache(self, co_mock):
+        with open(TestSlurm.SINFO_OUTPUT_FILE) as istr:
+            co_mock.return_value = istr.read().encode()
+        temp_dir = tempfile.mkdtemp(prefix='hpcbench-ut')
+        self.addCleanup(shutil.rmtree, temp_dir)
+        cache_file = osp.join(temp_dir, 'cache.json')
+        c = SlurmCluster(cache=SlurmCache(cache_file, ttl=60))
+        self.assertEqual(co_mock.call_count, 1)
+        self.assertTrue(osp.exists(cache_file))
+
+        # cache is shared through the file
+        cached = SlurmCluster(cache=SlurmCache(cache_file, ttl=60))
+        self.assertEqual(co_mock.call_count, 1)
+        self.assertEqual(
+            sorted(str(node) for node in cached.nodes),
+            sorted(str(node) for node in c.nodes),
+        )
+        node = cached.partitions['partition_1'][0]
+        self.assertIsInstance(node.cpus, int)
+        self.assertIsInstance(node.active_features, list)
+
+        # expired entry
+        with mock.patch('time.time', return_value=10 ** 10):
+            SlurmCluster(cache=SlurmCache(cache_file, ttl=60))
+        self.assertEqual(co_mock.call_count, 2)
+
+        # disabled cache
+        SlurmCluster(cache=SlurmCache(cache_file, ttl=0))
+        self.assertEqual(co_mock.call_count, 3)
+
+    @mock.patch('hpcbench.toolbox.slurm.job.sacct')
+    def test_finished_job_array(self, sacct_mock):
+        def task(jobid, nodes, end):
+            return [jobid, nodes, '2', '0:0', '2018-06-12T10:00:00', end]
+
+        sacct_mock.return_value = [
+            task('42_0', 'n1', '2018-06-12T10:08:10'),
+            task('42_[1-2%1]', 'None assigned', 'Unknown'),
+            task('43', 'n3', '2018-06-12T10:05:00'),
+        ]
+        self.assertEqual(['43'], list(Job.finished_jobs(['42', '43'])))
+        sacct_mock.return_value = [
+            task('42_0', 'n1', '2018-06-12T10:08:10'),
+            task('42_1', 'n2', '2018-06-12T10:09:10'),
+            task('42_2', 'n1', '2018-06-12T10:07:10'),
+        ]
+        job = Job.finished_jobs(['42'])['42']
+        self.assertEqual('42', job.id)
+        self.assertEqual('n[1-2]', str(job.nodes))
+        self.assertEqual(6, job.cpus)
+        self.assertEqual(10, job.end.hour)
+        self.assertEqual(9, job.end.minute)
@@ -0,0 +1,46 @@
+import os.path as osp
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from hpcbench.toolbox.watch import FileWatcher
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='hpcbench-ut')
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.file = osp.join(self.temp_dir, 'watched')
+        open(self.file, 'w').close()
+
+    def append_later(self, delay):
+        def _append():
+            time.sleep(delay)
+            with open(self.file, 'a') as ostr:
+                ostr.write('event\n')
+
+        thread = threading.Thread(target=_append)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def check_watcher(self, watcher):
+        with watcher:
+            self.assertFalse(watcher.wait(0.1))
+            self.append_later(0.2)
+            start = time.time()
+            self.assertTrue(watcher.wait(10))
+            self.assertLess(time.time() - start, 5)
+
+    def test_inotify(self):
+        watcher = FileWatcher(self.file)
+        if not watcher.inotify:
+            watcher.close()
+            self.skipTest('inotify is not available')
+        self.check_watcher(watcher)
+
+    def test_polling(self):
+        watcher = FileWatcher(self.file, poll_interval=0.05, inotify=False)
+        self.assertFalse(watcher.inotify)
+        self.check_watcher(watcher)